@@ -7,10 +7,13 @@ from fastapi.responses import StreamingResponse
 import json
 import asyncio
 from llm_pii_proxy.core.models import ChatRequest, ChatResponse
-from llm_pii_proxy.core.exceptions import PIIProcessingError, LLMProviderError, ConfigurationError, ValidationError
+from llm_pii_proxy.core.exceptions import (
+    PIIProcessingError, PIIScanBudgetExceededError, LLMProviderError, ConfigurationError, ValidationError
+)
 from llm_pii_proxy.services.llm_service import LLMService
 from llm_pii_proxy.providers.azure_provider import AzureOpenAIProvider
 from llm_pii_proxy.security.pii_gateway import AsyncPIISecurityGateway
+from llm_pii_proxy.config.settings import settings
 
 # Настраиваем логгер
 logger = logging.getLogger(__name__)
@@ -33,6 +36,11 @@ else:
 pii_gateway = AsyncPIISecurityGateway()
 llm_service = LLMService(llm_provider, pii_gateway)
 
+# Заголовок с ID разговора для PII сессии (имена заголовков в Starlette в нижнем регистре)
+CONVERSATION_ID_HEADER = "x-conversation-id"
+# Заголовки, по которым различаются клиенты: разговоры разных ключей не делят PII сессию
+CALLER_HEADERS = ("authorization", "api-key", "x-api-key")
+
 def validate_chat_request(request: ChatRequest) -> None:
     """Валидация входящего запроса"""
     if not request.messages:
@@ -46,8 +54,9 @@ def validate_chat_request(request: ChatRequest) -> None:
         if message.role not in ["tool", "assistant"] and (not message.content or not message.content.strip()):
             raise ValidationError(f"Message {i+1} content cannot be empty")
         
-        if message.content and len(message.content) > 50000:  # Разумный лимит на размер сообщения
-            raise ValidationError(f"Message {i+1} is too long (max 50000 characters)")
+        # Большие выводы tool calls маскируются оконным сканером, поэтому лимит настраиваемый
+        if message.content and len(message.content) > settings.max_message_chars:
+            raise ValidationError(f"Message {i+1} is too long (max {settings.max_message_chars} characters)")
     
     if request.temperature is not None and (request.temperature < 0 or request.temperature > 2):
         raise ValidationError("Temperature must be between 0 and 2")
@@ -111,6 +120,11 @@ async def chat_completions(request: ChatRequest, request_body: Request):
         if hasattr(msg, 'tool_call_id') and msg.tool_call_id:
             logger.info(f"      Tool call ID: {msg.tool_call_id}")
     
+    # ID разговора можно передать заголовком, если клиент не умеет поле session_id
+    if not request.session_id and headers.get(CONVERSATION_ID_HEADER):
+        request.session_id = headers[CONVERSATION_ID_HEADER]
+    request._caller = next((headers[name] for name in CALLER_HEADERS if headers.get(name)), None)
+    
     try:
         # Валидация входных данных
         validate_chat_request(request)
@@ -174,6 +188,10 @@ async def chat_completions(request: ChatRequest, request_body: Request):
     except ValidationError as e:
         logger.warning(f"❌ Валидация не пройдена: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
+    except PIIScanBudgetExceededError as e:
+        # Текст слишком дорог для проверки на PII: отказываем сразу, не отправляя его провайдеру
+        logger.warning(f"⏱️ {str(e)}")
+        raise HTTPException(status_code=413, detail=str(e))
     except PIIProcessingError as e:
         logger.error(f"❌ Ошибка обработки PII: {str(e)}")
         raise HTTPException(status_code=500, detail="PII processing error")
@@ -0,0 +1,42 @@
+# api/routes/pii.py
+
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+from llm_pii_proxy.api.routes.chat import pii_gateway
+
+router = APIRouter()
+
+@router.get("/pii/reload-status")
+async def pii_reload_status():
+    """Активная версия PII паттернов и результат последней перезагрузки"""
+    return pii_gateway.reload_status()
+
+@router.post("/pii/reload")
+async def pii_reload():
+    """Принудительная перезагрузка PII паттернов (как SIGHUP)"""
+    reloaded = await pii_gateway.reload_patterns()
+    status = pii_gateway.reload_status()
+    if not reloaded:
+        raise HTTPException(status_code=422, detail=status)
+    return status
+
+@router.get("/pii/metrics")
+async def pii_metrics():
+    """Счетчики PII маскирования и статистика кэша спанов"""
+    return pii_gateway.metrics_report()
+
+@router.get("/pii/profile")
+async def pii_profile(top: Optional[int] = None):
+    """Время сканирования и число совпадений по каждому паттерну, медленные первыми"""
+    report = pii_gateway.profile_report(top)
+    if report is None:
+        raise HTTPException(status_code=409, detail="Pattern profiling is off, set PII_PROFILE_PATTERNS=true")
+    return report
+
+@router.post("/pii/profile/reset")
+async def pii_profile_reset():
+    """Обнуляет счетчики профилировщика паттернов"""
+    if not pii_gateway.reset_profile():
+        raise HTTPException(status_code=409, detail="Pattern profiling is off, set PII_PROFILE_PATTERNS=true")
+    return {"reset": True}
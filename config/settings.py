@@ -24,6 +24,35 @@ class Settings:
         # PII Protection settings
         self.pii_protection_enabled = os.getenv("PII_PROTECTION_ENABLED", "false").lower() == "true"
         self.pii_patterns_config_path = os.getenv("PII_PATTERNS_CONFIG_PATH", "llm_pii_proxy/config/pii_patterns.yaml")
+        # auto | re2 | regex | re
+        self.pii_regex_engine = os.getenv("PII_REGEX_ENGINE", "auto")
+        # Ключ HMAC для детерминированных масок; без него маски стабильны только в пределах процесса
+        self.pii_mask_key = os.getenv("PII_MASK_KEY")
+        # Формат масок: hex (<password_1a2b3c4d>) | compact (<PW123456>, дешевле в токенах)
+        self.pii_mask_format = os.getenv("PII_MASK_FORMAT", "hex").lower()
+        # 0 отключает опрос, перезагрузка остается по SIGHUP и POST /pii/reload
+        self.pii_patterns_reload_interval_seconds = float(os.getenv("PII_PATTERNS_RELOAD_INTERVAL_SECONDS", "5"))
+        # Пул процессов для маскирования больших текстов; 0 - только пул потоков
+        self.pii_process_pool_workers = int(os.getenv("PII_PROCESS_POOL_WORKERS", "0"))
+        self.pii_process_pool_min_chars = int(os.getenv("PII_PROCESS_POOL_MIN_CHARS", "32768"))
+        # Тексты длиннее окна маскируются оконным сканером с ограниченной памятью
+        self.pii_stream_window_chars = int(os.getenv("PII_STREAM_WINDOW_CHARS", "262144"))
+        # Бюджет времени на сканирование одного текста (0 - без ограничения): conservative | fail
+        self.pii_scan_budget_ms = float(os.getenv("PII_SCAN_BUDGET_MS", "0"))
+        self.pii_scan_budget_mode = os.getenv("PII_SCAN_BUDGET_MODE", "conservative").lower()
+        # LRU кэш результатов сканирования (только смещения, без секретов); 0 отключает
+        self.pii_span_cache_max_bytes = int(os.getenv("PII_SPAN_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+        self.pii_span_cache_min_chars = int(os.getenv("PII_SPAN_CACHE_MIN_CHARS", "256"))
+        # PII сессия на разговор (ключ по заголовку X-Conversation-Id или по ключу клиента и начальным сообщениям)
+        self.pii_conversation_affinity = os.getenv("PII_CONVERSATION_AFFINITY", "true").lower() == "true"
+        # ReDoS проверка паттернов при загрузке: off | warn | reject (отклонить набор паттернов)
+        self.pii_redos_gate = os.getenv("PII_REDOS_GATE", "off").lower()
+        self.pii_redos_budget_ms = float(os.getenv("PII_REDOS_BUDGET_MS", "100"))
+        self.pii_redos_input_chars = int(os.getenv("PII_REDOS_INPUT_CHARS", "32768"))
+        # Профилирование паттернов по одному (медленнее), отчет в GET /pii/profile
+        self.pii_profile_patterns = os.getenv("PII_PROFILE_PATTERNS", "false").lower() == "true"
+        # Лимит на размер одного сообщения (выводы tool calls бывают мегабайтными)
+        self.max_message_chars = int(os.getenv("MAX_MESSAGE_CHARS", "2000000"))
         
         # API settings
         self.api_host = os.getenv("API_HOST", "0.0.0.0")
@@ -81,11 +110,28 @@ class Settings:
             "pii_proxy_debug": self.pii_proxy_debug,
             "pii_protection_enabled": self.pii_protection_enabled,
             "pii_patterns_config_path": self.pii_patterns_config_path,
+            "pii_regex_engine": self.pii_regex_engine,
+            "pii_mask_format": self.pii_mask_format,
+            "pii_patterns_reload_interval_seconds": self.pii_patterns_reload_interval_seconds,
+            "pii_process_pool_workers": self.pii_process_pool_workers,
+            "pii_process_pool_min_chars": self.pii_process_pool_min_chars,
+            "pii_stream_window_chars": self.pii_stream_window_chars,
+            "pii_scan_budget_ms": self.pii_scan_budget_ms,
+            "pii_scan_budget_mode": self.pii_scan_budget_mode,
+            "pii_span_cache_max_bytes": self.pii_span_cache_max_bytes,
+            "pii_span_cache_min_chars": self.pii_span_cache_min_chars,
+            "pii_conversation_affinity": self.pii_conversation_affinity,
+            "pii_profile_patterns": self.pii_profile_patterns,
+            "pii_redos_gate": self.pii_redos_gate,
+            "pii_redos_budget_ms": self.pii_redos_budget_ms,
+            "pii_redos_input_chars": self.pii_redos_input_chars,
+            "max_message_chars": self.max_message_chars,
             "pii_session_timeout_minutes": self.pii_session_timeout_minutes,
             "api_host": self.api_host,
             "api_port": self.api_port,
             "enable_auth": self.enable_auth,
             "api_key": f"{self.api_key[:10]}..." if self.api_key else None,
+            "pii_mask_key": "***" if self.pii_mask_key else None,
         }
 
 # Global settings instance
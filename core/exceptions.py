@@ -12,6 +12,10 @@ class PIIProcessingError(PIIProxyError):
     """Raised when PII processing fails"""
     pass
 
+class PIIScanBudgetExceededError(PIIProcessingError):
+    """Raised when a PII scan exceeds its time budget and the budget mode is 'fail'"""
+    pass
+
 class LLMProviderError(PIIProxyError):
     """Raised when LLM provider fails"""
     pass
@@ -1,8 +1,8 @@
 # core/interfaces.py
 
 from abc import ABC, abstractmethod
-from typing import AsyncIterator
-from .models import ChatRequest, ChatResponse, PIIResult
+from typing import AsyncIterator, List, Sequence
+from .models import ChatRequest, ChatResponse, PIIResult, PIIBatchResult
 
 class LLMProvider(ABC):
     @abstractmethod
@@ -26,6 +26,15 @@ class PIISecurityGateway(ABC):
     async def unmask_sensitive_data(self, content: str, session_id: str) -> str:
         pass
 
+    @abstractmethod
+    async def mask_many(self, contents: List[str], session_id: str) -> PIIBatchResult:
+        pass
+
+    @abstractmethod
+    async def unmask_many(self, contents: List[str], session_id: str,
+                          json_documents: Sequence[bool] = ()) -> List[str]:
+        pass
+
     @abstractmethod
     async def clear_session(self, session_id: str) -> None:
         pass 
\ No newline at end of file
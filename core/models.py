@@ -1,7 +1,7 @@
 # core/models.py
 
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any, Literal, Union
+from pydantic import BaseModel, Field, PrivateAttr, computed_field
+from typing import List, Optional, Dict, Any, Literal, Sequence, Union
 from datetime import datetime
 
 class ChatMessage(BaseModel):
@@ -22,6 +22,8 @@ class ChatRequest(BaseModel):
     tools: Optional[List[Dict[str, Any]]] = None
     tool_choice: Optional[Union[str, Dict[str, Any]]] = None
     functions: Optional[List[Dict[str, Any]]] = None
+    # Идентичность клиента (заголовок Authorization или api-key), задается роутом, а не телом запроса
+    _caller: Optional[str] = PrivateAttr(default=None)
 
 class ChatResponse(BaseModel):
     id: str
@@ -42,6 +44,30 @@ class PIIMapping(BaseModel):
 
 class PIIResult(BaseModel):
     content: str
-    mappings: List[PIIMapping]
     session_id: str
-    pii_count: int 
\ No newline at end of file
+    pii_count: int
+    # Masks of this content as the gateway stores them (objects with original, masked,
+    # type, created_at); turned into PIIMapping only when `mappings` is read
+    _redactions: Sequence[Any] = PrivateAttr(default=())
+    _mappings: Optional[List[PIIMapping]] = PrivateAttr(default=None)
+
+    def __init__(self, mappings: Optional[List[PIIMapping]] = None, redactions: Sequence[Any] = (), **data):
+        super().__init__(**data)
+        self._mappings = mappings
+        self._redactions = redactions
+
+    @computed_field
+    @property
+    def mappings(self) -> List[PIIMapping]:
+        if self._mappings is None:
+            self._mappings = [PIIMapping(original=redaction.original, masked=redaction.masked,
+                                         type=redaction.type, created_at=redaction.created_at)
+                              for redaction in self._redactions]
+            self._redactions = ()
+        return self._mappings
+
+class PIIBatchResult(BaseModel):
+    results: List[PIIResult]
+    session_id: str
+    pii_count: int
+    pii_types: Dict[str, int] = Field(default_factory=dict)
@@ -1,10 +1,13 @@
 import logging
 import sys
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from llm_pii_proxy.api.routes.chat import router as chat_router
 from llm_pii_proxy.api.routes.health import router as health_router
+from llm_pii_proxy.api.routes.pii import router as pii_router
+from llm_pii_proxy.api.routes.chat import pii_gateway
 
 def setup_logging():
     """Настройка логирования для PII Proxy"""
@@ -53,13 +56,22 @@ def setup_logging():
     logging.info("🚀 Логирование настроено для LLM PII Proxy")
     logging.info("📝 Детальные логи записываются в: /tmp/llm_pii_proxy_debug.log")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Горячая перезагрузка PII паттернов (опрос mtime и SIGHUP)
+    pii_gateway.start_pattern_watcher()
+    yield
+    await pii_gateway.stop_pattern_watcher()
+    pii_gateway.shutdown_process_pool()
+
 def create_app() -> FastAPI:
     setup_logging()
     
     app = FastAPI(
         title="LLM PII Proxy", 
         version="1.0.0",
-        description="Прокси-сервер для защиты PII данных при работе с LLM"
+        description="Прокси-сервер для защиты PII данных при работе с LLM",
+        lifespan=lifespan
     )
     
     # Добавляем CORS middleware для поддержки preflight OPTIONS-запросов
@@ -73,6 +85,7 @@ def create_app() -> FastAPI:
 
     app.include_router(chat_router)
     app.include_router(health_router)
+    app.include_router(pii_router)
     
     logging.info("🌐 FastAPI приложение создано и настроено")
     return app 
\ No newline at end of file
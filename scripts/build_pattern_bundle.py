@@ -0,0 +1,39 @@
+# scripts/build_pattern_bundle.py
+
+# Validate pii_patterns.yaml and write the precompiled bundle the gateway loads at startup.
+#
+#   python -m llm_pii_proxy.scripts.build_pattern_bundle [config.yaml] [-o bundle.json]
+
+import argparse
+import sys
+
+from llm_pii_proxy.core.exceptions import ConfigurationError
+from llm_pii_proxy.security.pattern_bundle import load_bundle, write_bundle
+from llm_pii_proxy.security.pii_redaction import PIIRedactionGateway
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build the PII pattern bundle")
+    parser.add_argument("config", nargs="?", default="llm_pii_proxy/config/pii_patterns.yaml")
+    parser.add_argument("-o", "--output", help="bundle path (default: next to the config)")
+    parser.add_argument("--check-redos", action="store_true",
+                        help="fuzz every pattern with worst-case inputs and fail if one is too slow")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.check_redos:
+            # stdlib re backtracks on every pattern: the worst case of all engines
+            PIIRedactionGateway(args.config, regex_engine="re", redos_gate="reject")
+        bundle_path = write_bundle(args.config, args.output)
+    except (OSError, ConfigurationError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    bundle = load_bundle(args.config, bundle_path)
+    patterns_count = sum(len(entries) for entries in bundle["patterns"].values())
+    print(f"✅ {bundle_path}: {patterns_count} patterns, "
+          f"{len(bundle['patterns'])} types, source {bundle['source_hash'][:12]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+# scripts/profile_patterns.py
+
+# Run corpus files through every PII detector on its own and report the slowest ones,
+# with candidate, accepted and overlap-rejected match counts.
+#
+#   python -m llm_pii_proxy.scripts.profile_patterns corpus.txt [more.txt ...] [--top 10] [--json out.json]
+
+import argparse
+import json
+import sys
+
+from llm_pii_proxy.core.exceptions import ConfigurationError
+from llm_pii_proxy.security.pii_redaction import PIIRedactionGateway
+
+
+def print_table(rows) -> None:
+    print(f"{'type':<20} {'#':>2} {'seconds':>9} {'share':>6} {'MB/s':>8} {'scans':>6} {'skipped':>7} "
+          f"{'cand':>6} {'accepted':>8} {'overlap':>7} {'empty':>6} {'invalid':>7}  pattern")
+    for row in rows:
+        pattern = row["pattern"] if len(row["pattern"]) <= 60 else row["pattern"][:57] + "..."
+        print(f"{row['data_type']:<20} {row['position']:>2} {row['seconds']:>9.4f} {row['time_share']:>6.1%} "
+              f"{row['mb_per_s'] if row['mb_per_s'] is not None else '-':>8} {row['scans']:>6} "
+              f"{row['skipped']:>7} {row['candidates']:>6} {row['accepted']:>8} "
+              f"{row['overlap_rejected']:>7} {row['empty']:>6} {row['invalid']:>7}  {pattern}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Profile PII detectors on a corpus")
+    parser.add_argument("corpus", nargs="+", help="text files, each masked as one message")
+    parser.add_argument("--config", default="llm_pii_proxy/config/pii_patterns.yaml")
+    parser.add_argument("--engine", default="auto", help="regex engine: re | regex | re2 | auto")
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the corpus")
+    parser.add_argument("--top", type=int, help="show only the slowest N detectors")
+    parser.add_argument("--json", help="also write the full report to this file")
+    args = parser.parse_args(argv)
+
+    texts = []
+    try:
+        for path in args.corpus:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                texts.append(f.read())
+        gateway = PIIRedactionGateway(args.config, regex_engine=args.engine, profile_patterns=True)
+    except (OSError, ConfigurationError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    for _ in range(max(1, args.repeat)):
+        for text in texts:
+            gateway.mask_sensitive_data(text, None, {})
+    rows = gateway.profile_report(args.top)
+    print(f"📊 {sum(map(len, texts))} chars x {args.repeat}, patterns {gateway.patterns_version[:12]}, "
+          f"engine '{gateway.scanner.engine.name}'")
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"patterns_version": gateway.patterns_version,
+                       "regex_engine": gateway.scanner.engine.name, "detectors": rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# security/pattern_bundle.py
+
+# Build step for PII patterns: validate pii_patterns.yaml once and store it as a
+# versioned JSON bundle, which is much faster to load than YAML at worker start.
+
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, Optional
+
+from llm_pii_proxy.core.exceptions import ConfigurationError
+from .pattern_validators import VALIDATORS
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_VERSION = 2
+BUNDLE_SUFFIX = ".bundle.json"
+PATTERN_FLAGS = re.MULTILINE | re.DOTALL
+ENTRY_KEYS = {"pattern", "triggers", "value_group", "priority", "validators"}
+
+
+def bundle_path_for(config_path: str) -> str:
+    """config/pii_patterns.yaml -> config/pii_patterns.bundle.json"""
+    root, _ = os.path.splitext(config_path)
+    return root + BUNDLE_SUFFIX
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def parse_yaml(data: bytes) -> Any:
+    """Parse YAML with the libyaml C loader when it is available"""
+    if yaml is None:
+        raise ConfigurationError("PyYAML is required to read PII patterns")
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    return yaml.load(data, Loader=loader)
+
+
+def validate_patterns(config: Any) -> Dict[str, list]:
+    """Check the pattern config and return it in normalized form"""
+    if not isinstance(config, dict):
+        raise ConfigurationError("PII patterns config must map a type name to a list of patterns")
+    normalized = {}
+    for data_type, entries in config.items():
+        if not isinstance(data_type, str) or not data_type:
+            raise ConfigurationError(f"Invalid PII type name: {data_type!r}")
+        if not isinstance(entries, list) or not entries:
+            raise ConfigurationError(f"PII type '{data_type}' must have a non-empty list of patterns")
+        normalized[data_type] = []
+        for position, entry in enumerate(entries):
+            where = f"{data_type}[{position}]"
+            if not isinstance(entry, dict) or not isinstance(entry.get("pattern"), str):
+                raise ConfigurationError(f"{where}: entry must have a 'pattern' string")
+            unknown = set(entry) - ENTRY_KEYS
+            if unknown:
+                raise ConfigurationError(f"{where}: unknown keys {sorted(unknown)}")
+            try:
+                compiled = re.compile(entry["pattern"], PATTERN_FLAGS)
+            except re.error as e:
+                raise ConfigurationError(f"{where}: invalid regex: {e}")
+            triggers = entry.get("triggers") or []
+            if not isinstance(triggers, list) or not all(isinstance(t, str) and t for t in triggers):
+                raise ConfigurationError(f"{where}: 'triggers' must be a list of non-empty strings")
+            value_group = entry.get("value_group")
+            if value_group is not None and value_group not in compiled.groupindex:
+                raise ConfigurationError(f"{where}: 'value_group' must name a (?P<name>...) group of the pattern")
+            priority = entry.get("priority", 0)
+            if not isinstance(priority, int) or isinstance(priority, bool):
+                raise ConfigurationError(f"{where}: 'priority' must be an integer")
+            validators = entry.get("validators") or []
+            if not isinstance(validators, list) or not all(name in VALIDATORS for name in validators):
+                raise ConfigurationError(f"{where}: 'validators' must be a list of {sorted(VALIDATORS)}")
+            normalized[data_type].append({"pattern": entry["pattern"], "triggers": triggers,
+                                          "value_group": value_group, "priority": priority,
+                                          "validators": validators})
+    return normalized
+
+
+def build_bundle(config_path: str) -> Dict[str, Any]:
+    """Validate the YAML config and return the bundle for it"""
+    with open(config_path, "rb") as f:
+        data = f.read()
+    return {
+        "version": BUNDLE_VERSION,
+        "source_hash": content_hash(data),
+        "flags": PATTERN_FLAGS,
+        "patterns": validate_patterns(parse_yaml(data)),
+    }
+
+
+def write_bundle(config_path: str, bundle_path: Optional[str] = None) -> str:
+    bundle_path = bundle_path or bundle_path_for(config_path)
+    bundle = build_bundle(config_path)
+    tmp_path = bundle_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(bundle, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, bundle_path)
+    return bundle_path
+
+
+def load_bundle(config_path: str, bundle_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Return the bundle for config_path, or None if it is missing, outdated or stale"""
+    bundle_path = bundle_path or bundle_path_for(config_path)
+    if not os.path.exists(bundle_path):
+        return None
+    try:
+        with open(bundle_path, "r", encoding="utf-8") as f:
+            bundle = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Cannot read PII pattern bundle {bundle_path}: {e}")
+        return None
+    if bundle.get("version") != BUNDLE_VERSION or bundle.get("flags") != PATTERN_FLAGS:
+        logger.warning(f"PII pattern bundle {bundle_path} has an unsupported version, ignoring it")
+        return None
+    if os.path.exists(config_path):
+        with open(config_path, "rb") as f:
+            if content_hash(f.read()) != bundle.get("source_hash"):
+                logger.warning(f"PII pattern bundle {bundle_path} is stale, rebuild it from {config_path}")
+                return None
+    return bundle
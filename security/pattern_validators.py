@@ -0,0 +1,32 @@
+# security/pattern_validators.py
+
+# Named checks a detector in pii_patterns.yaml can declare on its value
+# ("validators: [ipv4]"). A candidate is masked only if all of them accept it,
+# which drops false positives a regex alone cannot rule out cheaply.
+
+from typing import Callable, Dict
+
+
+def ipv4(value: str) -> bool:
+    """Dotted quad with every octet in 0..255"""
+    parts = value.split(".")
+    return len(parts) == 4 and all(part.isdigit() and len(part) <= 3 and int(part) <= 255 for part in parts)
+
+
+def luhn(value: str) -> bool:
+    """Card-like number (spaces and dashes allowed) with a valid Luhn checksum"""
+    digits = [int(ch) for ch in value if ch.isdigit()]
+    if len(digits) < 12 or any(not (ch.isdigit() or ch in " -") for ch in value):
+        return False
+    checksum = 0
+    for position, digit in enumerate(reversed(digits)):
+        if position % 2:
+            digit = digit * 2 - 9 if digit > 4 else digit * 2
+        checksum += digit
+    return checksum % 10 == 0
+
+
+VALIDATORS: Dict[str, Callable[[str], bool]] = {
+    "ipv4": ipv4,
+    "luhn": luhn,
+}
@@ -3,35 +3,213 @@
 # PII redaction logic will go here. 
 
 import time
+import hashlib
+import hmac
 import logging
 import os
-from datetime import datetime, timedelta
-from typing import Dict
-from llm_pii_proxy.core.models import PIIResult, PIIMapping
+import signal
+from datetime import datetime
+from collections import ChainMap, OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+from llm_pii_proxy.core.models import PIIResult, PIIBatchResult
 from llm_pii_proxy.core.interfaces import PIISecurityGateway
-from llm_pii_proxy.core.exceptions import PIISessionNotFoundError, PIIProcessingError
-from .pii_redaction import PIIRedactionGateway, RedactionMapping
+from llm_pii_proxy.core.exceptions import (
+    ConfigurationError, PIISessionNotFoundError, PIIProcessingError, PIIScanBudgetExceededError
+)
+from llm_pii_proxy.observability.metrics import metrics
+from .pii_redaction import (
+    JSONLeaves, PIIRedactionGateway, RedactionMapping, ScanBudgetExceeded, Span, STREAM_WINDOW_CHARS,
+    StreamUnmasker, looks_like_json
+)
+from .span_cache import SpanCache
+from .pattern_bundle import bundle_path_for
+from .redaction_pool import RedactionProcessPool
 import asyncio
 
 # Настраиваем логгер
 logger = logging.getLogger(__name__)
 
+# Реакция на превышение PII_SCAN_BUDGET_MS
+SCAN_BUDGET_MODES = ("conservative", "fail")
+
 class AsyncPIISecurityGateway(PIISecurityGateway):
-    def __init__(self, session_timeout_minutes: int = 60):
-        self.redaction_gateway = PIIRedactionGateway()
-        self.sessions: Dict[str, dict] = {}
-        self.session_timeout = timedelta(minutes=session_timeout_minutes)
+    def __init__(self, session_timeout_minutes: int = 60, config_path: Optional[str] = None):
+        self.config_path = config_path or os.getenv("PII_PATTERNS_CONFIG_PATH", "llm_pii_proxy/config/pii_patterns.yaml")
+        # Активный движок: каждый вызов берет ссылку один раз, поэтому горячая
+        # перезагрузка паттернов подменяет его одним присваиванием
+        self.redaction_gateway = PIIRedactionGateway(self.config_path)
+        # Необязательный пул процессов для больших текстов (PII_PROCESS_POOL_WORKERS > 0)
+        self.process_pool_workers = int(os.getenv("PII_PROCESS_POOL_WORKERS", "0"))
+        self.process_pool_min_chars = int(os.getenv("PII_PROCESS_POOL_MIN_CHARS", "32768"))
+        # Тексты длиннее окна сканируются окнами с ограниченной памятью, в пуле процессов тоже
+        self.stream_window_chars = int(os.getenv("PII_STREAM_WINDOW_CHARS", str(STREAM_WINDOW_CHARS)))
+        self.process_pool = self._create_process_pool(self.redaction_gateway)
+        # Бюджет времени на сканирование одного текста (0 - без ограничения) и что делать
+        # при его превышении: conservative - маскировать подозрительные строки целиком,
+        # fail - сразу отклонить запрос
+        self.scan_budget_ms = float(os.getenv("PII_SCAN_BUDGET_MS", "0"))
+        self.scan_budget_mode = os.getenv("PII_SCAN_BUDGET_MODE", "conservative").lower()
+        if self.scan_budget_mode not in SCAN_BUDGET_MODES:
+            raise ConfigurationError(f"PII_SCAN_BUDGET_MODE must be one of {SCAN_BUDGET_MODES}")
+        # Cursor каждый ход присылает всю переписку: результаты сканирования кэшируются
+        # по хэшу контента и версии паттернов, поэтому переживают перезагрузку
+        self.span_cache = SpanCache(
+            max_bytes=int(os.getenv("PII_SPAN_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+            min_chars=int(os.getenv("PII_SPAN_CACHE_MIN_CHARS", "256")),
+        )
+        # Сессии в порядке последнего обращения: истекшие всегда в начале
+        self.sessions: "OrderedDict[str, dict]" = OrderedDict()
+        self.session_timeout_seconds = session_timeout_minutes * 60
         self.debug_mode = os.getenv('PII_PROXY_DEBUG', 'false').lower() == 'true'
+        self._reload_lock = asyncio.Lock()
+        self._watcher_task: Optional[asyncio.Task] = None
+        self._patterns_signature = self._pattern_files_signature()
+        self._reload_status = {
+            "patterns_version": self.redaction_gateway.patterns_version,
+            "regex_engine": self.redaction_gateway.scanner.engine.name,
+            "redos_findings": self.redaction_gateway.redos_findings,
+            "loaded_at": datetime.now().isoformat(),
+            "last_attempt_at": None,
+            "last_error": None,
+            "reloads": 0,
+            "failures": 0,
+        }
         logger.info(f"🔐 PII Gateway инициализирован с timeout {session_timeout_minutes} минут")
 
+    def _create_process_pool(self, engine: PIIRedactionGateway) -> Optional[RedactionProcessPool]:
+        # При профилировании паттерны сканируются в этом процессе, иначе время не учесть
+        if self.process_pool_workers <= 0 or engine.profiler is not None:
+            return None
+        pool = RedactionProcessPool(engine, self.config_path, self.process_pool_workers,
+                                    self.process_pool_min_chars, self.stream_window_chars)
+        logger.info(f"🧵 Пул процессов для PII: {self.process_pool_workers} воркеров, "
+                    f"тексты от {self.process_pool_min_chars} символов")
+        return pool
+
+    def shutdown_process_pool(self) -> None:
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=True)
+            self.process_pool = None
+
+    def _pattern_files_signature(self) -> Tuple:
+        """mtime и размер YAML конфига и его бандла - меняются при любой правке"""
+        signature = []
+        for path in (self.config_path, bundle_path_for(self.config_path)):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def reload_status(self) -> dict:
+        return dict(self._reload_status, watching=self._watcher_task is not None and not self._watcher_task.done())
+
+    def profile_report(self, top: Optional[int] = None) -> Optional[dict]:
+        """Отчет профилировщика паттернов (PII_PROFILE_PATTERNS=true), медленные первыми"""
+        engine = self.redaction_gateway
+        detectors = engine.profile_report(top)
+        if detectors is None:
+            return None
+        return {"patterns_version": engine.patterns_version, "regex_engine": engine.scanner.engine.name,
+                "detectors": detectors}
+
+    def metrics_report(self) -> dict:
+        """Счетчики и gauges PII (пул процессов, бюджет сканирования, JSON) и статистика кэша спанов"""
+        return dict(metrics.snapshot(), span_cache=self.span_cache.stats())
+
+    def reset_profile(self) -> bool:
+        profiler = self.redaction_gateway.profiler
+        if profiler is None:
+            return False
+        profiler.reset()
+        return True
+
+    async def reload_patterns(self) -> bool:
+        """Компилирует новый набор паттернов в фоне и атомарно подменяет движок.
+
+        Запросы, которые уже выполняются, дорабатывают на старом движке. Если
+        компиляция не удалась, остается старый набор, а ошибка видна в reload_status().
+        """
+        async with self._reload_lock:
+            self._patterns_signature = self._pattern_files_signature()
+            self._reload_status["last_attempt_at"] = datetime.now().isoformat()
+            try:
+                if not os.path.exists(self.config_path) and not os.path.exists(bundle_path_for(self.config_path)):
+                    raise FileNotFoundError(f"PII patterns config not found: {self.config_path}")
+                loop = asyncio.get_event_loop()
+                engine = await loop.run_in_executor(None, PIIRedactionGateway, self.config_path)
+            except Exception as e:
+                self._reload_status["last_error"] = f"{type(e).__name__}: {e}"
+                self._reload_status["failures"] += 1
+                metrics.increment("pii_patterns_reload_failures")
+                logger.error(f"❌ Не удалось перезагрузить PII паттерны, оставляем версию "
+                             f"{self._reload_status['patterns_version'][:12]}: {e}")
+                return False
+            
+            previous_version = self.redaction_gateway.patterns_version
+            try:
+                pool = self._create_process_pool(engine)
+            except Exception as e:
+                logger.error(f"❌ Не удалось запустить пул процессов для новых паттернов, маскируем в потоках: {e}")
+                pool = None
+            # Движок и его пул подменяются вместе, без await между присваиваниями
+            previous_pool = self.process_pool
+            self.redaction_gateway, self.process_pool = engine, pool
+            if previous_pool is not None:
+                # Уже отправленные задачи старого пула дорабатывают
+                previous_pool.shutdown(wait=False)
+            self._reload_status.update({
+                "patterns_version": engine.patterns_version,
+                "regex_engine": engine.scanner.engine.name,
+                "redos_findings": engine.redos_findings,
+                "loaded_at": datetime.now().isoformat(),
+                "last_error": None,
+                "reloads": self._reload_status["reloads"] + 1,
+            })
+            metrics.increment("pii_patterns_reloads")
+            logger.info(f"🔁 PII паттерны перезагружены: {previous_version[:12]} → {engine.patterns_version[:12]}")
+            return True
+
+    async def _watch_patterns(self, interval_seconds: float):
+        while True:
+            await asyncio.sleep(interval_seconds)
+            if self._pattern_files_signature() != self._patterns_signature:
+                logger.info(f"👀 Обнаружено изменение {self.config_path}, перезагружаем PII паттерны")
+                await self.reload_patterns()
+
+    def start_pattern_watcher(self, interval_seconds: Optional[float] = None) -> None:
+        """Следит за конфигом паттернов (опрос mtime и SIGHUP); вызывается при старте приложения"""
+        if interval_seconds is None:
+            interval_seconds = float(os.getenv("PII_PATTERNS_RELOAD_INTERVAL_SECONDS", "5"))
+        loop = asyncio.get_event_loop()
+        try:
+            loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(self.reload_patterns()))
+        except (AttributeError, NotImplementedError, RuntimeError, ValueError):
+            logger.debug("SIGHUP недоступен, перезагрузка PII паттернов только по опросу")
+        if interval_seconds > 0 and self._watcher_task is None:
+            self._watcher_task = loop.create_task(self._watch_patterns(interval_seconds))
+            logger.info(f"👀 Отслеживаем изменения PII паттернов каждые {interval_seconds} сек")
+
+    async def stop_pattern_watcher(self) -> None:
+        if self._watcher_task is not None:
+            self._watcher_task.cancel()
+            try:
+                await self._watcher_task
+            except asyncio.CancelledError:
+                pass
+            self._watcher_task = None
+
     async def _cleanup_expired_sessions(self):
         """Очищает истекшие сессии"""
-        current_time = datetime.now()
+        expires_before = time.monotonic() - self.session_timeout_seconds
         expired_sessions = []
         
+        # Просматриваем только истекшие сессии, а не все живые
         for session_id, session_data in self.sessions.items():
-            if current_time - session_data["last_accessed"] > self.session_timeout:
-                expired_sessions.append(session_id)
+            if session_data["last_accessed"] >= expires_before:
+                break
+            expired_sessions.append(session_id)
         
         for session_id in expired_sessions:
             logger.info(f"🧹 Автоочистка истекшей сессии: {session_id}")
@@ -71,47 +249,35 @@ class AsyncPIISecurityGateway(PIISecurityGateway):
             logger.debug(f"📄 [{session_id}] Обрабатываем контент длиной {len(content)} символов")
         
         # Create session if needed
-        if session_id not in self.sessions:
-            self.sessions[session_id] = {
-                "created_at": datetime.now(),
-                "last_accessed": datetime.now(),
-                "mappings": {}
-            }
-            logger.info(f"📝 [{session_id}] Создана новая PII сессия")
-        else:
-            logger.debug(f"🔄 [{session_id}] Используем существующую PII сессию")
+        session = self._get_or_create_session(session_id)
         
+        # Движок (и пул процессов при нем) фиксируем на весь запрос:
+        # перезагрузка паттернов его не затронет
+        engine, pool = self.redaction_gateway, self.process_pool
         try:
-            # Clear previous mappings before processing new content
-            self.redaction_gateway.clear_mapping()
-            
-            # Use existing PII gateway (sync, so run in thread pool)
+            # Мапинги этого запроса: движок не хранит состояния, поэтому запросы
+            # маскируются параллельно без блокировок; маски, уже выданные в
+            # сессии, нужны для проверки коллизий
+            spans, leaves = await self._prescan(engine, pool, [content])
             loop = asyncio.get_event_loop()
-            masked_content = await loop.run_in_executor(None, self.redaction_gateway.mask_sensitive_data, content)
+            [(masked_content, mapping, _)] = await loop.run_in_executor(
+                None, self._mask_batch, engine, [content], session["mappings"], spans, leaves
+            )
+        except PIIScanBudgetExceededError:
+            raise
         except Exception as e:
             raise PIIProcessingError(f"Failed to mask PII data: {str(e)}")
         
         # Store mappings in session
-        session = self.sessions[session_id]
-        session["mappings"] = {
-            masked: {
-                "original": mapping.original,
-                "masked": mapping.masked,
-                "type": mapping.type,
-                "created_at": getattr(mapping, "created_at", datetime.now())
-            }
-            for masked, mapping in self.redaction_gateway._mapping.items()
-        }
-        session["last_accessed"] = datetime.now()
+        self._store_mappings(session, mapping)
         
         processing_time = (time.time() - start_time) * 1000
-        pii_count = len(self.redaction_gateway._mapping)
+        pii_count = len(mapping)
         
         # Безопасное логирование найденных PII типов (без оригинальных данных)
         pii_types = {}
-        for masked, mapping in self.redaction_gateway._mapping.items():
-            pii_type = mapping.type
-            pii_types[pii_type] = pii_types.get(pii_type, 0) + 1
+        for redaction in mapping.values():
+            pii_types[redaction.type] = pii_types.get(redaction.type, 0) + 1
         
         if pii_count > 0:
             logger.info(f"🔒 [{session_id}] Маскирование завершено - найдено {pii_count} PII элементов", extra={
@@ -127,29 +293,312 @@ class AsyncPIISecurityGateway(PIISecurityGateway):
             # Показываем детали найденных PII элементов
             if self.debug_mode:
                 logger.debug(f"🔍 [{session_id}] Детали найденных PII элементов:")
-                for i, (masked, mapping) in enumerate(self.redaction_gateway._mapping.items()):
-                    logger.debug(f"    {i+1}. НАЙДЕНО: '{mapping.original}' → ЗАМЕНЕНО на: '{mapping.masked}' (тип: {mapping.type})")
+                for i, redaction in enumerate(mapping.values()):
+                    logger.debug(f"    {i+1}. НАЙДЕНО: '{redaction.original}' → ЗАМЕНЕНО на: '{redaction.masked}' (тип: {redaction.type})")
             else:
                 logger.info(f"🔍 [{session_id}] Найденные PII элементы (безопасно):")
-                for i, (masked, mapping) in enumerate(self.redaction_gateway._mapping.items()):
-                    logger.info(f"    {i+1}. [СКРЫТО] → '{mapping.masked}' (тип: {mapping.type})")
+                for i, redaction in enumerate(mapping.values()):
+                    logger.info(f"    {i+1}. [СКРЫТО] → '{redaction.masked}' (тип: {redaction.type})")
         else:
             logger.info(f"✅ [{session_id}] Маскирование завершено - PII данные не найдены")
         
-        mappings = [PIIMapping(
-            original=mapping["original"],
-            masked=masked,
-            type=mapping["type"],
-            created_at=mapping["created_at"]
-        ) for masked, mapping in session["mappings"].items()]
-        
+        return self._build_result(masked_content, mapping, session, session_id)
+
+    def _touch(self, session_id: str, session: dict) -> None:
+        session["last_accessed"] = time.monotonic()
+        self.sessions.move_to_end(session_id)
+
+    def _get_or_create_session(self, session_id: str) -> dict:
+        if session_id not in self.sessions:
+            now = time.monotonic()
+            self.sessions[session_id] = {
+                # time.monotonic(), секунды
+                "created_at": now,
+                "last_accessed": now,
+                # маска -> RedactionMapping
+                "mappings": {},
+                # Уже замаскированные тексты разговора: (sha256, спаны) по порядку. Только
+                # смещения: маскированный текст восстанавливается из присланного заново
+                "history": [],
+                "history_version": None
+            }
+            logger.info(f"📝 [{session_id}] Создана новая PII сессия")
+        else:
+            logger.debug(f"🔄 [{session_id}] Используем существующую PII сессию")
+            self._touch(session_id, self.sessions[session_id])
+        return self.sessions[session_id]
+
+    @staticmethod
+    def _store_mappings(session: dict, mapping: Dict[str, RedactionMapping]) -> None:
+        """Добавляет маски к уже выданным в сессии, чтобы маски всех сообщений
+        запроса (и прошлых ходов) можно было демаскировать"""
+        for masked, redaction in mapping.items():
+            session["mappings"].setdefault(masked, redaction)
+
+    @staticmethod
+    def _build_result(masked_content: str, mapping: Dict[str, RedactionMapping],
+                      session: dict, session_id: str) -> PIIResult:
+        # Возвращаем мапинги этого контента (в сессии хранятся и более ранние);
+        # PIIMapping строятся, только если вызывающий читает result.mappings
+        session_mappings = session["mappings"]
         return PIIResult(
             content=masked_content,
-            mappings=mappings,
+            redactions=[session_mappings[masked] for masked in mapping],
+            session_id=session_id,
+            pii_count=len(mapping)
+        )
+
+    def _over_budget(self, engine: PIIRedactionGateway, content: str,
+                     exceeded: ScanBudgetExceeded) -> List[Span]:
+        """Скан не уложился в бюджет: быстрый отказ или консервативные спаны для остатка текста"""
+        metrics.increment("pii_scan_budget_exceeded")
+        if self.scan_budget_mode == "fail":
+            raise PIIScanBudgetExceededError(
+                f"PII scan of a {len(content)}-char text exceeded the {self.scan_budget_ms:g} ms budget "
+                f"after {exceeded.position} chars"
+            )
+        spans = engine.line_spans(content, exceeded.position)
+        metrics.increment("pii_scan_budget_conservative_lines", len(spans))
+        logger.warning(f"⏱️ Сканирование текста из {len(content)} символов превысило бюджет "
+                       f"{self.scan_budget_ms:g} мс на позиции {exceeded.position}, "
+                       f"остаток замаскирован построчно ({len(spans)} строк)")
+        return exceeded.spans + spans
+
+    def _scan(self, engine: PIIRedactionGateway, content: str) -> Tuple[List[Span], bool]:
+        """Спаны текста в пределах бюджета и признак полного сканирования"""
+        deadline = time.monotonic() + self.scan_budget_ms / 1000 if self.scan_budget_ms > 0 else None
+        try:
+            return engine.find_spans(content, self.stream_window_chars, deadline), True
+        except ScanBudgetExceeded as e:
+            return self._over_budget(engine, content, e), False
+
+    def _scan_cached(self, engine: PIIRedactionGateway, content: str) -> List[Span]:
+        """Спаны текста из кэша, иначе сканированием (вызывается в пуле потоков)"""
+        cache = self.span_cache
+        if not cache.accepts(content):
+            return self._scan(engine, content)[0]
+        key, size = cache.key_for(engine, content)
+        spans = cache.get(key)
+        if spans is None:
+            spans, complete = self._scan(engine, content)
+            # Консервативный результат зависит от нагрузки, его не кэшируем
+            if complete:
+                cache.put(key, spans, size)
+        return spans
+
+    async def _pool_spans(self, engine: PIIRedactionGateway, pool: Optional[RedactionProcessPool],
+                          content: str) -> Optional[List[Span]]:
+        """Спаны больших текстов из кэша или из пула процессов; None - сканировать в потоке"""
+        if pool is None or not content or not pool.accepts(content):
+            return None
+        cache = self.span_cache
+        key = None
+        if cache.accepts(content):
+            key, size = cache.key_for(engine, content)
+            spans = cache.get(key)
+            if spans is not None:
+                return spans
+        try:
+            spans = await pool.scan(content, self.scan_budget_ms / 1000 if self.scan_budget_ms > 0 else None)
+        except ScanBudgetExceeded as e:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(None, self._over_budget, engine, content, e)
+        except Exception as e:
+            # Пул недоступен (упавший воркер, паттерны другой версии) - сканируем в потоке
+            metrics.increment("pii_pool_fallbacks")
+            logger.warning(f"⚠️ Пул процессов не смог просканировать текст, сканируем в потоке: {e}")
+            return None
+        if key is not None:
+            cache.put(key, spans, size)
+        return spans
+
+    async def _prescan(self, engine: PIIRedactionGateway, pool: Optional[RedactionProcessPool],
+                       contents: List[str], known_spans: Sequence[List[Span]] = ()
+                       ) -> Tuple[List[Optional[List[Span]]], List[Optional[JSONLeaves]]]:
+        """Разбор JSON документов и спаны крупных текстов из пула процессов, по тексту.
+
+        JSON документ сканируется одним текстом из своих строковых листьев: как любой
+        текст, он идет через кэш спанов и, если крупный, в пул процессов. Первые
+        тексты с готовыми спанами `known_spans` (история разговора) не сканируются.
+        """
+        leaves: List[Optional[JSONLeaves]] = [None] * len(contents)
+        if any(looks_like_json(content) for content in contents):
+            loop = asyncio.get_event_loop()
+            leaves = await loop.run_in_executor(None, lambda: [engine.json_leaves(content) for content in contents])
+        known_spans = list(known_spans)
+        scanned = [parsed[1] if parsed is not None else content
+                   for content, parsed in zip(contents[len(known_spans):], leaves[len(known_spans):])]
+        spans = await asyncio.gather(*(self._pool_spans(engine, pool, text) for text in scanned))
+        return known_spans + list(spans), leaves
+
+    def _mask_batch(self, engine: PIIRedactionGateway, contents: List[str],
+                    known: Dict[str, RedactionMapping],
+                    spans_by_content: List[Optional[List[Span]]],
+                    leaves_by_content: List[Optional[JSONLeaves]]
+                    ) -> List[Tuple[str, Dict[str, RedactionMapping], List[Span]]]:
+        """Маскирует все тексты одной задачей в пуле потоков: (маскированный текст, мапинг, спаны).
+
+        Тексты без готовых спанов (из пула процессов или истории) сканируются здесь же
+        через кэш; токены всегда выдаются здесь, по порядку текстов, и детерминированы:
+        те же спаны при тех же масках `known` дают тот же текст. JSON объекты и массивы
+        (аргументы tool calls, JSON вывод инструментов) маскируются по строковым
+        листьям и остаются валидным JSON: спаны у них - спаны текста листьев.
+        """
+        issued: Dict[str, RedactionMapping] = {}
+        # Маски, выданные предыдущим текстам пакета, тоже участвуют в проверке коллизий
+        taken = ChainMap(issued, known)
+        results = []
+        for content, spans, leaves in zip(contents, spans_by_content, leaves_by_content):
+            mapping: Dict[str, RedactionMapping] = {}
+            if content:
+                if spans is None:
+                    spans = self._scan_cached(engine, leaves[1] if leaves is not None else content)
+                if leaves is not None:
+                    masked_content = engine.apply_json_spans(content, leaves, spans, taken, mapping)
+                else:
+                    masked_content = engine.apply_spans(content, spans, taken, mapping)
+            else:
+                masked_content = content or ""
+                spans = []
+            issued.update(mapping)
+            results.append((masked_content, mapping, spans))
+        return results
+
+    def conversation_key(self, messages: List[Tuple[str, str]], caller: Optional[str] = None) -> str:
+        """Стабильный ID сессии разговора клиента `caller` по (role, content) его начальных сообщений.
+
+        Берутся сообщения до первого сообщения пользователя включительно: они не
+        меняются от хода к ходу, а один системный промпт общий у всех разговоров.
+        Одинаково начатые разговоры разных клиентов получают разные ключи.
+        Ключ - HMAC на ключе масок, чтобы ID в логах не раскрывал ни содержимое, ни клиента.
+        """
+        digest = hmac.new(self.redaction_gateway.mask_key, digestmod=hashlib.sha256)
+        caller_bytes = (caller or "").encode("utf-8", "surrogatepass")
+        digest.update(f"{len(caller_bytes)}\0".encode("utf-8") + caller_bytes)
+        for role, content in messages:
+            digest.update(f"{role}\0{len(content or '')}\0".encode("utf-8"))
+            digest.update((content or "").encode("utf-8", "surrogatepass"))
+            if role == "user":
+                break
+        return f"conv_{digest.hexdigest()[:32]}"
+
+    @staticmethod
+    def _reused_prefix(history: List[Tuple[bytes, List[Span]]],
+                       contents: List[str]) -> Tuple[int, List[bytes]]:
+        """Сколько первых текстов совпадают с уже замаскированными, и хэши всех текстов"""
+        digests = [hashlib.sha256((content or "").encode("utf-8", "surrogatepass")).digest()
+                   for content in contents]
+        reused = 0
+        for digest, (known_digest, _) in zip(digests, history):
+            if digest != known_digest:
+                break
+            reused += 1
+        return reused, digests
+
+    async def mask_many(self, contents: List[str], session_id: str) -> PIIBatchResult:
+        """Маскирует пакет текстов (например, все сообщения запроса) за один переход в пул потоков.
+
+        Сессия помнит спаны уже замаскированных текстов: у совпадающего начала пакета
+        (история разговора, которую клиент присылает каждый ход) они накладываются
+        заново без сканирования, сканируются только добавленные с прошлого хода тексты.
+        Сессия хранит хэши и смещения, а не копии текстов.
+        """
+        start_time = time.time()
+        
+        if not session_id:
+            raise PIIProcessingError("Session ID cannot be empty")
+        
+        # Очистка истекших сессий - один раз на пакет
+        await self._cleanup_expired_sessions()
+        session = self._get_or_create_session(session_id)
+        engine, pool = self.redaction_gateway, self.process_pool
+        contents = list(contents)
+        
+        try:
+            loop = asyncio.get_event_loop()
+            # После перезагрузки паттернов история сканируется заново
+            history = session["history"] if session["history_version"] == engine.patterns_version else []
+            reused, digests = await loop.run_in_executor(None, self._reused_prefix, history, contents)
+            # Крупные новые тексты параллельно сканируются в пуле процессов, затем все
+            # тексты маскируются одной задачей в пуле потоков
+            spans, leaves = await self._prescan(engine, pool, contents,
+                                                [known_spans for _, known_spans in history[:reused]])
+            batch = await loop.run_in_executor(None, self._mask_batch, engine, contents,
+                                               session["mappings"], spans, leaves)
+        except PIIScanBudgetExceededError:
+            raise
+        except Exception as e:
+            raise PIIProcessingError(f"Failed to mask PII data: {str(e)}")
+        
+        session["history"] = [(digest, spans) for digest, (_, _, spans) in zip(digests, batch)]
+        session["history_version"] = engine.patterns_version
+        metrics.increment("pii_conversation_messages_reused", reused)
+        metrics.increment("pii_conversation_messages_scanned", len(contents) - reused)
+        
+        results = []
+        pii_types: Dict[str, int] = {}
+        for masked_content, mapping, _ in batch:
+            self._store_mappings(session, mapping)
+            results.append(self._build_result(masked_content, mapping, session, session_id))
+            for redaction in mapping.values():
+                pii_types[redaction.type] = pii_types.get(redaction.type, 0) + 1
+        pii_count = sum(result.pii_count for result in results)
+        
+        processing_time = (time.time() - start_time) * 1000
+        logger.info(f"🔒 [{session_id}] Пакетное маскирование {len(results)} текстов - найдено {pii_count} PII элементов", extra={
+            "session_id": session_id,
+            "batch_size": len(results),
+            "reused_from_history": reused,
+            "pii_count": pii_count,
+            "pii_types": pii_types,
+            "processing_time_ms": round(processing_time, 2)
+        })
+        
+        return PIIBatchResult(
+            results=results,
             session_id=session_id,
-            pii_count=pii_count
+            pii_count=pii_count,
+            pii_types=pii_types
         )
 
+    async def unmask_many(self, contents: List[str], session_id: str,
+                          json_documents: Sequence[bool] = ()) -> List[str]:
+        """Демаскирует пакет текстов (ответы, аргументы tool calls) за один переход в пул потоков.
+
+        Тексты, отмеченные в json_documents (аргументы tool calls), демаскируются
+        с JSON экранированием оригиналов и остаются валидным JSON.
+        """
+        start_time = time.time()
+        
+        if session_id not in self.sessions:
+            logger.error(f"❌ [{session_id}] PII сессия не найдена!")
+            raise PIISessionNotFoundError(f"PII session not found: {session_id}")
+        
+        session = self.sessions[session_id]
+        engine = self.redaction_gateway
+        mappings = session["mappings"]
+        
+        escaped = list(json_documents) + [False] * (len(contents) - len(json_documents))
+        
+        def unmask_batch() -> List[str]:
+            return [engine.unmask_sensitive_data(content, mappings, json_escape) if content else (content or "")
+                    for content, json_escape in zip(contents, escaped)]
+        
+        loop = asyncio.get_event_loop()
+        unmasked = await loop.run_in_executor(None, unmask_batch)
+        self._touch(session_id, session)
+        
+        changed = sum(1 for before, after in zip(contents, unmasked) if before != after)
+        processing_time = (time.time() - start_time) * 1000
+        logger.info(f"🔓 [{session_id}] Пакетное демаскирование {len(unmasked)} текстов, изменено {changed}", extra={
+            "session_id": session_id,
+            "batch_size": len(unmasked),
+            "changed": changed,
+            "mappings_applied": len(mappings),
+            "processing_time_ms": round(processing_time, 2)
+        })
+        return unmasked
+
     async def unmask_sensitive_data(self, content: str, session_id: str) -> str:
         start_time = time.time()
         
@@ -178,22 +627,17 @@ class AsyncPIISecurityGateway(PIISecurityGateway):
         # Показываем доступные мапинги
         if self.debug_mode and mappings_count > 0:
             logger.debug(f"🗂️ [{session_id}] Доступные мапинги для демаскирования:")
-            for i, (masked_token, mapping_data) in enumerate(session["mappings"].items()):
-                logger.debug(f"    {i+1}. '{masked_token}' → '{mapping_data['original']}' (тип: {mapping_data['type']})")
-        
-        # Restore gateway mapping
-        self.redaction_gateway._mapping.clear()
-        for masked_token, mapping_data in session["mappings"].items():
-            self.redaction_gateway._mapping[masked_token] = RedactionMapping(
-                original=mapping_data["original"],
-                masked=masked_token,
-                type=mapping_data["type"]
-            )
+            for i, (masked_token, redaction) in enumerate(session["mappings"].items()):
+                logger.debug(f"    {i+1}. '{masked_token}' → '{redaction.original}' (тип: {redaction.type})")
         
+        # Демаскируем по мапингам сессии, не трогая общее состояние движка
+        engine = self.redaction_gateway
         loop = asyncio.get_event_loop()
-        unmasked_content = await loop.run_in_executor(None, self.redaction_gateway.unmask_sensitive_data, content)
+        unmasked_content = await loop.run_in_executor(
+            None, engine.unmask_sensitive_data, content, session["mappings"]
+        )
         
-        session["last_accessed"] = datetime.now()
+        self._touch(session_id, session)
         processing_time = (time.time() - start_time) * 1000
         
         if self.debug_mode:
@@ -219,22 +663,36 @@ class AsyncPIISecurityGateway(PIISecurityGateway):
         
         return unmasked_content
 
+    def stream_unmasker(self, session_id: str, json_escape: bool = False) -> StreamUnmasker:
+        """Демаскировщик потокового ответа по маскам сессии.
+
+        Вызывается на каждый чанк прямо в event loop: работа на чанк ограничена
+        его длиной и задержанным хвостом, переход в пул потоков стоил бы дороже.
+        С json_escape (фрагменты аргументов tool calls) оригиналы экранируются для JSON.
+        """
+        if session_id not in self.sessions:
+            logger.error(f"❌ [{session_id}] PII сессия не найдена!")
+            raise PIISessionNotFoundError(f"PII session not found: {session_id}")
+        session = self.sessions[session_id]
+        self._touch(session_id, session)
+        return StreamUnmasker(self.redaction_gateway, session["mappings"], json_escape)
+
     async def clear_session(self, session_id: str) -> None:
         if session_id in self.sessions:
             session = self.sessions[session_id]
             mappings_count = len(session["mappings"])
-            session_age = datetime.now() - session["created_at"]
+            session_age_seconds = time.monotonic() - session["created_at"]
             
             logger.info(f"🧹 [{session_id}] Очистка PII сессии", extra={
                 "session_id": session_id,
                 "mappings_count": mappings_count,
-                "session_age_seconds": session_age.total_seconds()
+                "session_age_seconds": round(session_age_seconds, 3)
             })
             
             if self.debug_mode and mappings_count > 0:
                 logger.debug(f"🗑️ [{session_id}] Удаляем следующие мапинги:")
-                for i, (masked_token, mapping_data) in enumerate(session["mappings"].items()):
-                    logger.debug(f"    {i+1}. '{masked_token}' → '{mapping_data['original']}' (тип: {mapping_data['type']})")
+                for i, (masked_token, redaction) in enumerate(session["mappings"].items()):
+                    logger.debug(f"    {i+1}. '{masked_token}' → '{redaction.original}' (тип: {redaction.type})")
             
             self.sessions.pop(session_id, None)
         else:
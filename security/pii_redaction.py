@@ -1,25 +1,399 @@
 import re
-import uuid
-import random
-from typing import Dict, Tuple, List, Any, Set
-from dataclasses import dataclass, field
+import hmac
+import json
+import hashlib
+from typing import Dict, Tuple, List, Any, Callable, Set, Optional, Iterable, Iterator
 import os
+import sys
+import logging
+import time
+from bisect import bisect_right
+from collections import Counter
+from datetime import datetime
+from llm_pii_proxy.core.exceptions import ConfigurationError
+from llm_pii_proxy.observability.metrics import metrics
+from .pattern_bundle import build_bundle, load_bundle
+from .pattern_profiler import PatternProfiler
+from .pattern_validators import VALIDATORS
+from .redos_gate import REDOS_GATE_MODES, fuzz_detectors
 
 try:
     import yaml
 except ImportError:
     yaml = None
 
-@dataclass
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+try:
+    import regex as regex_module
+except ImportError:
+    regex_module = None
+
+logger = logging.getLogger(__name__)
+
+# Fallback HMAC key for mask tokens, shared by every gateway (and pattern reload) in the process
+_PROCESS_MASK_KEY = os.urandom(32)
+
+# Wall clock time at time.monotonic_ns() == 0, to turn mask timestamps into datetimes
+_WALL_CLOCK_OFFSET = time.time() - time.monotonic()
+
+
 class RedactionMapping:
-    original: str
-    masked: str
-    type: str
+    """One issued mask. Sessions keep one per distinct secret for their whole
+    lifetime, so it is a slotted record with an interned type name and an
+    integer monotonic timestamp rather than a dataclass with a datetime."""
+
+    __slots__ = ('original', 'masked', 'type', 'created_ns')
+
+    def __init__(self, original: str, masked: str, type: str, created_at: Optional[datetime] = None):
+        self.original = original
+        self.masked = masked
+        self.type = sys.intern(type)
+        if created_at is None:
+            self.created_ns = time.monotonic_ns()
+        else:
+            self.created_ns = int((created_at.timestamp() - _WALL_CLOCK_OFFSET) * 1e9)
+
+    @property
+    def created_at(self) -> datetime:
+        return datetime.fromtimestamp(_WALL_CLOCK_OFFSET + self.created_ns / 1e9)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, RedactionMapping):
+            return NotImplemented
+        return (self.original, self.masked, self.type) == (other.original, other.masked, other.type)
+
+    def __repr__(self) -> str:
+        return f"RedactionMapping(masked={self.masked!r}, type={self.type!r})"
+
+# Window size and the longest secret the windowed scanner (mask_stream) keeps intact
+STREAM_WINDOW_CHARS = 256 * 1024
+STREAM_MAX_MATCH_CHARS = 4096
+
+# Window size of scans with a deadline: the deadline is checked after every window
+SCAN_BUDGET_WINDOW_CHARS = 64 * 1024
+
+# Type of the whole-line masks of the conservative fallback, see line_spans()
+REDACTED_LINE_TYPE = 'redacted_line'
+
+# (start, end, value_start, value_end, data_type): text[start:end] is replaced by
+# the mask of text[value_start:value_end]
+Span = Tuple[int, int, int, int, str]
+
+_LINE = re.compile(r'[^\n]+')
+
+# Start of a JSON object or array: worth parsing before a structure-aware scan
+_JSON_DOCUMENT = re.compile(r'\s*[\[{]')
+# Between the "key: value" lines of JSON leaves in one scan text. Label separators
+# stop at NUL and values at the newline, so no match runs from one leaf into the
+# next; NUL inside leaves is scanned as a space.
+_LEAF_SEPARATOR = '\n\x00\n'
+
+# (document, scan text, value offsets, leaf slots) of a JSON object or array, see json_leaves()
+JSONLeaves = Tuple[Any, str, List[int], List[Tuple[Any, Any]]]
+
+
+def _fold_case(text: str) -> str:
+    """Case fold for trigger lookups, as loose as re.IGNORECASE on every character.
+
+    casefold() alone misses two of its equivalences: dotless i stays U+0131, and
+    U+0130 (dotted capital I) becomes "i" plus a combining dot U+0307, which
+    splits a trigger like "private" in "prİvate". Dropping the combining dot can
+    only let more detectors run, never fewer.
+    """
+    return text.casefold().replace('\u0131', 'i').replace('\u0307', '')
+
+
+def looks_like_json(text: str) -> bool:
+    """Whether text starts like a JSON object or array (tool arguments, JSON tool output)"""
+    return bool(text) and _JSON_DOCUMENT.match(text) is not None
+
+
+class ScanBudgetExceeded(Exception):
+    """find_spans() passed its deadline; spans before `position` are final"""
+
+    def __init__(self, position: int, spans: List[Span]):
+        super().__init__(position, spans)
+        self.position = position
+        self.spans = spans
+
+# Grammar of the masks PIIRedactionGateway._generate_mask produces, per PII_MASK_FORMAT.
+# "hex" spells the type out: <password_1a2b3c4d>. "compact" is a short type code and
+# six decimal digits, <PW123456>: BPE tokenizers split hex ids into one token per
+# letter/digit run but take digits three at a time, so it costs a few tokens instead
+# of about a dozen.
+MASK_FORMATS = {
+    'hex': r'<[^<>\s]+_[0-9a-f]{8}>',
+    'compact': r'<[A-Z]{1,4}[0-9]{6}>',
+}
+MASK_TOKEN = re.compile(MASK_FORMATS['hex'])
+
+# Type codes of the compact format; other types use the initials of their words
+MASK_TYPE_CODES = {
+    'password': 'PW',
+    'api_key': 'KEY',
+    'aws_key': 'AWS',
+    'aws_secret': 'AWSS',
+    'jwt_token': 'JWT',
+    'private_key': 'PK',
+    'connection_string': 'DSN',
+    'ip_address': 'IP',
+    'redacted_line': 'LINE',
+}
+_COMPACT_ID_SPACE = 10 ** 6
+
+
+def _type_code(mask_type: str) -> str:
+    """Compact-format code of a mask type: its entry in MASK_TYPE_CODES or its initials"""
+    code = MASK_TYPE_CODES.get(mask_type)
+    if code is None:
+        code = ''.join(word[0] for word in mask_type.split('_') if word).upper()
+        code = ''.join(ch for ch in code if 'A' <= ch <= 'Z')[:4] or 'PII'
+    return code
+
+# Inline flags that can be carried over into a scoped "(?flags:...)" group
+_SCOPED_FLAGS = ((re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's'), (re.VERBOSE, 'x'))
+_LEADING_FLAGS = re.compile(r'^\(\?([aiLmsux]+)\)')
+
+
+def _scoped_source(regex: re.Pattern) -> str:
+    """Rewrite a compiled regex as a self-contained group that keeps its own flags"""
+    source = regex.pattern
+    # Global inline flags are only legal at the start of a whole expression
+    while True:
+        leading = _LEADING_FLAGS.match(source)
+        if not leading:
+            break
+        source = source[leading.end():]
+    flags = ''.join(letter for flag, letter in _SCOPED_FLAGS if regex.flags & flag)
+    return f"(?{flags}:{source})" if flags else f"(?:{source})"
+
+
+class RegexEngine:
+    """Regex backend the detectors are compiled with (stdlib re, backtracking)"""
+
+    name = 're'
+    linear_time = False
+
+    def compile(self, source: str):
+        return re.compile(source)
+
+
+class RegexModuleEngine(RegexEngine):
+    """The third-party regex module"""
+
+    name = 'regex'
+
+    def compile(self, source: str):
+        return regex_module.compile(source, regex_module.V0)
+
+
+class RE2Engine(RegexEngine):
+    """Google RE2 bindings: guaranteed linear time, no lookarounds or backreferences"""
+
+    name = 're2'
+    linear_time = True
+
+    def __init__(self):
+        self._options = re2.Options()
+        self._options.log_errors = False
+
+    def compile(self, source: str):
+        return re2.compile(source, self._options)
+
+
+REGEX_ENGINES = {
+    're2': (RE2Engine, lambda: re2 is not None),
+    'regex': (RegexModuleEngine, lambda: regex_module is not None),
+    're': (RegexEngine, lambda: True),
+}
+
+
+def load_regex_engine(name: str = 'auto') -> RegexEngine:
+    """Return the requested backend; 'auto' prefers linear-time engines that are installed"""
+    name = (name or 'auto').lower()
+    if name == 'auto':
+        for candidate, (engine_class, available) in REGEX_ENGINES.items():
+            if available():
+                return engine_class()
+    if name not in REGEX_ENGINES:
+        raise ValueError(f"Unknown regex engine: {name}")
+    engine_class, available = REGEX_ENGINES[name]
+    if not available():
+        logger.warning(f"Regex engine '{name}' is not installed, falling back to 're'")
+        return RegexEngine()
+    return engine_class()
+
+
+def resolve_overlaps(matches: List[Tuple[int, int, str, str]],
+                     key: Optional[Callable[[tuple], Any]] = None) -> List[Tuple[int, int, str, str]]:
+    """Pick non-overlapping (start, end, value, type, ...) matches, longest value first.
+
+    Candidates are visited by (-len(value), start), or by `key`; each is accepted
+    unless it overlaps an already accepted span. Offsets taken by accepted spans
+    are marked in a bytearray, so the overlap test is one find() over the
+    candidate's own range, with no per-span bookkeeping. Matches must not be
+    empty. Returns the winners by position.
+    """
+    if not matches:
+        return []
+    covered = bytearray(max(match[1] for match in matches))
+    accepted: List[Tuple[int, int, str, str]] = []
+    for match in sorted(matches, key=key or (lambda x: (-len(x[2]), x[0]))):
+        start, end = match[0], match[1]
+        if covered.find(1, start, end) >= 0:
+            continue
+        covered[start:end] = b'\x01' * (end - start)
+        accepted.append(match)
+    accepted.sort(key=lambda match: match[0])
+    return accepted
+
+
+class PatternScanner:
+    """Finds candidate spans for every detector, one finditer per detector.
+
+    A detector may declare trigger literals, at least one of which has to occur
+    (case-insensitively) for it to match. Before scanning, the text is checked for
+    all triggers at once and only detectors whose triggers were seen, plus the
+    anchorless ones, are run. Running detectors one by one measured faster than a
+    single alternation of lookaheads over all of them on every engine (the
+    alternation is retried at every offset), and gives the same candidates.
+
+    Detectors are compiled with the given regex engine; detectors an engine cannot
+    compile stay on stdlib re and are listed in `incompatible`.
+
+    With a `profiler` attached every active detector is timed.
+    """
+
+    def __init__(self, patterns: Dict[str, List[re.Pattern]],
+                 triggers: Optional[Dict[str, List[Tuple[str, ...]]]] = None,
+                 engine: Optional[RegexEngine] = None,
+                 value_groups: Optional[Dict[str, List[Optional[str]]]] = None):
+        triggers = triggers or {}
+        value_groups = value_groups or {}
+        self.engine = engine or RegexEngine()
+        self._detectors: List[Tuple[str, Any]] = []
+        self._triggers: List[Tuple[str, ...]] = []
+        # Name of the group holding the secret per detector, None for the whole match
+        self._value_groups: List[Optional[str]] = []
+        # Detectors the engine could not compile, left on stdlib re
+        self._fallback: Set[int] = set()
+        # Detectors compiled by a linear-time engine, immune to catastrophic backtracking
+        self.linear: Set[int] = set()
+        self.incompatible: List[Tuple[str, str, str]] = []
+        for data_type, regexes in patterns.items():
+            declared = triggers.get(data_type, [])
+            groups = value_groups.get(data_type, [])
+            for position, regex in enumerate(regexes):
+                self._detectors.append((data_type, self._compile(data_type, regex)))
+                literals = declared[position] if position < len(declared) else ()
+                self._triggers.append(tuple(_fold_case(literal) for literal in literals))
+                self._value_groups.append(groups[position] if position < len(groups) else None)
+        # Group numbers of the value groups (re2 only takes numbers), 0 for the whole match
+        self._value_numbers = [regex.groupindex[group] if group else 0
+                               for regex, group in zip((regex for regexes in patterns.values() for regex in regexes),
+                                                       self._value_groups)]
+        self._all_triggers = sorted({literal for literals in self._triggers for literal in literals})
+        self.profiler: Optional[PatternProfiler] = None
+
+    def _compile(self, data_type: str, regex: re.Pattern):
+        """Compile one detector with the engine, keeping stdlib re if it is unsupported"""
+        index = len(self._detectors)
+        if self.engine.name == 're':
+            return regex
+        try:
+            compiled = self.engine.compile(_scoped_source(regex))
+        except Exception as e:
+            self.incompatible.append((data_type, regex.pattern, str(e)))
+            self._fallback.add(index)
+            return regex
+        if self.engine.linear_time:
+            self.linear.add(index)
+        return compiled
+
+    def active_detectors(self, text: str) -> Tuple[int, ...]:
+        """Indices of detectors that can match in text, judged by their triggers"""
+        if not self._all_triggers:
+            return tuple(range(len(self._detectors)))
+        haystack = _fold_case(text)
+        seen = {literal for literal in self._all_triggers if literal in haystack}
+        active = tuple(
+            index for index, literals in enumerate(self._triggers)
+            if not literals or not seen.isdisjoint(literals)
+        )
+        triggered = sum(1 for index in active if self._triggers[index])
+        metrics.increment("pii_prefilter_scans")
+        metrics.increment("pii_prefilter_hits", triggered)
+        metrics.increment("pii_prefilter_skips", len(self._detectors) - len(active))
+        return active
+
+    def scan(self, text: str) -> List[Tuple[int, int, str, int]]:
+        """Return (start, end, data_type, detector_index) for every candidate match"""
+        detectors = self._detectors
+        return [(start, end, detectors[index][0], index)
+                for start, end, _, _, index in self.candidates(text)]
+
+    def candidates(self, text: str) -> List[Tuple[int, int, int, int, int]]:
+        """Return (start, end, value_start, value_end, detector_index) for every candidate match.
+
+        The value is the detector's value group, or the whole match if it has none;
+        (-1, -1) if the group did not take part in the match. Matches of a single
+        detector never overlap each other (finditer), empty matches are dropped.
+        """
+        if not self._detectors or not text:
+            return []
+        detectors = self._detectors
+        active = self.active_detectors(text)
+        if self.profiler is not None:
+            return self._scan_profiled(text, active)
+        value_numbers = self._value_numbers
+        candidates = []
+        for index in active:
+            regex, group = detectors[index][1], value_numbers[index]
+            for match in regex.finditer(text):
+                if match.end() > match.start():
+                    value_start, value_end = match.span(group)
+                    candidates.append((match.start(), match.end(), value_start, value_end, index))
+        return candidates
+
+    def _scan_profiled(self, text: str, active: Tuple[int, ...]) -> List[Tuple[int, int, int, int, int]]:
+        """candidates() with one finditer per detector, timing each"""
+        candidates = []
+        seconds = {}
+        for index in active:
+            regex, group = self._detectors[index][1], self._value_numbers[index]
+            started = time.perf_counter()
+            candidates.extend((match.start(), match.end(), *match.span(group), index)
+                              for match in regex.finditer(text) if match.end() > match.start())
+            seconds[index] = time.perf_counter() - started
+        self.profiler.record_scan(len(text), active, seconds)
+        return candidates
 
 class PIIRedactionGateway:
-    def __init__(self, config_path: str = "llm_pii_proxy/config/pii_patterns.yaml"):
+    """Compiled PII detectors plus mask/unmask.
+
+    After construction the gateway is not modified by masking when callers pass
+    their own per-request `mapping`, so one instance can serve many requests on a
+    thread pool concurrently. The internal `_mapping` is only the default for
+    standalone, single-threaded use.
+    """
+
+    def __init__(self, config_path: str = "llm_pii_proxy/config/pii_patterns.yaml",
+                 regex_engine: Optional[str] = None, mask_key: Optional[bytes] = None,
+                 profile_patterns: Optional[bool] = None, redos_gate: Optional[str] = None,
+                 mask_format: Optional[str] = None):
         """Initialize the gateway with patterns for sensitive data, loaded from config if available"""
         self._mapping: Dict[str, RedactionMapping] = {}
+        # Tenant key for mask tokens; without PII_MASK_KEY tokens are stable per process
+        self.mask_key = (mask_key or os.getenv('PII_MASK_KEY', '').encode('utf-8') or _PROCESS_MASK_KEY)
+        self.mask_format = (mask_format or os.getenv('PII_MASK_FORMAT', 'hex')).lower()
+        if self.mask_format not in MASK_FORMATS:
+            raise ValueError(f"Unknown mask format: {self.mask_format}, choose from {sorted(MASK_FORMATS)}")
+        # Unmasking and the already-masked check recognize exactly the tokens this gateway issues
+        self.mask_token = re.compile(MASK_FORMATS[self.mask_format])
         self.mask_type_map = {
             'aws_access_key': 'aws_key',
             'aws_secret': 'aws_secret',
@@ -33,240 +407,562 @@ class PIIRedactionGateway:
             'api_key': 'api_key'
         }
         self.patterns = {}
-        self.priority_patterns = {}
-        self.aws_patterns = {}
+        self.triggers = {}
+        self.value_groups = {}
+        self.priorities = {}
+        self.validators = {}
         self._load_patterns(config_path)
+        # Flat plan indexed like the scanner's detectors: (data_type, priority, validators)
+        self._detector_plan: List[Tuple[str, int, Tuple[Callable[[str], bool], ...]]] = []
+        for data_type, regexes in self.patterns.items():
+            priorities = self.priorities.get(data_type) or [0] * len(regexes)
+            validators = self.validators.get(data_type) or [()] * len(regexes)
+            for position in range(len(regexes)):
+                self._detector_plan.append(
+                    (data_type, priorities[position], tuple(VALIDATORS[name] for name in validators[position]))
+                )
+        engine = load_regex_engine(regex_engine or os.getenv('PII_REGEX_ENGINE', 'auto'))
+        self.scanner = PatternScanner(self.patterns, self.triggers, engine, self.value_groups)
+        for data_type, pattern, reason in self.scanner.incompatible:
+            logger.warning(f"PII pattern '{data_type}' is not supported by the '{engine.name}' "
+                           f"regex engine, using 're' for it: {pattern!r} ({reason})")
+        logger.info(f"PII patterns {self.patterns_version[:12]} compiled with the '{engine.name}' "
+                    f"regex engine (linear time: {engine.linear_time})")
+        self.redos_findings = self._check_redos(redos_gate or os.getenv('PII_REDOS_GATE', 'off'))
+        # Opt-in per-detector profiling; times every detector run, so off by default.
+        # Attached after the warm-up, which is not traffic
+        self.profiler: Optional[PatternProfiler] = None
+        self.warm_up()
+        if profile_patterns is None:
+            profile_patterns = os.getenv('PII_PROFILE_PATTERNS', 'false').lower() == 'true'
+        if profile_patterns:
+            self.profiler = PatternProfiler([
+                (data_type, position, regex.pattern, triggers[position] if position < len(triggers) else ())
+                for data_type, regexes in self.patterns.items()
+                for triggers in [self.triggers.get(data_type) or []]
+                for position, regex in enumerate(regexes)
+            ])
+            self.scanner.profiler = self.profiler
+            logger.info("PII pattern profiling is on: detectors are scanned one by one")
+
+    def profile_report(self, top: Optional[int] = None) -> Optional[List[dict]]:
+        """Per-detector scan time and match counts, slowest first; None unless profiling"""
+        return self.profiler.report(top) if self.profiler is not None else None
 
     def _load_patterns(self, config_path: str):
-        """Load regex patterns from a YAML config file, fallback to built-in if not found"""
-        if yaml is not None and os.path.exists(config_path):
-            with open(config_path, 'r') as f:
-                config = yaml.safe_load(f)
-            for key, entries in config.items():
-                self.patterns[key] = [re.compile(e['pattern'], re.MULTILINE | re.DOTALL) for e in entries]
+        """Load regex patterns from the prebuilt bundle or the YAML config, fallback to built-in if not found"""
+        bundle = load_bundle(config_path)
+        if bundle is None and yaml is not None and os.path.exists(config_path):
+            bundle = build_bundle(config_path)
+        if bundle is not None:
+            self.patterns_version = bundle['source_hash']
+            for key, entries in bundle['patterns'].items():
+                self.patterns[key] = [re.compile(e['pattern'], bundle['flags']) for e in entries]
+                self.triggers[key] = [tuple(e['triggers']) for e in entries]
+                self.value_groups[key] = [e['value_group'] for e in entries]
+                self.priorities[key] = [e['priority'] for e in entries]
+                self.validators[key] = [tuple(e['validators']) for e in entries]
         else:
             # Fallback to built-in patterns (legacy)
             self.patterns = {
                 'ip_address': [re.compile(r'\b(?:\d{1,3}\.){3}\d{1,3}\b')],
-                'password': [re.compile(r'(?i)(?:password|passwd|pwd)[\s:=\"\']+[^\s\"\'\n]+')],
-                'api_key': [re.compile(r'(?i)(?:api[_-]?key|access[_-]?key|secret[_-]?key|token)[\s:=\"\']+[^\s\"\'\n]+')],
-                'aws_key': [re.compile(r'(AKIA[A-Z0-9]{12,})')],
+                'password': [re.compile(r'(?i)(?:password|passwd|pwd)[\s:=\"\']+(?P<value>[^\s\"\'\n]+)')],
+                'api_key': [re.compile(r'(?i)(?:api[_-]?key|access[_-]?key|secret[_-]?key|token)[\s:=\"\']+(?P<value>[^\s\"\'\n]+)')],
+                'aws_key': [re.compile(r'AKIA[A-Z0-9]{12,}')],
             }
+            self.triggers = {
+                'password': [('passw', 'pwd')],
+                'api_key': [('api', 'access', 'secret', 'token')],
+                'aws_key': [('AKIA',)],
+            }
+            self.value_groups = {'password': ['value'], 'api_key': ['value']}
+            self.validators = {'ip_address': [('ipv4',)]}
+            self.patterns_version = 'builtin'
 
-    def _generate_mask(self, type: str) -> str:
-        """Generate a unique mask for sensitive data"""
-        # Generate a random 8-character hex string
-        random_hex = ''.join(random.choice('0123456789abcdef') for _ in range(8))
-        
+    def _check_redos(self, mode: str) -> List[dict]:
+        """Fuzz backtracking detectors with worst-case inputs; 'reject' fails the load on a slow one"""
+        mode = mode.lower()
+        if mode not in REDOS_GATE_MODES:
+            raise ConfigurationError(f"PII_REDOS_GATE must be one of {REDOS_GATE_MODES}, got {mode!r}")
+        if mode == 'off':
+            return []
+        budget_ms = float(os.getenv('PII_REDOS_BUDGET_MS', '100'))
+        chars = int(os.getenv('PII_REDOS_INPUT_CHARS', '32768'))
+        detectors = [(data_type, position, regex) for data_type, regexes in self.patterns.items()
+                     for position, regex in enumerate(regexes)]
+        probes = []
+        for index, (data_type, position, regex) in enumerate(detectors):
+            if index in self.scanner.linear:
+                continue
+            if self.scanner._detectors[index][1] is not regex and self.scanner.engine.name == 'regex':
+                probes.append((index, 'regex', _scoped_source(regex), 0))
+            else:
+                probes.append((index, 're', regex.pattern, regex.flags))
+        started = time.perf_counter()
+        findings = []
+        for finding in fuzz_detectors(probes, budget_ms / 1000, chars):
+            data_type, position, regex = detectors[finding.pop("index")]
+            findings.append({"data_type": data_type, "position": position, "pattern": regex.pattern, **finding})
+        logger.info(f"ReDoS gate: {len(probes)} backtracking PII patterns fuzzed with {chars}-char inputs "
+                    f"in {time.perf_counter() - started:.2f}s, {len(findings)} over {budget_ms:g} ms")
+        if not findings:
+            return findings
+        metrics.increment("pii_redos_flagged", len(findings))
+        report = "; ".join(
+            f"{f['data_type']}[{f['position']}] {f['pattern']!r}: "
+            + ("no result within the budget" if f['timed_out'] else f"{f['seconds'] * 1000:.0f} ms")
+            + f" on {f['input']}"
+            for f in findings)
+        if mode == 'reject':
+            raise ConfigurationError(f"PII patterns exceed the {budget_ms:g} ms ReDoS budget: {report}")
+        logger.warning(f"PII patterns exceed the {budget_ms:g} ms ReDoS budget: {report}")
+        return findings
+
+    def warm_up(self) -> None:
+        """Run every regex and a mask/unmask round trip once before serving"""
+        triggers = ' '.join(f"{literal} x" for literal in self.scanner._all_triggers)
+        for sample in ("plain text 127.0.0.1", triggers):
+            self.scanner.scan(sample)
+        # A mapping of its own: the gateway's default mapping stays empty
+        mapping: Dict[str, RedactionMapping] = {}
+        masked = self.mask_sensitive_data("password: warm-up on 127.0.0.1", None, mapping)
+        self.unmask_sensitive_data(masked, mapping)
+        self.unmask_sensitive_data(masked, mapping, json_escape=True)
+
+    def _generate_mask(self, type: str, value: str,
+                       known: Optional[Dict[str, RedactionMapping]] = None,
+                       mapping: Optional[Dict[str, RedactionMapping]] = None) -> str:
+        """Generate a deterministic mask for sensitive data.
+
+        The token is a keyed HMAC of (mask type, value), so a secret gets the same
+        token every time it is seen and the masked prompt prefix stays byte-identical
+        across turns. A token already taken by a different value, in `mapping` or in
+        `known`, is a collision and is re-derived with a counter.
+        """
+        mapping = self._mapping if mapping is None else mapping
         # Get the mask type from the mapping
         mask_type = self.mask_type_map.get(type, type)
-        return f"<{mask_type}_{random_hex}>"
+        message = f"{mask_type}\x00{value}"
+        attempt = 0
+        while True:
+            digest = hmac.new(self.mask_key, message.encode('utf-8'), hashlib.sha256).hexdigest()
+            if self.mask_format == 'compact':
+                masked = f"<{_type_code(mask_type)}{int(digest[:12], 16) % _COMPACT_ID_SPACE:06d}>"
+            else:
+                masked = f"<{mask_type}_{digest[:8]}>"
+            existing = mapping.get(masked)
+            if existing is None and known:
+                existing = known.get(masked)
+            if existing is None or existing.original == value:
+                return masked
+            attempt += 1
+            metrics.increment("pii_mask_collisions")
+            message = f"{mask_type}\x00{value}\x00{attempt}"
 
-    def _find_matches(self, text: str, pattern: str) -> List[Tuple[int, int, str]]:
-        """Find all non-overlapping matches for a pattern"""
-        matches = []
-        
-        # First try the priority patterns
-        if pattern in self.priority_patterns:
-            for regex in self.priority_patterns[pattern]:
-                for match in regex.finditer(text):
-                    value = match.group(0)
-                    if ':' in value:
-                        label, value = value.split(':', 1)
-                        value = value.strip()
-                        if not value and '\n' in text[match.end():]:
-                            next_line = text[match.end():].split('\n')[1].strip()
-                            if next_line:
-                                value = next_line
-                                match = type('Match', (), {'start': lambda: match.start(), 'end': lambda: match.end() + len(next_line) + 1})
-
-                    # Handle AWS key formats
-                    if pattern.startswith('aws_'):
-                        value = value.strip('"\'- \t\n\r')
-                        if pattern == 'aws_access_key' and 'AKIA' in value:
-                            # Try to get from capture group first
-                            if len(match.groups()) > 0 and match.group(1):
-                                value = match.group(1)
-                                # Update match positions to just the captured group
-                                start = match.start(1)
-                                end = match.end(1)
-                                match = type('Match', (), {'start': lambda: start, 'end': lambda: end})
-                            else:
-                                akia_match = re.search(self.aws_patterns['aws_access_key'], value)
-                                if akia_match:
-                                    value = akia_match.group(1) if akia_match.groups() else akia_match.group(0)
-                                    start = match.start() + value.find(value)
-                                    match = type('Match', (), {'start': lambda: start, 'end': lambda: start + len(value)})
-                        elif pattern == 'aws_secret' and len(value) >= 20:
-                            # Try to get from capture group first
-                            if len(match.groups()) > 0 and match.group(1):
-                                value = match.group(1)
-                                # Update match positions to just the captured group
-                                start = match.start(1)
-                                end = match.end(1)
-                                match = type('Match', (), {'start': lambda: start, 'end': lambda: end})
-                            else:
-                                secret_match = re.search(self.aws_patterns['aws_secret'], value)
-                                if secret_match:
-                                    value = secret_match.group(1) if secret_match.groups() else secret_match.group(0)
-                                    start = match.start() + value.find(value)
-                                    match = type('Match', (), {'start': lambda: start, 'end': lambda: start + len(value)})
-
-                    # Handle password and connection string formats
-                    elif pattern in ['password', 'connection_string']:
-                        # Try to get the actual value from capture group if available
-                        if len(match.groups()) > 0 and match.group(1):
-                            value = match.group(1)
-                            # Update match positions to just the captured group
-                            start = match.start(1)
-                            end = match.end(1)
-                            match = type('Match', (), {'start': lambda: start, 'end': lambda: end})
-                        else:
-                            value = value.strip('"\'- \t\n\r')
-                            # For connection strings, try to extract the whole URL
-                            if pattern == 'connection_string' and '://' in value:
-                                url_match = re.search(r'[^\s"\'\n]+://[^\s"\'\n]+', value)
-                                if url_match:
-                                    value = url_match.group(0)
-                                    start = match.start() + value.find(url_match.group(0))
-                                    match = type('Match', (), {'start': lambda: start, 'end': lambda: start + len(value)})
-
-                    if not value:
-                        continue
-                    matches.append((match.start(), match.end(), value))
-
-        # Then try the AWS patterns directly if we're looking for AWS keys
-        if pattern.startswith('aws_') and pattern in self.aws_patterns:
-            for regex in self.aws_patterns[pattern]:
-                for match in regex.finditer(text):
-                    value = match.group(0)
-                    if not value:
-                        continue
-                    # Check if this region overlaps with any existing match
-                    overlaps = False
-                    for start, end, _ in matches:
-                        if (match.start() < end and match.end() > start):
-                            overlaps = True
-                            break
-                    if not overlaps:
-                        matches.append((match.start(), match.end(), value))
-
-        # Then try the regular patterns if no priority pattern matches were found
-        if not matches and pattern in self.patterns:
-            for regex in self.patterns[pattern]:
-                for match in regex.finditer(text):
-                    value = match.group(0)
-                    if ':' in value:
-                        label, value = value.split(':', 1)
-                        value = value.strip()
-                        if not value and '\n' in text[match.end():]:
-                            next_line = text[match.end():].split('\n')[1].strip()
-                            if next_line:
-                                value = next_line
-                                match = type('Match', (), {'start': lambda: match.start(), 'end': lambda: match.end() + len(next_line) + 1})
-                    if not value:
-                        continue
-                    matches.append((match.start(), match.end(), value))
-
-        # Sort matches by length (longest first) and position
-        return sorted(matches, key=lambda x: (-len(x[2]), x[0]))
-
-    def _find_aws_keys(self, text: str) -> List[Tuple[int, int, str, str]]:
-        """Find all AWS keys in the text"""
-        matches = []
-        
-        # Find all AKIA keys
-        for regex in self.aws_patterns['aws_access_key']:
-            for match in regex.finditer(text):
-                matches.append((match.start(), match.end(), match.group(0), 'aws_access_key'))
-        
-        # Find all secret keys
-        for regex in self.aws_patterns['aws_secret']:
-            for match in regex.finditer(text):
-                matches.append((match.start(), match.end(), match.group(0), 'aws_secret'))
-        
-        # Sort matches by position
-        return sorted(matches, key=lambda x: x[0])
-
-    def mask_sensitive_data(self, text: str) -> str:
+    def mask_sensitive_data(self, text: str,
+                            known: Optional[Dict[str, RedactionMapping]] = None,
+                            mapping: Optional[Dict[str, RedactionMapping]] = None) -> str:
         """
         Replace sensitive data with masked values
         Returns the masked text
+        
+        The masks are recorded in `mapping`, the caller's per-request mapping
+        (the gateway's own mapping if omitted). `known` holds masks issued earlier,
+        e.g. in the same session, so new tokens never collide with them.
         """
         if not text:
             return text
+        return self.apply_spans(text, self._find_spans(text), known, mapping)
+
+    def mask_json(self, text: str,
+                  known: Optional[Dict[str, RedactionMapping]] = None,
+                  mapping: Optional[Dict[str, RedactionMapping]] = None,
+                  scan: Optional[Callable[[str], List[Span]]] = None) -> Optional[str]:
+        """
+        Mask the string leaves of a JSON object or array, e.g. tool call arguments
+        or a JSON tool output; keys, numbers and the structure are not scanned.
         
-        # Collect all matches from all patterns
-        all_matches = []
+        Returns the document re-serialized compactly, the text itself if nothing was
+        masked, or None if the text is not a JSON object or array. `scan` returns
+        the spans of a text, find_spans() by default. See json_leaves() and
+        apply_json_spans() for the two halves.
+        """
+        leaves = self.json_leaves(text)
+        if leaves is None:
+            return None
+        scan = scan or self.find_spans
+        return self.apply_json_spans(text, leaves, scan(leaves[1]), known, mapping)
+
+    def json_leaves(self, text: str) -> Optional[JSONLeaves]:
+        """
+        Parse a JSON object or array into (document, scan text, value offsets, slots);
+        None for any other text.
         
-        # Process priority patterns first
-        for data_type in self.priority_patterns:
-            matches = self._find_matches(text, data_type)
-            for start, end, value in matches:
-                all_matches.append((start, end, value, data_type))
+        The scan text holds every non-empty string leaf as "key: value" with its
+        nearest key, so detectors that need a label still see it, one leaf per
+        _LEAF_SEPARATOR. All leaves are scanned in a single pass of that text, which
+        can go through the span cache or the process pool like any other text.
+        offsets[i] is where the value of leaf i starts in it, slots[i] the
+        (container, key or index) holding it.
+        """
+        if not looks_like_json(text):
+            return None
+        try:
+            document = json.loads(text)
+        except ValueError:
+            return None
+        if not isinstance(document, (dict, list)):
+            return None
+        lines: List[str] = []
+        offsets: List[int] = []
+        slots: List[Tuple[Any, Any]] = []
+        position = 0
+        separator = len(_LEAF_SEPARATOR)
+        # Containers still to walk with their nearest key; a container's own leaves
+        # come before those of the containers nested in it
+        stack = [(document, None)]
+        while stack:
+            node, key = stack.pop()
+            items = node.items() if isinstance(node, dict) else enumerate(node)
+            nested = []
+            for name, value in items:
+                label = name if node.__class__ is dict else key
+                if isinstance(value, str):
+                    if value:
+                        prefix = f"{label}: " if label else ''
+                        line = prefix + value
+                        if '\x00' in line:
+                            line = line.replace('\x00', ' ')
+                        offsets.append(position + len(prefix))
+                        slots.append((node, name))
+                        lines.append(line)
+                        position += len(line) + separator
+                elif isinstance(value, (dict, list)):
+                    nested.append((value, label))
+            if nested:
+                stack.extend(reversed(nested))
+        metrics.increment("pii_json_documents")
+        metrics.increment("pii_json_leaves", len(slots))
+        return document, _LEAF_SEPARATOR.join(lines), offsets, slots
+
+    def apply_json_spans(self, text: str, leaves: JSONLeaves, spans: List[Span],
+                         known: Optional[Dict[str, RedactionMapping]] = None,
+                         mapping: Optional[Dict[str, RedactionMapping]] = None) -> str:
+        """
+        Mask the leaves of a parsed JSON document with the spans of its scan text.
         
-        # Then process regular patterns
-        for data_type in self.patterns:
-            if data_type in self.priority_patterns:
+        Values are clipped to the leaf they end in: a secret in a key stays, keys are
+        not rewritten, and a whole-line span of the conservative fallback masks the
+        value part of its line. Masked leaves are replaced in the parsed document, so
+        `leaves` is used up. Returns the document re-serialized compactly, or `text`
+        itself if nothing was masked.
+        """
+        document, _, offsets, slots = leaves
+        if mapping is None:
+            mapping = self._mapping
+        # Per leaf: (start, end, mask) relative to the leaf value
+        masks: Dict[int, List[Tuple[int, int, str]]] = {}
+        for _, _, value_start, value_end, data_type in spans:
+            index = bisect_right(offsets, value_end - 1) - 1
+            if index < 0:
                 continue
-            matches = self._find_matches(text, data_type)
-            for start, end, value in matches:
-                all_matches.append((start, end, value, data_type))
+            container, name = slots[index]
+            value = container[name]
+            base = offsets[index]
+            start, end = max(value_start, base) - base, min(value_end, base + len(value)) - base
+            if end <= start:
+                continue
+            masked = self._mask_value(data_type, value[start:end], known, mapping)
+            masks.setdefault(index, []).append((start, end, masked))
+        if not masks:
+            return text
+        for index, leaf_masks in masks.items():
+            container, name = slots[index]
+            value = container[name]
+            segments = []
+            position = 0
+            for start, end, masked in leaf_masks:
+                segments.append(value[position:start])
+                segments.append(masked)
+                position = end
+            segments.append(value[position:])
+            container[name] = ''.join(segments)
+        return json.dumps(document, ensure_ascii=False, separators=(',', ':'))
+
+    def find_spans(self, text: str, window_chars: Optional[int] = None,
+                   deadline: Optional[float] = None) -> List[Span]:
+        """
+        Scan text once and return its spans, (start, end, value_start, value_end, type)
+        by position: text[start:end] is replaced by the mask of text[value_start:value_end].
         
-        # Remove overlapping matches (keep longer ones)
-        filtered_matches = []
-        sorted_matches = sorted(all_matches, key=lambda x: (-len(x[2]), x[0]))
+        Spans hold offsets only, so they can be cached or sent between processes
+        without the secrets. Texts longer than `window_chars` are scanned in windows.
+        With a `deadline` (time.monotonic()) windows are at most SCAN_BUDGET_WINDOW_CHARS
+        and ScanBudgetExceeded is raised when a window, the last or only one included,
+        ends past the deadline; after the last window its spans cover the whole text.
+        """
+        if not text:
+            return []
+        if deadline is not None:
+            window_chars = min(window_chars or SCAN_BUDGET_WINDOW_CHARS, SCAN_BUDGET_WINDOW_CHARS)
+        if window_chars is None or len(text) <= window_chars:
+            spans = self._find_spans(text)
+            if deadline is not None and time.monotonic() > deadline:
+                raise ScanBudgetExceeded(len(text), spans)
+            return spans
+        spans = []
+        for base, buffer, spans_in_window, _, commit in self._scan_windows(text, window_chars, STREAM_MAX_MATCH_CHARS):
+            spans.extend((start + base, end + base, value_start + base, value_end + base, data_type)
+                         for start, end, value_start, value_end, data_type in spans_in_window)
+            if deadline is not None and time.monotonic() > deadline:
+                raise ScanBudgetExceeded(base + commit, spans)
+        return spans
+
+    def line_spans(self, text: str, first: int = 0) -> List[Span]:
+        """Conservative spans masking every suspicious line of text from `first` on.
+
+        Fallback for scans over their time budget, linear in the text: a line is
+        suspicious if it contains a trigger of any detector, matches a detector
+        without triggers or is longer than STREAM_MAX_MATCH_CHARS. Leading and
+        trailing whitespace of the line is kept.
+        """
+        triggers = self.scanner._all_triggers
+        untriggered = [regex for (_, regex), literals in zip(self.scanner._detectors, self.scanner._triggers)
+                       if not literals]
+        spans = []
+        for line in _LINE.finditer(text, first):
+            value = line.group(0)
+            if len(value) <= STREAM_MAX_MATCH_CHARS:
+                haystack = _fold_case(value)
+                if not any(literal in haystack for literal in triggers) and \
+                        not any(regex.search(value) for regex in untriggered):
+                    continue
+            stripped = value.strip()
+            if not stripped:
+                continue
+            value_start = line.start() + value.index(stripped)
+            spans.append((value_start, value_start + len(stripped), value_start,
+                          value_start + len(stripped), REDACTED_LINE_TYPE))
+        return spans
+
+    def apply_spans(self, text: str, spans: List[Span],
+                    known: Optional[Dict[str, RedactionMapping]] = None,
+                    mapping: Optional[Dict[str, RedactionMapping]] = None) -> str:
+        """Replace the spans found by find_spans() with mask tokens, recording them in `mapping`"""
+        if mapping is None:
+            mapping = self._mapping
+        # Assemble the output once from the untouched segments and the masks
+        segments = []
+        position = 0
+        for start, end, value_start, value_end, data_type in spans:
+            segments.append(text[position:start])
+            segments.append(self._mask_value(data_type, text[value_start:value_end], known, mapping))
+            position = end
+        segments.append(text[position:])
         
-        for match in sorted_matches:
-            start, end, value, data_type = match
-            # Check if this match overlaps with any already accepted match
-            overlaps = False
-            for existing_start, existing_end, _, _ in filtered_matches:
-                if start < existing_end and end > existing_start:
-                    overlaps = True
-                    break
-            if not overlaps:
-                filtered_matches.append(match)
+        return ''.join(segments)
+
+    def mask_stream(self, chunks: Iterable[str],
+                    known: Optional[Dict[str, RedactionMapping]] = None,
+                    mapping: Optional[Dict[str, RedactionMapping]] = None,
+                    window_chars: int = STREAM_WINDOW_CHARS,
+                    max_match_chars: int = STREAM_MAX_MATCH_CHARS) -> Iterator[str]:
+        """
+        Mask text given as an iterable of chunks (or one string), yielding masked
+        segments as soon as they are final. Concatenated, they equal
+        mask_sensitive_data() of the whole text.
         
-        # Sort matches by position (reverse order to avoid position shifts)
-        filtered_matches.sort(key=lambda x: x[0], reverse=True)
+        The text is scanned in windows of `window_chars` plus an overlap of twice
+        `max_match_chars`: a match starting in the window, and any match overlapping
+        it, ends inside the overlap. `max_match_chars` of already emitted text are
+        kept in front of the next window so anchors like \\b see the same context.
+        Memory is bounded by the window size, not the input size; only secrets
+        longer than `max_match_chars` may be split at a window edge.
+        """
+        if mapping is None:
+            mapping = self._mapping
+        for _, buffer, spans, position, commit in self._scan_windows(chunks, window_chars, max_match_chars):
+            segments = []
+            for start, end, value_start, value_end, data_type in spans:
+                segments.append(buffer[position:start])
+                segments.append(self._mask_value(data_type, buffer[value_start:value_end], known, mapping))
+                position = end
+            segments.append(buffer[position:commit])
+            yield ''.join(segments)
+
+    def _scan_windows(self, chunks: Iterable[str], window_chars: int,
+                      max_match_chars: int) -> Iterator[Tuple[int, str, List[Span], int, int]]:
+        """Yield (base, buffer, spans, position, commit) per window, see mask_stream().
         
-        # Apply replacements from end to beginning
-        masked_text = text
-        for start, end, value, data_type in filtered_matches:
-            masked = self._generate_mask(data_type)
-            self._mapping[masked] = RedactionMapping(
-                original=value.strip(),
-                masked=masked,
-                type=data_type
-            )
-            masked_text = masked_text[:start] + masked + masked_text[end:]
+        buffer[position:commit] is the next final piece of text, buffer starts at
+        offset `base` of the whole text and the spans are relative to the buffer.
+        """
+        if isinstance(chunks, str):
+            text = chunks
+            chunks = (text[i:i + window_chars] for i in range(0, len(text), window_chars))
+        overlap = 2 * max_match_chars
         
-        return masked_text
+        base = 0
+        buffer = ''
+        # buffer[:context] was emitted already and only serves as lookbehind
+        context = 0
+        exhausted = False
+        iterator = iter(chunks)
+        while not exhausted:
+            pending = [buffer]
+            size = len(buffer)
+            while size - context < window_chars + overlap:
+                chunk = next(iterator, None)
+                if chunk is None:
+                    exhausted = True
+                    break
+                pending.append(chunk)
+                size += len(chunk)
+            buffer = ''.join(pending)
+            if len(buffer) == context:
+                break
+            
+            # Matches starting at or after the boundary are found again in the next window
+            boundary = len(buffer) if exhausted else len(buffer) - overlap
+            spans = []
+            commit = boundary
+            for span in self._find_spans(buffer, context):
+                if span[0] >= boundary:
+                    break
+                spans.append(span)
+                commit = max(boundary, span[1])
+            yield base, buffer, spans, context, commit
+            
+            keep = max(0, commit - max_match_chars)
+            base += keep
+            buffer = buffer[keep:]
+            context = commit - keep
+
+    def _find_spans(self, text: str, first: int = 0) -> List[Span]:
+        """Non-overlapping spans starting at `first` or later, by position"""
+        plan = self._detector_plan
+        matches = []
+        empty = []
+        invalid = []
+        for _, _, value_start, value_end, index in self.scanner.candidates(text):
+            if value_end <= value_start:
+                empty.append(index)
+                continue
+            if value_start < first:
+                continue
+            # A mask sent back by the client ("password: <password_1a2b3c4d>") is no new secret;
+            # a value that only starts with one ("<password_1a2b3c4d>tail") still is
+            if self.mask_token.fullmatch(text, value_start, value_end):
+                invalid.append(index)
+                continue
+            data_type, priority, validators = plan[index]
+            if validators:
+                value = text[value_start:value_end]
+                if not all(validator(value) for validator in validators):
+                    invalid.append(index)
+                    continue
+            matches.append((value_start, value_end, data_type, index, priority))
+        # Only the value is replaced, so overlaps are between values: higher priority
+        # first, then the longer value; ties keep the order the detectors are declared in
+        accepted = resolve_overlaps(matches, key=lambda match: (-match[4], match[0] - match[1], match[0], match[3]))
+        if self.profiler is not None:
+            self.profiler.record_outcome(
+                Counter(match[3] for match in matches) + Counter(empty) + Counter(invalid),
+                Counter(empty),
+                Counter(invalid),
+                Counter(match[3] for match in accepted),
+            )
+        return [(start, end, start, end, data_type) for start, end, data_type, _, _ in accepted]
+
+    def _mask_value(self, data_type: str, original: str,
+                    known: Optional[Dict[str, RedactionMapping]],
+                    mapping: Dict[str, RedactionMapping]) -> str:
+        masked = self._generate_mask(data_type, original, known, mapping)
+        mapping[masked] = RedactionMapping(
+            original=original,
+            masked=masked,
+            type=data_type
+        )
+        return masked
 
-    def unmask_sensitive_data(self, text: str) -> str:
+    def unmask_sensitive_data(self, text: str, mapping: Optional[Dict[str, RedactionMapping]] = None,
+                              json_escape: bool = False) -> str:
         """
         Replace masked values with original sensitive data
         Returns the unmasked text
+        
+        Uses the caller's `mapping` (the gateway's own mapping if omitted). With
+        `json_escape` the text is JSON (tool call arguments): tokens only occur
+        inside its strings, so originals are restored JSON-escaped and the
+        document stays valid.
         """
-        if not text:
+        # Every mask starts with '<', so most responses leave right here
+        if not text or '<' not in text:
             return text
-            
-        unmasked_text = text
         
-        # Sort masks by length (longest first) to avoid partial replacements
-        masks = sorted(self._mapping.keys(), key=len, reverse=True)
+        if mapping is None:
+            mapping = self._mapping
+        if not mapping:
+            return text
         
-        for mask in masks:
-            if mask in unmasked_text:
-                unmasked_text = unmasked_text.replace(mask, self._mapping[mask].original)
+        def restore(token: re.Match) -> str:
+            found = mapping.get(token.group(0))
+            if found is None:
+                return token.group(0)
+            return json.dumps(found.original, ensure_ascii=False)[1:-1] if json_escape else found.original
         
-        return unmasked_text
+        # One pass over the token grammar, one dict lookup per token
+        return self.mask_token.sub(restore, text)
 
     def clear_mapping(self):
         """Clear the current mapping of masked values"""
         self._mapping.clear()
 
+
+class StreamUnmasker:
+    """
+    Unmask a response that arrives in chunks (streamed content deltas).
+
+    feed() returns the unmasked text that is final so far and holds back only
+    a suffix that could still grow into a mask token: the text from the last '<'
+    while it has no '>' or whitespace and is shorter than the longest mask in
+    `mapping`. Everything else is emitted right away, so per chunk the work is
+    the chunk plus a suffix of bounded size. flush() returns the rest at the end.
+    With `json_escape` the stream is JSON (tool call argument fragments) and
+    originals are restored JSON-escaped, as in unmask_sensitive_data().
+    """
+
+    def __init__(self, gateway: PIIRedactionGateway, mapping: Dict[str, RedactionMapping],
+                 json_escape: bool = False):
+        self._gateway = gateway
+        self._mapping = mapping
+        self._json_escape = json_escape
+        # A longer suffix cannot become a mask this stream restores
+        self._max_token_chars = max(map(len, mapping), default=0)
+        self._pending = ''
+
+    def _holdback(self, text: str) -> int:
+        """Offset where the suffix that may still be a mask starts (len(text) if none)"""
+        start = text.rfind('<')
+        if start < 0 or len(text) - start >= self._max_token_chars:
+            return len(text)
+        tail = text[start + 1:]
+        if '>' in tail or any(ch.isspace() for ch in tail):
+            return len(text)
+        return start
+
+    def feed(self, chunk: str) -> str:
+        if not chunk:
+            return ''
+        text = self._pending + chunk if self._pending else chunk
+        cut = self._holdback(text)
+        self._pending = text[cut:]
+        return self._gateway.unmask_sensitive_data(text[:cut], self._mapping, self._json_escape)
+
+    def flush(self) -> str:
+        text, self._pending = self._pending, ''
+        return self._gateway.unmask_sensitive_data(text, self._mapping, self._json_escape)
+
 # Example usage:
 if __name__ == "__main__":
     # Create gateway
@@ -0,0 +1,120 @@
+# security/redaction_pool.py
+
+# Optional process pool for scanning large texts. Regex matching is pure Python
+# and holds the GIL, so a few big tool outputs on the default thread pool keep
+# one core busy while the rest idle. Each worker process compiles the pattern
+# set once in the pool initializer; only the text goes to the worker and only
+# span offsets come back, tokens are applied by the caller.
+
+import asyncio
+import logging
+import multiprocessing
+import pickle
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from llm_pii_proxy.observability.metrics import metrics
+from .pii_redaction import PIIRedactionGateway, ScanBudgetExceeded, Span, STREAM_WINDOW_CHARS
+
+logger = logging.getLogger(__name__)
+
+# Gateway compiled in each worker process by _init_worker, and the scan window of the parent
+_worker_engine: Optional[PIIRedactionGateway] = None
+_worker_window_chars: int = STREAM_WINDOW_CHARS
+
+
+def _init_worker(config_path: str, regex_engine: str, window_chars: int, mask_format: str) -> None:
+    global _worker_engine, _worker_window_chars
+    # The parent already ran the ReDoS gate on this pattern set
+    _worker_engine = PIIRedactionGateway(config_path, regex_engine=regex_engine, redos_gate="off",
+                                         mask_format=mask_format)
+    _worker_window_chars = window_chars
+
+
+def _scan_in_worker(payload: bytes) -> bytes:
+    content, budget_seconds = pickle.loads(payload)
+    # The budget counts from the start of the scan, time queued for a worker is not included
+    deadline = time.monotonic() + budget_seconds if budget_seconds else None
+    # Pool texts are large: scan them in bounded windows
+    try:
+        spans = _worker_engine.find_spans(content, _worker_window_chars, deadline)
+        position = None
+    except ScanBudgetExceeded as e:
+        spans, position = e.spans, e.position
+    return pickle.dumps((_worker_engine.patterns_version, spans, position), pickle.HIGHEST_PROTOCOL)
+
+
+class PatternsVersionMismatch(RuntimeError):
+    """The worker compiled a different pattern set than the gateway it serves"""
+
+
+class RedactionProcessPool:
+    """Process pool bound to one compiled PIIRedactionGateway.
+
+    Workers load the same config with the same regex engine and mask format and
+    scan in windows of the same `window_chars`, so the spans they find are
+    identical to an in-thread scan. A pool is replaced together with its gateway
+    on pattern reload.
+    """
+
+    def __init__(self, engine: PIIRedactionGateway, config_path: str,
+                 max_workers: int, min_chars: int, window_chars: int = STREAM_WINDOW_CHARS):
+        self.patterns_version = engine.patterns_version
+        self.max_workers = max_workers
+        self.min_chars = min_chars
+        # spawn: forking a process that already runs an event loop and threads is unsafe
+        self._executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(config_path, engine.scanner.engine.name, window_chars, engine.mask_format),
+        )
+        self._lock = threading.Lock()
+        self._queue_depth = 0
+
+    def accepts(self, content: str) -> bool:
+        return len(content) >= self.min_chars
+
+    def _track(self, delta: int) -> None:
+        with self._lock:
+            self._queue_depth += delta
+            depth = self._queue_depth
+        metrics.set_gauge("pii_pool_queue_depth", depth)
+
+    async def scan(self, content: str, budget_seconds: Optional[float] = None) -> List[Span]:
+        """Scan content in a worker; returns the spans like PIIRedactionGateway.find_spans().
+
+        Raises ScanBudgetExceeded when the scan takes longer than budget_seconds.
+        """
+        started = time.perf_counter()
+        payload = pickle.dumps((content, budget_seconds), pickle.HIGHEST_PROTOCOL)
+        serialize_seconds = time.perf_counter() - started
+
+        self._track(1)
+        try:
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(self._executor, _scan_in_worker, payload)
+        finally:
+            self._track(-1)
+
+        started = time.perf_counter()
+        patterns_version, spans, position = pickle.loads(result)
+        serialize_seconds += time.perf_counter() - started
+
+        metrics.increment("pii_pool_tasks")
+        metrics.increment("pii_pool_bytes_sent", len(payload))
+        metrics.increment("pii_pool_bytes_received", len(result))
+        metrics.increment("pii_pool_serialization_seconds", serialize_seconds)
+        if patterns_version != self.patterns_version:
+            raise PatternsVersionMismatch(
+                f"worker patterns {patterns_version[:12]} != gateway patterns {self.patterns_version[:12]}"
+            )
+        if position is not None:
+            raise ScanBudgetExceeded(position, spans)
+        return spans
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Stop accepting work; tasks already submitted still finish"""
+        self._executor.shutdown(wait=wait)
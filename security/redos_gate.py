@@ -0,0 +1,207 @@
+# security/redos_gate.py
+
+# Load-time ReDoS gate for PII detectors. Anyone can paste adversarial text into a
+# prompt, so a backtracking detector that goes superlinear on it costs seconds of
+# CPU per request. Every backtracking detector is run against worst-case inputs
+# built from its own structure (a matching prefix, then one part pumped, then a
+# character nothing accepts) in a child process, which is killed if it hangs.
+
+import multiprocessing
+import re
+import time
+from typing import List, Optional, Tuple
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+REDOS_GATE_MODES = ("off", "warn", "reject")
+
+# (detector index, "re" | "regex", source, flags)
+Probe = Tuple[int, str, str, int]
+
+# Generic pumps for whatever follows a matching prefix: separators the label
+# classes accept, word and digit runs, and the delimiters the values stop at
+_PUMPS = (" ", "a", "0", ".", ":", "=", "-", "a ", "0.", "://")
+_CANDIDATES = "a0A_ .:=-/'\"\t\n"
+_CATEGORIES = {
+    sre_parse.CATEGORY_DIGIT: str.isdigit,
+    sre_parse.CATEGORY_NOT_DIGIT: lambda ch: not ch.isdigit(),
+    sre_parse.CATEGORY_SPACE: str.isspace,
+    sre_parse.CATEGORY_NOT_SPACE: lambda ch: not ch.isspace(),
+    sre_parse.CATEGORY_WORD: lambda ch: ch.isalnum() or ch == "_",
+    sre_parse.CATEGORY_NOT_WORD: lambda ch: not (ch.isalnum() or ch == "_"),
+}
+# Suffix that none of the value classes accept, so no attempt can complete
+_FAIL = "\x00"
+
+# Time for the child process to start and compile the detectors
+_SPAWN_TIMEOUT_SECONDS = 30.0
+
+
+def _in_class(ch: str, items) -> bool:
+    for op, av in items:
+        if op is sre_parse.LITERAL and ch == chr(av):
+            return True
+        if op is sre_parse.RANGE and av[0] <= ord(ch) <= av[1]:
+            return True
+        if op is sre_parse.CATEGORY and _CATEGORIES.get(av, lambda _: False)(ch):
+            return True
+    return False
+
+
+def _sample(items) -> str:
+    """A short string matched by a parsed (sub)pattern; lookarounds and anchors match empty"""
+    out = []
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            out.append(chr(av))
+        elif op is sre_parse.NOT_LITERAL:
+            out.append("a" if av != ord("a") else "b")
+        elif op is sre_parse.ANY:
+            out.append("a")
+        elif op is sre_parse.IN:
+            negate = bool(av) and av[0][0] is sre_parse.NEGATE
+            members = av[1:] if negate else av
+            out.append(next((ch for ch in _CANDIDATES if _in_class(ch, members) != negate), "a"))
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, "POSSESSIVE_REPEAT", None)):
+            low, _, item = av
+            out.append(_sample(item) * low)
+        elif op is sre_parse.SUBPATTERN:
+            out.append(_sample(av[-1]))
+        elif op is sre_parse.BRANCH:
+            out.append(_sample(av[1][0]))
+        elif op is getattr(sre_parse, "ATOMIC_GROUP", None):
+            out.append(_sample(av))
+    return "".join(out)
+
+
+def _sequences(items) -> List[list]:
+    """Top-level alternatives of a pattern as lists of elements, runs of literals merged"""
+    while len(items) == 1 and items[0][0] in (sre_parse.SUBPATTERN, sre_parse.BRANCH):
+        op, av = items[0]
+        if op is sre_parse.BRANCH:
+            return [sequence for branch in av[1] for sequence in _sequences(list(branch))]
+        items = list(av[-1])
+    sequence = []
+    for item in items:
+        if item[0] is sre_parse.LITERAL and sequence and sequence[-1][0][0] is sre_parse.LITERAL:
+            sequence[-1].append(item)
+        else:
+            sequence.append([item])
+    return [sequence]
+
+
+def attack_inputs(source: str, flags: int, chars: int) -> List[Tuple[str, str]]:
+    """(description, text) worst-case inputs of about `chars` characters for one pattern.
+
+    For every element of the pattern: the prefix up to and including it repeated
+    (many starts that fail late), the prefix followed by that element pumped (one
+    long run a nested quantifier can split many ways), and the prefix followed by
+    generic pumps.
+    """
+    try:
+        sequences = _sequences(list(sre_parse.parse(source, flags)))
+    except Exception:
+        # Syntax only the regex module knows: generic pumps on their own
+        sequences = []
+    attacks = [("", pump) for pump in _PUMPS]
+    for sequence in sequences:
+        samples = [_sample(element) for element in sequence]
+        for k, element_sample in enumerate(samples):
+            prefix = "".join(samples[:k])
+            if prefix + element_sample:
+                attacks.append(("", prefix + element_sample))
+            if element_sample:
+                attacks.append((prefix, element_sample))
+            if prefix:
+                attacks.extend((prefix, pump) for pump in _PUMPS)
+    inputs = {}
+    for prefix, pump in attacks:
+        repeat = max(1, (chars - len(prefix)) // len(pump))
+        text = prefix + pump * repeat + _FAIL
+        inputs.setdefault(text, f"{prefix!r} + {pump!r} * {repeat}")
+    return [(description, text) for text, description in inputs.items()]
+
+
+def _compile_probe(module: str, source: str, flags: int):
+    if module == "regex":
+        import regex
+        return regex.compile(source, flags | regex.V0)
+    return re.compile(source, flags)
+
+
+def _probe_worker(connection, probes: List[Probe], chars: int, budget_seconds: float) -> None:
+    """Child process: ("start", index), (input, seconds) per attack input, ("end", index)"""
+    for index, module, source, flags in probes:
+        compiled = _compile_probe(module, source, flags)
+        connection.send(("start", index))
+        for description, text in attack_inputs(source, flags, chars):
+            started = time.perf_counter()
+            for _ in compiled.finditer(text):
+                pass
+            seconds = time.perf_counter() - started
+            connection.send((description, seconds))
+            if seconds > budget_seconds:
+                break
+        connection.send(("end", index))
+    connection.close()
+
+
+def fuzz_detectors(probes: List[Probe], budget_seconds: float, chars: int) -> List[dict]:
+    """Detectors whose worst attack input takes longer than budget_seconds.
+
+    Returns {"index", "input", "chars", "seconds", "timed_out"} per slow detector.
+    A detector that does not finish an input within a few budgets is killed together
+    with the child process, which is restarted for the detectors after it.
+    """
+    context = multiprocessing.get_context("spawn")
+    findings = []
+    remaining = list(probes)
+    while remaining:
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_probe_worker, args=(sender, remaining, chars, budget_seconds),
+                                  daemon=True)
+        process.start()
+        sender.close()
+        current: Optional[int] = None
+        worst: Tuple[str, float] = ("", 0.0)
+        completed = 0
+        finished = set()
+        try:
+            while len(finished) < len(remaining):
+                # Startup and compiling get a generous timeout, attack inputs a few budgets
+                timeout = _SPAWN_TIMEOUT_SECONDS if current is None else budget_seconds * 5 + 0.5
+                if not receiver.poll(timeout):
+                    break
+                kind, value = receiver.recv()
+                if kind == "start":
+                    current, worst, completed = value, ("", 0.0), 0
+                elif kind == "end":
+                    if worst[1] > budget_seconds:
+                        findings.append({"index": value, "input": worst[0], "chars": chars,
+                                         "seconds": round(worst[1], 4), "timed_out": False})
+                    finished.add(value)
+                    current = None
+                else:
+                    completed += 1
+                    if value > worst[1]:
+                        worst = (kind, value)
+        except EOFError:
+            pass
+        finally:
+            if process.is_alive():
+                process.kill()
+            process.join()
+            receiver.close()
+        if current is None and len(finished) < len(remaining):
+            raise RuntimeError(f"ReDoS gate child process exited with code {process.exitcode}")
+        if current is not None:
+            _, _, source, flags = next(probe for probe in remaining if probe[0] == current)
+            description = attack_inputs(source, flags, chars)[completed][0]
+            findings.append({"index": current, "input": description, "chars": chars,
+                             "seconds": None, "timed_out": True})
+            finished.add(current)
+        remaining = [probe for probe in remaining if probe[0] not in finished]
+    return sorted(findings, key=lambda finding: finding["index"])
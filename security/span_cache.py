@@ -0,0 +1,103 @@
+# security/span_cache.py
+
+# LRU cache of scan results. Cursor resends the whole conversation every turn,
+# so most message contents were already scanned. Entries are keyed by a hash of
+# the content and the pattern set version and hold span offsets only, never the
+# secrets themselves; a hit skips the regex scan and only re-applies the tokens.
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from llm_pii_proxy.observability.metrics import metrics
+from .pii_redaction import PIIRedactionGateway, Span
+
+# Approximate memory of a cached entry, in bytes: key, list and OrderedDict slot,
+# plus one 5-tuple of small ints and an interned type name per span
+ENTRY_OVERHEAD_BYTES = 240
+SPAN_OVERHEAD_BYTES = 120
+
+CacheKey = Tuple[str, str, bytes]
+
+
+class SpanCache:
+    """Thread-safe LRU of span lists, evicting least recently used entries beyond max_bytes"""
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, min_chars: int = 256):
+        self.max_bytes = max_bytes
+        # Shorter texts are cheaper to scan than to hash and look up
+        self.min_chars = min_chars
+        self._entries: "OrderedDict[CacheKey, Tuple[List[Span], int, int]]" = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def accepts(self, text: str) -> bool:
+        return self.max_bytes > 0 and len(text) >= self.min_chars
+
+    def key_for(self, engine: PIIRedactionGateway, text: str) -> Tuple[CacheKey, int]:
+        """Cache key of text for this pattern set, and the UTF-8 size of the text"""
+        data = text.encode("utf-8", "surrogatepass")
+        digest = hashlib.sha256(data).digest()
+        # Engines differ in edge semantics (e.g. RE2's ASCII \b), so they do not share entries
+        return (engine.patterns_version, engine.scanner.engine.name, digest), len(data)
+
+    def get(self, key: CacheKey) -> Optional[List[Span]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self._hits += 1
+            hits, misses = self._hits, self._misses
+        if entry is None:
+            metrics.increment("pii_span_cache_misses")
+        else:
+            metrics.increment("pii_span_cache_hits")
+            # Bytes of text that did not have to be scanned again
+            metrics.increment("pii_span_cache_bytes_saved", entry[1])
+        metrics.set_gauge("pii_span_cache_hit_ratio", round(hits / (hits + misses), 4))
+        return None if entry is None else entry[0]
+
+    def put(self, key: CacheKey, spans: List[Span], text_bytes: int) -> None:
+        size = ENTRY_OVERHEAD_BYTES + SPAN_OVERHEAD_BYTES * len(spans)
+        if size > self.max_bytes:
+            return
+        evicted = 0
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (spans, text_bytes, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, dropped) = self._entries.popitem(last=False)
+                self._bytes -= dropped
+                evicted += 1
+            entries, used = len(self._entries), self._bytes
+        if evicted:
+            metrics.increment("pii_span_cache_evictions", evicted)
+        metrics.set_gauge("pii_span_cache_entries", entries)
+        metrics.set_gauge("pii_span_cache_bytes", used)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        metrics.set_gauge("pii_span_cache_entries", 0)
+        metrics.set_gauge("pii_span_cache_bytes", 0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
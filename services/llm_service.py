@@ -4,7 +4,7 @@ import logging
 import time
 import os
 import uuid
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 from llm_pii_proxy.core.models import ChatRequest, ChatResponse
 from llm_pii_proxy.core.exceptions import PIIProcessingError, LLMProviderError
 from llm_pii_proxy.providers.azure_provider import AzureOpenAIProvider
@@ -20,6 +20,8 @@ class LLMService:
         self.pii_gateway = pii_gateway
         # Используем централизованные настройки
         self.debug_mode = settings.pii_proxy_debug
+        # Сессия на разговор: маски живут между ходами, история не сканируется заново
+        self.conversation_affinity = settings.pii_conversation_affinity
         # Создаем свойство для динамической проверки PII
         
         logger.info(f"🔧 LLMService инициализирован", extra={
@@ -33,11 +35,67 @@ class LLMService:
         """Динамически проверяем состояние PII защиты"""
         return Settings().pii_protection_enabled
 
+    def _session_id(self, request: ChatRequest) -> str:
+        """ID PII сессии: из запроса (или заголовка), иначе ключ разговора клиента по его началу"""
+        if request.session_id:
+            return request.session_id
+        # Без ключа клиента начала разговоров разных клиентов неразличимы (общий системный
+        # промпт и "привет"), поэтому такой запрос получает свою сессию
+        if self.conversation_affinity and request._caller:
+            return self.pii_gateway.conversation_key(
+                [(message.role, message.content) for message in request.messages], request._caller
+            )
+        return uuid.uuid4().hex
+
+    async def _mask_messages(self, messages: list, session_id: str, request_id: str) -> Tuple[list, int]:
+        """Маскирует контент сообщений и аргументы их tool calls одним вызовом mask_many"""
+        # (индекс сообщения, индекс tool call или None для контента)
+        targets = []
+        contents = []
+        for i, message in enumerate(messages):
+            if message.content:
+                targets.append((i, None))
+                contents.append(message.content)
+            for j, tool_call in enumerate(message.tool_calls or []):
+                arguments = (tool_call.get("function") or {}).get("arguments")
+                if isinstance(arguments, str) and arguments:
+                    targets.append((i, j))
+                    contents.append(arguments)
+        if not contents:
+            return list(messages), 0
+        
+        try:
+            batch = await self.pii_gateway.mask_many(contents, session_id)
+        except PIIProcessingError:
+            # В том числе PIIScanBudgetExceededError (413): незамаскированный текст провайдеру не уходит
+            raise
+        except Exception as e:
+            logger.error(f"❌ [{request_id}] Ошибка маскирования сообщений: {e}")
+            raise PIIProcessingError(f"PII masking failed: {e}") from e
+        
+        masked_messages = list(messages)
+        for (i, j), pii_result in zip(targets, batch.results):
+            if pii_result.pii_count == 0:
+                continue
+            message = masked_messages[i]
+            if j is None:
+                masked_messages[i] = message.model_copy(update={"content": pii_result.content})
+                logger.info(f"🔍 [{request_id}] Сообщение {i+1}: найдено {pii_result.pii_count} PII элементов")
+            else:
+                tool_calls = list(message.tool_calls)
+                tool_call = tool_calls[j]
+                tool_calls[j] = {**tool_call, "function": {**tool_call["function"], "arguments": pii_result.content}}
+                masked_messages[i] = message.model_copy(update={"tool_calls": tool_calls})
+                logger.info(f"🔍 [{request_id}] Сообщение {i+1}, tool call {j+1}: "
+                            f"найдено {pii_result.pii_count} PII элементов в аргументах")
+        
+        return masked_messages, batch.pii_count
+
     async def process_chat_request(self, request: ChatRequest) -> ChatResponse:
         request_id = f"req_{int(time.time() * 1000)}"  # Простой ID для трекинга
         
         # Генерируем session_id если не передан
-        session_id = request.session_id or uuid.uuid4().hex
+        session_id = self._session_id(request)
         
         logger.info(f"🚀 [{request_id}] Начинаем обработку chat request", extra={
             "request_id": request_id,
@@ -55,33 +113,10 @@ class LLMService:
             if should_protect_pii:
                 logger.info(f"🔒 [{request_id}] PII защита ВКЛЮЧЕНА")
                 
-                # 1. Mask PII in messages
-                masked_messages = []
-                total_pii_count = 0
-                
-                for i, message in enumerate(request.messages):
-                    if message.content:  # Только если есть контент
-                        try:
-                            pii_result = await self.pii_gateway.mask_sensitive_data(
-                                content=message.content,
-                                session_id=session_id
-                            )
-                            
-                            masked_message = message.model_copy()
-                            masked_message.content = pii_result.content
-                            masked_messages.append(masked_message)
-                            total_pii_count += pii_result.pii_count
-                            
-                            if pii_result.pii_count > 0:
-                                logger.info(f"🔍 [{request_id}] Сообщение {i+1}: найдено {pii_result.pii_count} PII элементов")
-                            
-                        except Exception as e:
-                            logger.error(f"❌ [{request_id}] Ошибка маскирования сообщения {i+1}: {e}")
-                            # В случае ошибки используем оригинальное сообщение
-                            masked_messages.append(message)
-                    else:
-                        # Сообщение без контента
-                        masked_messages.append(message)
+                # 1. Mask PII in messages - одним пакетом на весь запрос
+                masked_messages, total_pii_count = await self._mask_messages(
+                    request.messages, session_id, request_id
+                )
                 
                 if total_pii_count > 0:
                     logger.info(f"🔒 [{request_id}] Всего замаскировано {total_pii_count} PII элементов")
@@ -111,36 +146,31 @@ class LLMService:
                 logger.info(f"🔓 [{request_id}] Этап 3: Демаскирование ответа...")
                 
                 try:
-                    # Демаскируем контент в ответах
+                    # Демаскируем контент ответов и аргументы tool calls одним пакетом
+                    targets = []
                     for choice in response.choices:
-                        if choice.get("message", {}).get("content"):
-                            original_content = choice["message"]["content"]
-                            unmasked_content = await self.pii_gateway.unmask_sensitive_data(
-                                content=original_content,
-                                session_id=session_id
-                            )
-                            choice["message"]["content"] = unmasked_content
-                            
-                            if original_content != unmasked_content:
-                                logger.info(f"🔄 [{request_id}] Демаскирован контент ответа")
-                        
-                        # Демаскируем tool calls если есть
-                        if choice.get("message", {}).get("tool_calls"):
-                            for tool_call in choice["message"]["tool_calls"]:
-                                if tool_call.get("function", {}).get("arguments"):
-                                    original_args = tool_call["function"]["arguments"]
-                                    unmasked_args = await self.pii_gateway.unmask_sensitive_data(
-                                        content=original_args,
-                                        session_id=session_id
-                                    )
-                                    tool_call["function"]["arguments"] = unmasked_args
-                                    
-                                    if original_args != unmasked_args:
-                                        logger.info(f"🔄 [{request_id}] Демаскированы аргументы tool call")
+                        message = choice.get("message", {})
+                        if message.get("content"):
+                            targets.append((message, "content", "контент ответа"))
+                        for tool_call in message.get("tool_calls") or []:
+                            if tool_call.get("function", {}).get("arguments"):
+                                targets.append((tool_call["function"], "arguments", "аргументы tool call"))
                     
-                    # Очищаем сессию после обработки
-                    await self.pii_gateway.clear_session(session_id)
-                    logger.info(f"🧹 [{request_id}] PII сессия очищена")
+                    if targets:
+                        originals = [holder[key] for holder, key, _ in targets]
+                        # Аргументы tool calls - JSON: оригиналы возвращаются экранированными
+                        unmasked = await self.pii_gateway.unmask_many(
+                            originals, session_id, [key == "arguments" for _, key, _ in targets]
+                        )
+                        for (holder, key, label), original, restored in zip(targets, originals, unmasked):
+                            holder[key] = restored
+                            if original != restored:
+                                logger.info(f"🔄 [{request_id}] Демаскирован {label}")
+                    
+                    # Очищаем сессию после обработки, если она не живет весь разговор
+                    if not self.conversation_affinity:
+                        await self.pii_gateway.clear_session(session_id)
+                        logger.info(f"🧹 [{request_id}] PII сессия очищена")
                     
                 except Exception as e:
                     logger.error(f"❌ [{request_id}] Ошибка демаскирования: {e}")
@@ -173,12 +203,52 @@ class LLMService:
             # Остальные исключения оборачиваем
             raise PIIProcessingError(f"LLMService error: {str(e)}") 
 
+    def _unmask_delta(self, delta: dict, choice_index: int, unmaskers: dict, session_id: str) -> None:
+        """Демаскирует дельту stream-чанка на месте.
+
+        У контента и у аргументов каждого tool call (по его index) свой демаскировщик:
+        фрагменты склеиваются, только пока маска может продолжиться в следующем чанке.
+        """
+        if delta.get("content"):
+            key = (choice_index, None)
+            if key not in unmaskers:
+                unmaskers[key] = self.pii_gateway.stream_unmasker(session_id)
+            delta["content"] = unmaskers[key].feed(delta["content"])
+        for tool_call in delta.get("tool_calls") or []:
+            function = tool_call.get("function") or {}
+            if function.get("arguments"):
+                key = (choice_index, tool_call.get("index", 0))
+                if key not in unmaskers:
+                    # Аргументы - JSON: оригиналы возвращаются экранированными
+                    unmaskers[key] = self.pii_gateway.stream_unmasker(session_id, json_escape=True)
+                function["arguments"] = unmaskers[key].feed(function["arguments"])
+
+    @staticmethod
+    def _flush_delta(delta: dict, choice_index: int, unmaskers: dict) -> None:
+        """Дописывает в дельту задержанные хвосты choice: контент и аргументы в рамке своего tool call"""
+        keys = sorted((key for key in unmaskers if key[0] == choice_index),
+                      key=lambda key: -1 if key[1] is None else key[1])
+        for key in keys:
+            rest = unmaskers.pop(key).flush()
+            if not rest:
+                continue
+            if key[1] is None:
+                delta["content"] = (delta.get("content") or "") + rest
+                continue
+            tool_calls = delta.setdefault("tool_calls", [])
+            framed = next((tool_call for tool_call in tool_calls if tool_call.get("index", 0) == key[1]), None)
+            if framed is None:
+                framed = {"index": key[1], "function": {}}
+                tool_calls.append(framed)
+            function = framed.setdefault("function", {})
+            function["arguments"] = (function.get("arguments") or "") + rest
+
     async def process_chat_request_stream(self, request: ChatRequest):
         """
         Аналог process_chat_request, но возвращает async-генератор ChatResponse-чанков для stream-режима.
         """
         request_id = f"req_{int(time.time() * 1000)}"
-        session_id = request.session_id or uuid.uuid4().hex
+        session_id = self._session_id(request)
         
         # Определяем нужно ли включать PII защиту
         should_protect_pii = self.pii_enabled and request.pii_protection
@@ -196,66 +266,48 @@ class LLMService:
                 logger.info(f"🔒 [STREAM {request_id}] PII защита ВКЛЮЧЕНА для streaming")
                 
                 # Маскируем сообщения
-                masked_messages = []
-                total_pii_count = 0
-                
-                for i, message in enumerate(request.messages):
-                    if message.content:
-                        try:
-                            pii_result = await self.pii_gateway.mask_sensitive_data(
-                                content=message.content,
-                                session_id=session_id
-                            )
-                            
-                            masked_message = message.model_copy()
-                            masked_message.content = pii_result.content
-                            masked_messages.append(masked_message)
-                            total_pii_count += pii_result.pii_count
-                            
-                        except Exception as e:
-                            logger.error(f"❌ [STREAM {request_id}] Ошибка маскирования: {e}")
-                            masked_messages.append(message)
-                    else:
-                        masked_messages.append(message)
+                masked_messages, total_pii_count = await self._mask_messages(
+                    request.messages, session_id, f"STREAM {request_id}"
+                )
                 
                 masked_request = request.model_copy()
                 masked_request.messages = masked_messages
                 
-                # Собираем все chunks для последующего демаскирования
-                accumulated_content = ""
-                accumulated_tool_calls = []
+                # Демаскируем дельты по мере поступления: задерживается только хвост,
+                # который еще может оказаться началом маски
+                unmaskers = {}
+                last_chunk = None
                 
                 async for chunk in self.llm_provider.create_chat_completion_stream(masked_request):
-                    # Аккумулируем контент для демаскирования
-                    if chunk.choices and len(chunk.choices) > 0:
-                        choice = chunk.choices[0]
-                        if choice.delta.get("content"):
-                            accumulated_content += choice.delta["content"]
-                        if choice.delta.get("tool_calls"):
-                            accumulated_tool_calls.extend(choice.delta["tool_calls"])
+                    last_chunk = chunk
+                    if total_pii_count > 0:
+                        for choice in chunk.choices:
+                            delta = choice.setdefault("delta", {})
+                            index = choice.get("index", 0)
+                            self._unmask_delta(delta, index, unmaskers, session_id)
+                            # Последний чанк choice забирает задержанные хвосты
+                            if choice.get("finish_reason"):
+                                self._flush_delta(delta, index, unmaskers)
                     
-                    # Отдаем chunk как есть (пока замаскированный)
                     yield chunk
                 
-                # После завершения streaming демаскируем аккумулированный контент
-                if should_protect_pii and total_pii_count > 0:
-                    logger.info(f"🔓 [STREAM {request_id}] Демаскирование завершенного streaming контента...")
-                    
-                    try:
-                        # Демаскируем аккумулированный контент (опционально)
-                        if accumulated_content:
-                            unmasked_content = await self.pii_gateway.unmask_sensitive_data(
-                                content=accumulated_content,
-                                session_id=session_id
-                            )
-                            logger.info(f"🔄 [STREAM {request_id}] Демаскирован streaming контент")
-                        
-                        # Очищаем сессию
+                # Поток оборвался без finish_reason: отдаем хвосты отдельным чанком
+                if unmaskers and last_chunk is not None:
+                    choices = []
+                    for index in sorted({choice_index for choice_index, _ in unmaskers}):
+                        delta = {}
+                        self._flush_delta(delta, index, unmaskers)
+                        if delta:
+                            choices.append({"index": index, "delta": delta, "finish_reason": None})
+                    if choices:
+                        yield ChatResponse(id=last_chunk.id, model=last_chunk.model, choices=choices)
+                
+                if total_pii_count > 0:
+                    logger.info(f"🔓 [STREAM {request_id}] Streaming контент демаскирован по мере поступления")
+                    # Очищаем сессию, если она не живет весь разговор
+                    if not self.conversation_affinity:
                         await self.pii_gateway.clear_session(session_id)
                         logger.info(f"🧹 [STREAM {request_id}] PII сессия очищена")
-                        
-                    except Exception as e:
-                        logger.error(f"❌ [STREAM {request_id}] Ошибка демаскирования streaming: {e}")
                 
             else:
                 logger.info(f"⚠️ [STREAM {request_id}] PII защита ОТКЛЮЧЕНА для streaming")
@@ -42,6 +42,9 @@ setup(
             "flake8>=6.0.0",
             "mypy>=1.5.0",
         ],
+        # Linear-time / alternative regex engines for PII detectors
+        "re2": ["google-re2>=1.1"],
+        "regex": ["regex>=2023.10.3"],
     },
     entry_points={
         "console_scripts": [
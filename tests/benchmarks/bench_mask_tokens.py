@@ -0,0 +1,147 @@
+# tests/benchmarks/bench_mask_tokens.py
+
+# Upstream token cost of the mask token formats (PII_MASK_FORMAT): every mask is sent
+# to the model on every turn, so on secret-heavy prompts (.env files, configs) the
+# format decides how much prefill the masking adds on top of the original text.
+#
+#   python -m llm_pii_proxy.tests.benchmarks.bench_mask_tokens [--vocab cl100k_base.tiktoken]
+#
+# Tokens are counted with a local tokenizer table: a tiktoken-format BPE rank file
+# ("<base64 token> <rank>" per line) given with --vocab, or the tiktoken package's
+# encoding when it is installed. Without either, the count is the number of cl100k
+# pre-tokenizer pieces, a lower bound that already separates the formats: hex ids
+# split into one piece per letter/digit run, decimal ids into one per three digits.
+
+import argparse
+import base64
+import json
+import os
+import re
+import sys
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.security.pii_redaction import MASK_FORMATS, PIIRedactionGateway
+from llm_pii_proxy.tests.benchmarks.bench_redaction import CONFIG_PATH, _names
+from llm_pii_proxy.tests.benchmarks.corpora import CORPORA, DENSITIES, SIZES, generate
+
+# cl100k_base pre-tokenizer with stdlib classes: [^\W\d_] for \p{L}, \d for \p{N}
+_PIECES = re.compile(
+    r"(?i:'s|'t|'re|'ve|'m|'ll|'d)"
+    r"|(?:[^\r\n\w]|_)?[^\W\d_]+"
+    r"|\d{1,3}"
+    r"| ?(?:[^\s\w]|_)+[\r\n]*"
+    r"|\s*[\r\n]+"
+    r"|\s+(?!\S)"
+    r"|\s+"
+)
+
+
+def load_ranks(path: str) -> Dict[bytes, int]:
+    """BPE merge ranks from a tiktoken-format file"""
+    ranks = {}
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                token, rank = line.split()
+                ranks[base64.b64decode(token)] = int(rank)
+    return ranks
+
+
+def bpe_count(piece: bytes, ranks: Dict[bytes, int]) -> int:
+    """Tokens of one pre-tokenized piece: merge the lowest-ranked adjacent pair until none is left"""
+    parts = [piece[i:i + 1] for i in range(len(piece))]
+    while len(parts) > 1:
+        best = None
+        for i in range(len(parts) - 1):
+            rank = ranks.get(parts[i] + parts[i + 1])
+            if rank is not None and (best is None or rank < best[0]):
+                best = (rank, i)
+        if best is None:
+            break
+        i = best[1]
+        parts[i:i + 2] = [parts[i] + parts[i + 1]]
+    return len(parts)
+
+
+def token_counter(vocab: Optional[str] = None, encoding: str = "cl100k_base") -> Callable[[str], int]:
+    """Token count function: --vocab table, else tiktoken, else pre-tokenizer pieces"""
+    if vocab:
+        ranks = load_ranks(vocab)
+        cache: Dict[str, int] = {}
+
+        def count(text: str) -> int:
+            total = 0
+            for piece in _PIECES.findall(text):
+                if piece not in cache:
+                    cache[piece] = bpe_count(piece.encode('utf-8'), ranks)
+                total += cache[piece]
+            return total
+        count.method = f"bpe:{os.path.basename(vocab)}"
+        return count
+    try:
+        import tiktoken
+    except ImportError:
+        count = lambda text: len(_PIECES.findall(text))
+        count.method = "pieces"
+        return count
+    tokenizer = tiktoken.get_encoding(encoding)
+    count = lambda text: len(tokenizer.encode(text, disallowed_special=()))
+    count.method = f"tiktoken:{encoding}"
+    return count
+
+
+def run_case(count: Callable[[str], int], corpus: str, size: str, density: str,
+             formats: List[str]) -> Dict:
+    """Tokens of one corpus text before masking and after masking in each format"""
+    text = generate(corpus, SIZES[size], DENSITIES[density])
+    result = {"case": f"{corpus}/{size}/{density}", "original_tokens": count(text), "formats": {}}
+    for mask_format in formats:
+        gateway = PIIRedactionGateway(CONFIG_PATH, regex_engine="re", mask_key=b"bench", mask_format=mask_format)
+        mapping = {}
+        masked = gateway.mask_sensitive_data(text, None, mapping)
+        originals = sum(count(redaction.original) for redaction in mapping.values())
+        tokens = sum(count(token) for token in mapping)
+        result["formats"][mask_format] = {
+            "masked_tokens": count(masked),
+            "masks": len(mapping),
+            "tokens_per_mask": round(tokens / len(mapping), 2) if mapping else 0.0,
+            "tokens_per_secret": round(originals / len(mapping), 2) if mapping else 0.0,
+        }
+    return result
+
+
+def print_table(results: List[Dict], method: str) -> None:
+    print(f"tokens counted with {method}")
+    print(f"{'case':<26} {'format':<8} {'original':>9} {'masked':>9} {'delta':>7} {'masks':>6} {'tok/mask':>9}")
+    for result in results:
+        for mask_format, row in result["formats"].items():
+            delta = row["masked_tokens"] - result["original_tokens"]
+            print(f"{result['case']:<26} {mask_format:<8} {result['original_tokens']:>9} "
+                  f"{row['masked_tokens']:>9} {delta:>+7} {row['masks']:>6} {row['tokens_per_mask']:>9}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Count upstream tokens of masked corpora per mask format")
+    parser.add_argument("--corpora", type=lambda v: _names(v, CORPORA), default=list(CORPORA))
+    parser.add_argument("--sizes", type=lambda v: _names(v, SIZES), default=["64k"])
+    parser.add_argument("--densities", type=lambda v: _names(v, DENSITIES), default=["low", "high"])
+    parser.add_argument("--formats", type=lambda v: _names(v, MASK_FORMATS), default=list(MASK_FORMATS))
+    parser.add_argument("--vocab", help="tiktoken-format BPE rank file to count tokens with")
+    parser.add_argument("--encoding", default="cl100k_base", help="tiktoken encoding when --vocab is not given")
+    parser.add_argument("--json", help="also write the full results to this file")
+    args = parser.parse_args(argv)
+
+    count = token_counter(args.vocab, args.encoding)
+    results = [run_case(count, corpus, size, density, args.formats)
+               for corpus in args.corpora for size in args.sizes for density in args.densities]
+    print_table(results, count.method)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"method": count.method, "cases": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+# tests/benchmarks/bench_redaction.py
+
+# Throughput, latency and allocation benchmark of PIIRedactionGateway mask/unmask
+# on synthetic Cursor-like corpora (see corpora.py), plus the memory a live PII
+# session of AsyncPIISecurityGateway keeps.
+#
+#   python -m llm_pii_proxy.tests.benchmarks.bench_redaction [--sizes 4k,64k] [--update-baseline]
+#
+# Exits with 1 when throughput regresses against baseline.json: when the geometric
+# mean over all cases drops more than --tolerance, or a single case drops more than
+# --case-tolerance. Throughput is compared relative to a fixed reference workload
+# timed next to each case, so a slower machine moves both; single cases still
+# swing by ~30% on shared machines, hence the looser per-case bound. Refresh the
+# baseline with --update-baseline after intended changes.
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import re
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.security.pii_gateway import AsyncPIISecurityGateway
+from llm_pii_proxy.security.pii_redaction import PIIRedactionGateway
+from llm_pii_proxy.tests.benchmarks.corpora import CORPORA, DENSITIES, SIZES, generate
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../../config/pii_patterns.yaml')
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def measure(func: Callable[[], object], min_runs: int, min_seconds: float) -> List[float]:
+    """Latencies in seconds of at least min_runs calls lasting at least min_seconds in total"""
+    latencies = []
+    started = time.perf_counter()
+    while len(latencies) < min_runs or time.perf_counter() - started < min_seconds:
+        begin = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - begin)
+    return latencies
+
+
+_REFERENCE_TEXT = ("user=alice id=42 path=/src/app.py status=ok " * 400)
+_REFERENCE_REGEX = re.compile(r"(\w+)=(\S+)")
+
+
+def reference_speed(runs: int = 30) -> float:
+    """Speed of this machine right now: fixed regex and string work, in MB/s"""
+    best = min(measure(lambda: ''.join(m.group(2) for m in _REFERENCE_REGEX.finditer(_REFERENCE_TEXT)),
+                       runs, 0.0))
+    return len(_REFERENCE_TEXT) / 1e6 / best
+
+
+def allocations(func: Callable[[], object]) -> Dict[str, float]:
+    """Peak traced memory of one call and the number of blocks it allocated and kept"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    kept_blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    del result
+    return {"peak_kib": round(peak / 1024, 1), "kept_blocks": kept_blocks}
+
+
+def session_memory(sessions: int, messages: int = 10, config_path: str = None) -> Dict[str, float]:
+    """Traced memory kept per live session holding a conversation of `messages` texts with PII"""
+    gateway = AsyncPIISecurityGateway(config_path=config_path or CONFIG_PATH)
+    # The span cache is shared by all sessions; keep it out of the figure
+    gateway.span_cache.max_bytes = 0
+    conversations = [[generate("env", SIZES["4k"] // 4, DENSITIES["high"], seed=session * messages + turn)
+                      for turn in range(messages)] for session in range(sessions)]
+
+    async def fill() -> int:
+        masks = 0
+        for session, contents in enumerate(conversations):
+            result = await gateway.mask_many(contents, f"bench-{session}")
+            masks += len(gateway.sessions[result.session_id]["mappings"])
+        return masks
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        masks = asyncio.run(fill())
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "sessions": sessions,
+        "masks_per_session": round(masks / sessions, 1),
+        "kib_per_session": round((after - before) / sessions / 1024, 2),
+        "bytes_per_mask": round((after - before) / masks) if masks else None,
+    }
+
+
+def summarize(latencies: List[float], size_bytes: int) -> Dict[str, float]:
+    # Throughput from the fastest run: the least disturbed by other load on the machine
+    best = min(latencies)
+    return {
+        "mb_s": round(size_bytes / 1e6 / best, 2) if best else float("inf"),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "runs": len(latencies),
+    }
+
+
+def run_case(gateway: PIIRedactionGateway, corpus: str, size: str, density: str,
+             min_runs: int, min_seconds: float) -> Dict:
+    text = generate(corpus, SIZES[size], DENSITIES[density])
+    size_bytes = len(text.encode("utf-8"))
+    mapping: Dict = {}
+    masked = gateway.mask_sensitive_data(text, None, mapping)
+
+    result = {"case": f"{corpus}/{size}/{density}", "bytes": size_bytes, "pii": len(mapping)}
+    operations = {
+        "mask": lambda: gateway.mask_sensitive_data(text, None, {}),
+        "unmask": lambda: gateway.unmask_sensitive_data(masked, mapping),
+    }
+    for operation, func in operations.items():
+        reference = reference_speed()
+        stats = summarize(measure(func, min_runs, min_seconds), size_bytes)
+        reference = max(reference, reference_speed())
+        # Throughput in units of the reference workload, comparable across machines and load
+        stats["relative"] = round(stats["mb_s"] / reference, 4)
+        stats.update(allocations(func))
+        result[operation] = stats
+    return result
+
+
+def compare(results: List[Dict], baseline: Dict, tolerance: float,
+            case_tolerance: float) -> Tuple[Dict[str, float], List[str]]:
+    """Geometric mean of current/baseline throughput per operation, and the regressions"""
+    ratios: Dict[str, List[float]] = {"mask": [], "unmask": []}
+    regressions = []
+    for result in results:
+        expected = baseline.get("cases", {}).get(result["case"])
+        if not expected:
+            continue
+        for operation in ratios:
+            # Unmasking a text without masks returns immediately; its timing is noise
+            if operation == "unmask" and not result["pii"]:
+                continue
+            ratio = result[operation]["relative"] / expected[f"{operation}_relative"]
+            ratios[operation].append(ratio)
+            if ratio < 1 - case_tolerance:
+                regressions.append(f"{result['case']} {operation}: {ratio:.0%} of the baseline "
+                                   f"(now {result[operation]['mb_s']} MB/s)")
+    means = {operation: math.exp(sum(map(math.log, values)) / len(values))
+             for operation, values in ratios.items() if values}
+    for operation, mean in means.items():
+        if mean < 1 - tolerance:
+            regressions.append(f"{operation}: {mean:.0%} of the baseline over {len(ratios[operation])} cases")
+    return means, regressions
+
+
+def load_baseline(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_baseline(path: str, results: List[Dict], engine: str) -> None:
+    baseline = {
+        "regex_engine": engine,
+        "python": platform.python_version(),
+        "cases": {result["case"]: {f"{operation}_{key}": result[operation][key]
+                                   for operation in ("mask", "unmask") for key in ("mb_s", "relative")}
+                  for result in results},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def print_table(results: List[Dict]) -> None:
+    print(f"{'case':<34} {'pii':>5} | {'mask MB/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'peak KiB':>9} "
+          f"| {'unmask MB/s':>11} {'p50 ms':>9} {'p99 ms':>9}")
+    for result in results:
+        mask, unmask = result["mask"], result["unmask"]
+        print(f"{result['case']:<34} {result['pii']:>5} | {mask['mb_s']:>9} {mask['p50_ms']:>9} "
+              f"{mask['p99_ms']:>9} {mask['peak_kib']:>9} | {unmask['mb_s']:>11} {unmask['p50_ms']:>9} "
+              f"{unmask['p99_ms']:>9}")
+
+
+def _names(value: str, known: Dict) -> List[str]:
+    names = list(known) if value == "all" else value.split(",")
+    unknown = set(names) - set(known)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown: {sorted(unknown)}, choose from {sorted(known)}")
+    return names
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark PII mask/unmask on synthetic corpora")
+    parser.add_argument("--corpora", type=lambda v: _names(v, CORPORA), default=list(CORPORA))
+    parser.add_argument("--sizes", type=lambda v: _names(v, SIZES), default=list(SIZES))
+    parser.add_argument("--densities", type=lambda v: _names(v, DENSITIES), default=list(DENSITIES))
+    parser.add_argument("--engine", default="re", help="regex engine: re | regex | re2 | auto")
+    parser.add_argument("--min-runs", type=int, default=5)
+    parser.add_argument("--min-seconds", type=float, default=0.2, help="minimum timing per case and operation")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="allowed drop of the mean throughput over all cases (0.15 = 15%%)")
+    parser.add_argument("--case-tolerance", type=float, default=0.5,
+                        help="allowed throughput drop of a single case")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--sessions", type=int, default=200,
+                        help="live PII sessions for the memory-per-session figure (0 skips it)")
+    parser.add_argument("--json", help="also write the full results to this file")
+    args = parser.parse_args(argv)
+
+    gateway = PIIRedactionGateway(CONFIG_PATH, regex_engine=args.engine, mask_key=b"benchmark")
+    engine = gateway.scanner.engine.name
+    results = [run_case(gateway, corpus, size, density, args.min_runs, args.min_seconds)
+               for corpus in args.corpora for size in args.sizes for density in args.densities]
+    print_table(results)
+    memory = session_memory(args.sessions) if args.sessions > 0 else None
+    if memory:
+        print(f"💾 {memory['kib_per_session']} KiB per PII session, {memory['bytes_per_mask']} bytes per mask "
+              f"({memory['sessions']} sessions, {memory['masks_per_session']} masks each, history spans included)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"regex_engine": engine, "results": results, "session_memory": memory}, f, indent=2)
+
+    if args.update_baseline:
+        write_baseline(args.baseline, results, engine)
+        print(f"✅ Baseline updated: {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"⚠️ No baseline at {args.baseline}, run with --update-baseline")
+        return 0
+    if baseline.get("regex_engine") != engine:
+        print(f"⚠️ Baseline was recorded with '{baseline.get('regex_engine')}', not '{engine}'; skipping the gate")
+        return 0
+    means, regressions = compare(results, baseline, args.tolerance, args.case_tolerance)
+    for operation, mean in means.items():
+        print(f"📊 {operation}: {mean:.0%} of the baseline throughput (geometric mean)")
+    for regression in regressions:
+        print(f"❌ {regression}")
+    if regressions:
+        return 1
+    print("✅ No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
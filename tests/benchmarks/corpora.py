@@ -0,0 +1,110 @@
+# tests/benchmarks/corpora.py
+
+# Synthetic corpora shaped like Cursor traffic for the redaction benchmarks.
+# Generation is seeded, so every run (and the stored baseline) sees the same text.
+
+import json
+import random
+from typing import Callable, Dict
+
+# PII items per KiB of text
+DENSITIES: Dict[str, float] = {"none": 0.0, "low": 0.25, "high": 4.0}
+SIZES: Dict[str, int] = {"4k": 4 * 1024, "64k": 64 * 1024, "512k": 512 * 1024}
+
+IDENTIFIERS = ["user", "config", "result", "handler", "session", "payload", "items", "client", "retry", "cache"]
+WORDS_RU = ["данные", "сервер", "запрос", "пользователь", "настройка", "ошибка", "проект", "ответ",
+            "модель", "файл", "отчет", "система", "доступ", "время", "задача"]
+
+
+def _secret(rng: random.Random, length: int = 16) -> str:
+    return ''.join(rng.choice("ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnpqrstuvwxyz23456789") for _ in range(length))
+
+
+def _ip(rng: random.Random) -> str:
+    return ".".join(str(rng.randint(1, 254)) for _ in range(4))
+
+
+def pii_item(rng: random.Random) -> str:
+    """One secret in one of the shapes the detectors cover"""
+    return rng.choice([
+        lambda: f"password: {_secret(rng, 12)}",
+        lambda: f"api_key={_secret(rng, 32)}",
+        lambda: f"AKIA{_secret(rng, 16).upper()}",
+        lambda: f"postgresql://app:{_secret(rng, 10)}@db.internal:5432/app",
+        lambda: f"token: eyJ{_secret(rng, 20)}.{_secret(rng, 30)}",
+        lambda: f"sk_live_{_secret(rng, 24)}",
+        lambda: _ip(rng),
+        lambda: f"пароль: {_secret(rng, 10)}",
+    ])()
+
+
+def _code_line(rng: random.Random) -> str:
+    name, other = rng.choice(IDENTIFIERS), rng.choice(IDENTIFIERS)
+    return rng.choice([
+        f"    {name} = {other}.get('{rng.choice(IDENTIFIERS)}', {rng.randint(0, 100)})",
+        f"    if not {name}:\n        return {other}",
+        f"def {name}_{other}(self, {other}: dict) -> dict:",
+        f"    # TODO: handle {name} when {other} is empty",
+        f"    for {name} in self.{other}:\n        yield {name}",
+    ])
+
+
+def _env_line(rng: random.Random) -> str:
+    key = f"{rng.choice(IDENTIFIERS).upper()}_{rng.choice(IDENTIFIERS).upper()}"
+    return f"{key}={rng.choice(['true', 'false', str(rng.randint(1, 9999)), rng.choice(IDENTIFIERS)])}"
+
+
+def _log_line(rng: random.Random) -> str:
+    return (f"2024-05-{rng.randint(10, 28)} 12:{rng.randint(10, 59)}:{rng.randint(10, 59)},{rng.randint(100, 999)} "
+            f"{rng.choice(['INFO', 'WARN', 'DEBUG'])} [{rng.choice(IDENTIFIERS)}] "
+            f"{rng.choice(['request served', 'retrying', 'cache miss', 'connection reused'])} "
+            f"in {rng.randint(1, 900)}ms")
+
+
+def _json_line(rng: random.Random) -> str:
+    record = {rng.choice(IDENTIFIERS): rng.randint(0, 10000), "path": f"/src/{rng.choice(IDENTIFIERS)}.py",
+              "ok": rng.random() > 0.1, "message": " ".join(rng.choice(IDENTIFIERS) for _ in range(6))}
+    return json.dumps(record) + ","
+
+
+def _russian_line(rng: random.Random) -> str:
+    sentence = " ".join(rng.choice(WORDS_RU) for _ in range(rng.randint(6, 14)))
+    return sentence.capitalize() + "."
+
+
+def _log_pii(rng: random.Random) -> str:
+    # Logs are dominated by client addresses
+    return _ip(rng) if rng.random() < 0.7 else pii_item(rng)
+
+
+CORPORA: Dict[str, Callable[[random.Random], str]] = {
+    "code": _code_line,
+    "env": _env_line,
+    "logs": _log_line,
+    "json_tool_output": _json_line,
+    "russian_prose": _russian_line,
+}
+
+
+def generate(corpus: str, size: int, density: float, seed: int = 0) -> str:
+    """Text of about `size` characters with `density` PII items per KiB"""
+    rng = random.Random(f"{corpus}:{size}:{density}:{seed}")
+    line = CORPORA[corpus]
+    item = _log_pii if corpus == "logs" else pii_item
+    lines = []
+    length = 0
+    next_pii = rng.expovariate(density / 1024) if density else float("inf")
+    while length < size:
+        if length >= next_pii:
+            text = line(rng)
+            # Secrets land inside ordinary lines, like they do in real files
+            cut = rng.randint(0, len(text))
+            text = f"{text[:cut]} {item(rng)} {text[cut:]}"
+            next_pii += rng.expovariate(density / 1024)
+        else:
+            text = line(rng)
+        lines.append(text)
+        length += len(text) + 1
+    if corpus == "json_tool_output":
+        return "[\n" + "\n".join(lines) + "\n]"
+    return "\n".join(lines)
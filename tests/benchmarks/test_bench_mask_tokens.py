@@ -0,0 +1,28 @@
+import sys
+import os
+import base64
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.tests.benchmarks.bench_mask_tokens import bpe_count, load_ranks, run_case, token_counter
+
+
+def test_bpe_counts_with_a_local_rank_table(tmp_path):
+    ranks = [b"1", b"2", b"3", b"12", b"123", b"<", b"P", b"W", b"PW"]
+    vocab = tmp_path / "tiny.tiktoken"
+    vocab.write_bytes(b"\n".join(base64.b64encode(token) + b" %d" % rank for rank, token in enumerate(ranks)))
+    table = load_ranks(str(vocab))
+    assert bpe_count(b"123", table) == 1
+    assert bpe_count(b"1233", table) == 2
+    count = token_counter(str(vocab))
+    assert count.method == "bpe:tiny.tiktoken"
+    # "<PW" is one pre-tokenizer piece that the table cannot merge completely
+    assert count("<PW123") == 3
+
+
+def test_compact_masks_cost_fewer_tokens_than_hex():
+    count = token_counter()
+    result = run_case(count, "env", "4k", "high", ["hex", "compact"])
+    hex_row, compact_row = result["formats"]["hex"], result["formats"]["compact"]
+    assert hex_row["masks"] == compact_row["masks"] > 0
+    assert compact_row["tokens_per_mask"] < hex_row["tokens_per_mask"]
+    assert compact_row["masked_tokens"] < hex_row["masked_tokens"]
@@ -0,0 +1,46 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.security.pii_redaction import PIIRedactionGateway
+from llm_pii_proxy.tests.benchmarks.bench_redaction import CONFIG_PATH, compare, run_case, session_memory
+from llm_pii_proxy.tests.benchmarks.corpora import CORPORA, SIZES, generate
+
+
+def test_corpora_are_deterministic_and_sized():
+    for corpus in CORPORA:
+        text = generate(corpus, SIZES["4k"], 4.0)
+        assert text == generate(corpus, SIZES["4k"], 4.0)
+        assert SIZES["4k"] <= len(text) < SIZES["4k"] + 512
+
+
+def test_density_controls_pii_count():
+    gateway = PIIRedactionGateway(CONFIG_PATH, regex_engine="re")
+    counts = {}
+    for density in (0.0, 0.25, 4.0):
+        mapping = {}
+        gateway.mask_sensitive_data(generate("code", SIZES["64k"], density), None, mapping)
+        counts[density] = len(mapping)
+    assert counts[0.0] == 0 < counts[0.25] < counts[4.0]
+
+
+def test_gate_uses_mean_and_single_case_floor():
+    gateway = PIIRedactionGateway(CONFIG_PATH, regex_engine="re")
+    result = run_case(gateway, "env", "4k", "high", min_runs=2, min_seconds=0.0)
+    assert result["pii"] > 0
+    assert {"mb_s", "p50_ms", "p99_ms", "relative", "peak_kib"} <= set(result["mask"])
+    same = {"cases": {result["case"]: {"mask_relative": result["mask"]["relative"],
+                                       "unmask_relative": result["unmask"]["relative"]}}}
+    means, regressions = compare([result], same, tolerance=0.15, case_tolerance=0.5)
+    assert means == {"mask": 1.0, "unmask": 1.0} and not regressions
+
+    faster = {"cases": {result["case"]: {"mask_relative": result["mask"]["relative"] * 1.3,
+                                         "unmask_relative": result["unmask"]["relative"]}}}
+    _, regressions = compare([result], faster, tolerance=0.15, case_tolerance=0.5)
+    assert regressions == [regressions[0]] and regressions[0].startswith("mask:")
+
+
+def test_session_memory_is_reported_per_session():
+    memory = session_memory(4, messages=3)
+    assert memory["sessions"] == 4 and memory["masks_per_session"] > 0
+    assert 0 < memory["kib_per_session"] < 1024
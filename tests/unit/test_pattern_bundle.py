@@ -0,0 +1,77 @@
+import json
+import sys
+import os
+import pytest
+import yaml
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.core.exceptions import ConfigurationError
+from llm_pii_proxy.security.pattern_bundle import (
+    BUNDLE_VERSION, build_bundle, bundle_path_for, load_bundle, write_bundle
+)
+from llm_pii_proxy.security.pii_redaction import PIIRedactionGateway
+
+
+def _write_config(path, config):
+    with open(path, "w") as f:
+        yaml.dump(config, f, allow_unicode=True)
+    return str(path)
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    return _write_config(tmp_path / "pii_patterns.yaml", {
+        "custom_token": [{"pattern": r"CUSTOM_[A-Z0-9]{6}", "triggers": ["custom_"]}],
+    })
+
+
+def test_bundle_is_written_next_to_config(config_path):
+    bundle_path = write_bundle(config_path)
+    assert bundle_path == bundle_path_for(config_path)
+    assert bundle_path.endswith("pii_patterns.bundle.json")
+    with open(bundle_path) as f:
+        bundle = json.load(f)
+    assert bundle["version"] == BUNDLE_VERSION
+    assert len(bundle["source_hash"]) == 64
+    assert bundle["patterns"]["custom_token"][0]["triggers"] == ["custom_"]
+
+
+def test_gateway_loads_bundle(config_path):
+    write_bundle(config_path)
+    gateway = PIIRedactionGateway(config_path)
+    assert gateway.patterns_version == load_bundle(config_path)["source_hash"]
+    masked = gateway.mask_sensitive_data("token CUSTOM_ABC123 here")
+    assert "CUSTOM_ABC123" not in masked
+
+
+def test_stale_bundle_is_ignored(config_path, tmp_path):
+    write_bundle(config_path)
+    _write_config(config_path, {"other_token": [{"pattern": r"OTHER_[0-9]{4}"}]})
+    assert load_bundle(config_path) is None
+    gateway = PIIRedactionGateway(config_path)
+    assert list(gateway.patterns) == ["other_token"]
+    assert gateway.patterns_version == build_bundle(config_path)["source_hash"]
+
+
+def test_bundle_works_without_yaml_source(config_path):
+    bundle_path = write_bundle(config_path)
+    os.remove(config_path)
+    assert load_bundle(config_path, bundle_path) is not None
+    gateway = PIIRedactionGateway(config_path)
+    assert list(gateway.patterns) == ["custom_token"]
+
+
+@pytest.mark.parametrize("config, message", [
+    ({"broken": [{"pattern": "(unclosed"}]}, "invalid regex"),
+    ({"broken": [{"regex": "x"}]}, "'pattern' string"),
+    ({"broken": [{"pattern": "x", "trigers": ["x"]}]}, "unknown keys"),
+    ({"broken": [{"pattern": "x", "triggers": "x"}]}, "'triggers'"),
+    ({"broken": [{"pattern": "key: (?P<val>x)", "value_group": "value"}]}, "'value_group'"),
+    ({"broken": [{"pattern": "x", "priority": "high"}]}, "'priority'"),
+    ({"broken": [{"pattern": "x", "validators": ["crc32"]}]}, "'validators'"),
+    ({"broken": []}, "non-empty list"),
+])
+def test_invalid_config_is_rejected(tmp_path, config, message):
+    path = _write_config(tmp_path / "bad.yaml", config)
+    with pytest.raises(ConfigurationError, match=message):
+        build_bundle(path)
@@ -0,0 +1,45 @@
+import sys
+import os
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.core.exceptions import PIISessionNotFoundError
+from llm_pii_proxy.security.pii_gateway import AsyncPIISecurityGateway
+
+
+@pytest.mark.asyncio
+async def test_mask_many_matches_per_message_masking():
+    contents = [
+        "password: hunter2",
+        "",
+        "IP 10.0.0.1 and password: hunter2",
+        "nothing sensitive here",
+    ]
+    batch_gateway = AsyncPIISecurityGateway()
+    single_gateway = AsyncPIISecurityGateway()
+    batch = await batch_gateway.mask_many(contents, "s1")
+    singles = [await single_gateway.mask_sensitive_data(content, "s1") for content in contents]
+
+    assert [result.content for result in batch.results] == [result.content for result in singles]
+    assert [result.pii_count for result in batch.results] == [1, 0, 2, 0]
+    assert batch.pii_count == 3
+    assert sum(batch.pii_types.values()) == 3
+    assert batch_gateway.sessions["s1"]["mappings"].keys() == single_gateway.sessions["s1"]["mappings"].keys()
+
+
+@pytest.mark.asyncio
+async def test_unmask_many_restores_every_item():
+    gateway = AsyncPIISecurityGateway()
+    batch = await gateway.mask_many(["password: hunter2", "IP 10.0.0.1"], "s1")
+    masked = [result.content for result in batch.results] + ["", "no masks"]
+    unmasked = await gateway.unmask_many(masked, "s1")
+    assert "hunter2" in unmasked[0]
+    assert "10.0.0.1" in unmasked[1]
+    assert unmasked[2:] == ["", "no masks"]
+
+
+@pytest.mark.asyncio
+async def test_batch_requires_session():
+    gateway = AsyncPIISecurityGateway()
+    with pytest.raises(PIISessionNotFoundError):
+        await gateway.unmask_many(["x"], "missing")
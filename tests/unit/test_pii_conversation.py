@@ -0,0 +1,129 @@
+import sys
+import os
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.core.models import ChatRequest, ChatMessage, ChatResponse
+from llm_pii_proxy.security.pii_gateway import AsyncPIISecurityGateway
+from llm_pii_proxy.services.llm_service import LLMService
+from llm_pii_proxy.observability.metrics import metrics
+
+SYSTEM = ("system", "You are a coding assistant.")
+
+
+class EchoProvider:
+    """Answers with the last message it was sent, i.e. the masked prompt"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def create_chat_completion(self, request):
+        self.sent.append(request)
+        return ChatResponse(id="r", model=request.model,
+                            choices=[{"message": {"role": "assistant", "content": request.messages[-1].content}}])
+
+
+def _messages(pairs):
+    return [ChatMessage(role=role, content=content) for role, content in pairs]
+
+
+def _request(messages, caller="Bearer key-a"):
+    """A request as the chat route builds it for a client sending `caller` as its Authorization header"""
+    request = ChatRequest(model="m", messages=messages)
+    request._caller = caller
+    return request
+
+
+def test_conversation_key_is_stable_across_turns():
+    gateway = AsyncPIISecurityGateway()
+    turn_one = [SYSTEM, ("user", "fix my config")]
+    turn_two = turn_one + [("assistant", "sure"), ("user", "password: hunter2")]
+    other = [SYSTEM, ("user", "another conversation")]
+    assert gateway.conversation_key(turn_one) == gateway.conversation_key(turn_two)
+    assert gateway.conversation_key(turn_one) != gateway.conversation_key(other)
+    assert "fix" not in gateway.conversation_key(turn_one)
+    # Conversations started the same way by different clients are different sessions
+    assert gateway.conversation_key(turn_one, "Bearer key-a") != gateway.conversation_key(turn_one, "Bearer key-b")
+    assert gateway.conversation_key(turn_one, "Bearer key-a") == gateway.conversation_key(turn_two, "Bearer key-a")
+
+
+@pytest.mark.asyncio
+async def test_only_appended_messages_are_scanned():
+    gateway = AsyncPIISecurityGateway()
+    turn_one = ["system prompt", "password: hunter2"]
+    first = await gateway.mask_many(turn_one, "c1")
+    reused, scanned = metrics.get("pii_conversation_messages_reused"), metrics.get("pii_conversation_messages_scanned")
+
+    second = await gateway.mask_many(turn_one + ["ok", "IP 10.0.0.1"], "c1")
+    assert metrics.get("pii_conversation_messages_reused") - reused == 2
+    assert metrics.get("pii_conversation_messages_scanned") - scanned == 2
+    assert [r.content for r in second.results[:2]] == [r.content for r in first.results]
+    assert second.results[1].pii_count == 1
+    assert second.pii_count == 2
+
+    # An edited earlier message stops the reuse there
+    edited = await gateway.mask_many(["system prompt", "password: other1", "ok"], "c1")
+    assert metrics.get("pii_conversation_messages_reused") - reused == 3
+    assert "other1" not in edited.results[1].content
+
+
+@pytest.mark.asyncio
+async def test_history_keeps_offsets_not_texts():
+    gateway = AsyncPIISecurityGateway()
+    long_output = "log line\n" * 5000 + "password: hunter2"
+    turn_one = ["system prompt", long_output, '{"cmd": "ssh root@10.0.0.1", "n": 1}', ""]
+    first = await gateway.mask_many(turn_one, "c1")
+    scanned = metrics.get("pii_conversation_messages_scanned")
+
+    second = await gateway.mask_many(turn_one + ["password: other1"], "c1")
+    assert metrics.get("pii_conversation_messages_scanned") - scanned == 1
+    # Replayed from the stored spans, byte for byte, JSON documents included
+    assert [r.content for r in second.results[:4]] == [r.content for r in first.results]
+    assert [r.mappings for r in second.results[:4]] == [r.mappings for r in first.results]
+
+    history = gateway.sessions["c1"]["history"]
+    assert len(history) == 5
+    for digest, spans in history:
+        assert isinstance(digest, bytes) and len(digest) == 32
+        assert all(isinstance(offset, int) for span in spans for offset in span[:4])
+    assert "hunter2" not in repr(history) and "<password_" not in repr(history)
+
+
+@pytest.mark.asyncio
+async def test_llm_service_keeps_masks_between_turns(monkeypatch):
+    gateway = AsyncPIISecurityGateway()
+    provider = EchoProvider()
+    service = LLMService(provider, gateway)
+    monkeypatch.setattr(LLMService, "pii_enabled", property(lambda self: True))
+    assert service.conversation_affinity
+
+    messages = _messages([SYSTEM, ("user", "password: hunter2")])
+    response = await service.process_chat_request(_request(messages))
+    assert "hunter2" in response.choices[0]["message"]["content"]
+    masked = provider.sent[0].messages[1].content
+    assert "hunter2" not in masked
+
+    # Next turn: the client sends the masked token back, the session still knows it
+    messages += [ChatMessage(role="assistant", content="noted"), ChatMessage(role="user", content=masked)]
+    response = await service.process_chat_request(_request(messages))
+    assert provider.sent[1].messages[1].content == masked
+    assert "hunter2" in response.choices[0]["message"]["content"]
+    assert len(gateway.sessions) == 1
+
+
+@pytest.mark.asyncio
+async def test_clients_starting_alike_do_not_share_sessions(monkeypatch):
+    gateway = AsyncPIISecurityGateway()
+    provider = EchoProvider()
+    service = LLMService(provider, gateway)
+    monkeypatch.setattr(LLMService, "pii_enabled", property(lambda self: True))
+
+    opening = [SYSTEM, ("user", "hi"), ("assistant", "hello")]
+    await service.process_chat_request(_request(_messages(opening + [("user", "password: hunter2")])))
+    masked = provider.sent[0].messages[-1].content
+    assert "hunter2" not in masked
+
+    # Same opening, the token replayed: neither another key nor a keyless client gets the secret
+    for caller in ("Bearer key-b", None):
+        response = await service.process_chat_request(_request(_messages(opening + [("user", masked)]), caller))
+        assert response.choices[0]["message"]["content"] == masked
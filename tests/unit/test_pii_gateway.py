@@ -25,4 +25,23 @@ async def test_async_pii_gateway_mask_unmask():
 
     # Clear session
     await gateway.clear_session(session_id)
-    assert session_id not in gateway.sessions 
\ No newline at end of file
+    assert session_id not in gateway.sessions 
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_keep_their_own_mappings():
+    gateway = AsyncPIISecurityGateway()
+    engine_mapping = gateway.redaction_gateway._mapping
+
+    async def roundtrip(i):
+        session_id = f"concurrent-{i}"
+        secret = f"hunter{i}"
+        result = await gateway.mask_sensitive_data(f"password: {secret} on 10.0.{i}.1", session_id)
+        assert secret not in result.content
+        assert {m.original for m in result.mappings} == {secret, f"10.0.{i}.1"}
+        unmasked = await gateway.unmask_sensitive_data(result.content, session_id)
+        assert secret in unmasked and f"10.0.{i}.1" in unmasked
+        await gateway.clear_session(session_id)
+
+    await asyncio.gather(*(roundtrip(i) for i in range(50)))
+    # The shared engine is never used as scratch space
+    assert engine_mapping == {}
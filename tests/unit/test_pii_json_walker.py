@@ -0,0 +1,128 @@
+import sys
+import os
+import json
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.core.models import ChatRequest, ChatMessage, ChatResponse
+from llm_pii_proxy.security.pii_gateway import AsyncPIISecurityGateway
+from llm_pii_proxy.security.pii_redaction import PIIRedactionGateway
+from llm_pii_proxy.services.llm_service import LLMService
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../../config/pii_patterns.yaml')
+
+ARGUMENTS = json.dumps({
+    "password": "hunter2",
+    "command": "ssh root@10.0.0.1",
+    "nested": {"hosts": ["10.0.0.2", "localhost"], "api_key": "sk_live_abcdefghijklmnopqrstuv"},
+    "retries": 3,
+}, indent=2)
+
+
+def test_string_leaves_are_masked_with_their_key_as_label():
+    gateway = PIIRedactionGateway(CONFIG_PATH, regex_engine="re")
+    mapping = {}
+    masked = gateway.mask_json(ARGUMENTS, None, mapping)
+
+    document = json.loads(masked)
+    assert "\n" not in masked
+    assert set(document) == {"password", "command", "nested", "retries"} and document["retries"] == 3
+    assert document["password"].startswith("<password_")
+    assert document["command"].startswith("ssh root@<ip_address_")
+    assert document["nested"]["hosts"][1] == "localhost"
+    assert document["nested"]["api_key"].startswith("<api_key_")
+    assert {redaction.original for redaction in mapping.values()} >= {"hunter2", "10.0.0.1", "10.0.0.2"}
+
+
+def test_documents_without_pii_and_other_texts():
+    gateway = PIIRedactionGateway(CONFIG_PATH, regex_engine="re")
+    clean = '{"path": "src/app.py", "line": 12}'
+    assert gateway.mask_json(clean) is clean
+    assert gateway.mask_json("password: hunter2") is None
+    assert gateway.mask_json("{ not json") is None
+    assert gateway.mask_json('"password: hunter2"') is None
+
+
+def test_leaves_are_scanned_in_one_pass_like_one_by_one():
+    gateway = PIIRedactionGateway(CONFIG_PATH, regex_engine="re", mask_key=b"walker")
+    document = json.loads(ARGUMENTS)
+    document["notes"] = ["token: abcdef", "email a@b.io", "", "pwd=x1\npassword: y2"]
+    text = json.dumps(document)
+
+    scans = []
+    masked = gateway.mask_json(text, None, {}, scan=lambda joined: scans.append(joined) or gateway.find_spans(joined))
+    assert len(scans) == 1
+
+    def one_by_one(value, key):
+        if isinstance(value, dict):
+            return {k: one_by_one(v, k) for k, v in value.items()}
+        if isinstance(value, list):
+            return [one_by_one(v, key) for v in value]
+        if isinstance(value, str) and value:
+            line = f"{key}: " + value
+            masked_line = gateway.mask_sensitive_data(line, None, {})
+            return value if masked_line == line else masked_line[len(key) + 2:]
+        return value
+    assert json.loads(masked) == one_by_one(document, None)
+    # A NUL in a leaf is scanned as a space and copied through
+    assert json.loads(gateway.mask_json(json.dumps({"note": "a\x00password: hunter2"})))["note"].startswith("a\x00password: <")
+
+
+def test_json_escaped_unmask_keeps_documents_valid():
+    gateway = PIIRedactionGateway(CONFIG_PATH, regex_engine="re")
+    mapping = {}
+    original = {"password": 'p@ss"w\\rd', "note": 'host "10.0.0.1"\n'}
+    masked = gateway.mask_json(json.dumps(original), None, mapping)
+    assert 'p@ss' not in masked
+    assert json.loads(gateway.unmask_sensitive_data(masked, mapping, json_escape=True)) == original
+
+
+@pytest.mark.asyncio
+async def test_gateway_masks_json_contents_by_leaves():
+    gateway = AsyncPIISecurityGateway()
+    batch = await gateway.mask_many([ARGUMENTS, "password: hunter2"], "json")
+    assert json.loads(batch.results[0].content)["password"].startswith("<password_")
+    assert batch.results[1].content.startswith("password: <password_")
+    unmasked = await gateway.unmask_many([batch.results[0].content], "json", [True])
+    assert json.loads(unmasked[0]) == json.loads(ARGUMENTS)
+
+
+class ToolCallingProvider:
+    """Calls a tool with the masked arguments of the last assistant tool call"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def create_chat_completion(self, request):
+        self.sent.append(request)
+        arguments = request.messages[-2].tool_calls[0]["function"]["arguments"]
+        tool_call = {"id": "call_2", "type": "function", "function": {"name": "run", "arguments": arguments}}
+        return ChatResponse(id="r", model=request.model,
+                            choices=[{"message": {"role": "assistant", "content": None, "tool_calls": [tool_call]}}])
+
+
+@pytest.mark.asyncio
+async def test_llm_service_masks_tool_call_arguments(monkeypatch):
+    gateway = AsyncPIISecurityGateway()
+    provider = ToolCallingProvider()
+    service = LLMService(provider, gateway)
+    monkeypatch.setattr(LLMService, "pii_enabled", property(lambda self: True))
+
+    arguments = json.dumps({"password": 'hun"ter2', "host": "10.0.0.1"})
+    tool_call = {"id": "call_1", "type": "function", "function": {"name": "run", "arguments": arguments}}
+    messages = [
+        ChatMessage(role="user", content="connect to the database"),
+        ChatMessage(role="assistant", content="", tool_calls=[tool_call]),
+        ChatMessage(role="tool", content='{"status": "ok", "ip": "10.0.0.3"}', tool_call_id="call_1"),
+    ]
+    response = await service.process_chat_request(ChatRequest(model="m", messages=messages))
+
+    sent = provider.sent[0].messages
+    masked_arguments = json.loads(sent[1].tool_calls[0]["function"]["arguments"])
+    assert masked_arguments["password"].startswith("<password_") and "10.0.0.1" not in masked_arguments["host"]
+    assert json.loads(sent[2].content)["ip"].startswith("<ip_address_")
+    # The client's messages are left alone
+    assert messages[1].tool_calls[0]["function"]["arguments"] == arguments
+
+    restored = response.choices[0]["message"]["tool_calls"][0]["function"]["arguments"]
+    assert json.loads(restored) == json.loads(arguments)
@@ -0,0 +1,48 @@
+import sys
+import os
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.security.pii_redaction import MASK_TOKEN, PIIRedactionGateway, StreamUnmasker, _type_code
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../../config/pii_patterns.yaml')
+TEXT = "password: hunter2\nDB postgresql://admin:s3cret@db:5432/app on 10.0.0.1"
+
+
+def test_compact_masks_round_trip():
+    gateway = PIIRedactionGateway(CONFIG_PATH, regex_engine="re", mask_format="compact")
+    mapping = {}
+    masked = gateway.mask_sensitive_data(TEXT, None, mapping)
+    assert masked.startswith("password: <PW")
+    assert all(gateway.mask_token.fullmatch(token) and not MASK_TOKEN.fullmatch(token) for token in mapping)
+    assert {token[:-7] for token in mapping} == {"<PW", "<DSN", "<IP"}
+    assert gateway.unmask_sensitive_data(masked, mapping) == TEXT
+    # The same key and value give the same token, and tokens sent back are left alone
+    again = {}
+    assert gateway.mask_sensitive_data(TEXT, None, again) == masked
+    assert gateway.mask_sensitive_data(masked, mapping, {}) == masked
+
+
+def test_compact_masks_stream_unmask():
+    gateway = PIIRedactionGateway(CONFIG_PATH, regex_engine="re", mask_format="compact")
+    mapping = {}
+    masked = gateway.mask_sensitive_data(TEXT, None, mapping)
+    unmasker = StreamUnmasker(gateway, mapping)
+    out = "".join(unmasker.feed(masked[i:i + 3]) for i in range(0, len(masked), 3)) + unmasker.flush()
+    assert out == TEXT
+
+
+def test_hex_stays_the_default_and_unknown_formats_fail(monkeypatch):
+    monkeypatch.delenv("PII_MASK_FORMAT", raising=False)
+    gateway = PIIRedactionGateway(CONFIG_PATH, regex_engine="re")
+    assert gateway.mask_format == "hex" and gateway.mask_token.pattern == MASK_TOKEN.pattern
+    monkeypatch.setenv("PII_MASK_FORMAT", "compact")
+    assert PIIRedactionGateway(CONFIG_PATH, regex_engine="re").mask_format == "compact"
+    with pytest.raises(ValueError):
+        PIIRedactionGateway(CONFIG_PATH, regex_engine="re", mask_format="base64")
+
+
+def test_type_codes_of_unlisted_types():
+    assert _type_code("password") == "PW"
+    assert _type_code("slack_webhook_url") == "SWU"
+    assert _type_code("_") == "PII"
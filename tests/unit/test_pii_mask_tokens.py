@@ -0,0 +1,65 @@
+import sys
+import os
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.security.pii_redaction import PIIRedactionGateway, RedactionMapping
+from llm_pii_proxy.security.pii_gateway import AsyncPIISecurityGateway
+from llm_pii_proxy.observability.metrics import metrics
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../../config/pii_patterns.yaml')
+
+
+def test_same_secret_gets_same_token():
+    gateway = PIIRedactionGateway(CONFIG_PATH, mask_key=b"tenant-key")
+    first = gateway.mask_sensitive_data("password: hunter2 and again password: hunter2")
+    assert len(gateway._mapping) == 1
+    token = next(iter(gateway._mapping))
+    assert first.count(token) == 2
+
+    gateway.clear_mapping()
+    second = gateway.mask_sensitive_data("Turn two. password: hunter2")
+    assert token in second
+
+
+def test_tokens_depend_on_key_and_value():
+    one = PIIRedactionGateway(CONFIG_PATH, mask_key=b"tenant-a")
+    two = PIIRedactionGateway(CONFIG_PATH, mask_key=b"tenant-a")
+    other = PIIRedactionGateway(CONFIG_PATH, mask_key=b"tenant-b")
+    text = "IP 10.0.0.1 and 10.0.0.2"
+    assert one.mask_sensitive_data(text) == two.mask_sensitive_data(text)
+    assert one.mask_sensitive_data(text) != other.mask_sensitive_data(text)
+    assert len(one._mapping) == 2
+
+
+def test_collision_with_known_token_is_rederived():
+    gateway = PIIRedactionGateway(CONFIG_PATH, mask_key=b"tenant-key")
+    token = gateway._generate_mask("password", "hunter2")
+    collisions = metrics.get("pii_mask_collisions")
+    taken = {token: RedactionMapping(original="something else", masked=token, type="password")}
+    other = gateway._generate_mask("password", "hunter2", known=taken)
+    assert other != token
+    assert metrics.get("pii_mask_collisions") - collisions == 1
+    # Stable: the same inputs resolve the collision the same way
+    assert gateway._generate_mask("password", "hunter2", known=taken) == other
+    same = {token: RedactionMapping(original="hunter2", masked=token, type="password")}
+    assert gateway._generate_mask("password", "hunter2", known=same) == token
+
+
+def test_collision_within_one_text_is_rederived():
+    gateway = PIIRedactionGateway(CONFIG_PATH, mask_key=b"tenant-key")
+    token = gateway._generate_mask("password", "hunter2")
+    gateway._mapping[token] = RedactionMapping(original="hunter3", masked=token, type="password")
+    assert gateway._generate_mask("password", "hunter2") != token
+
+
+@pytest.mark.asyncio
+async def test_session_keeps_masks_of_every_message():
+    gateway = AsyncPIISecurityGateway()
+    first = await gateway.mask_sensitive_data("password: hunter2", "s1")
+    second = await gateway.mask_sensitive_data("IP 10.0.0.1, password: hunter2", "s1")
+    assert first.mappings[0].masked in second.content
+    assert second.pii_count == 2
+    unmasked = await gateway.unmask_sensitive_data(f"{first.content} {second.content}", "s1")
+    assert unmasked.count("hunter2") == 2
+    assert "10.0.0.1" in unmasked
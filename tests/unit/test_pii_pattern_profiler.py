@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.security.pii_redaction import PIIRedactionGateway
+from llm_pii_proxy.security.pattern_profiler import PatternProfiler
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../../config/pii_patterns.yaml')
+TEXT = "password: hunter2\nserver 10.0.0.1 token: abc.def-ghi\nplain text " * 5
+
+
+def test_profiling_does_not_change_masking():
+    plain = PIIRedactionGateway(CONFIG_PATH, regex_engine="re", mask_key=b"k", profile_patterns=False)
+    profiled = PIIRedactionGateway(CONFIG_PATH, regex_engine="re", mask_key=b"k", profile_patterns=True)
+    assert plain.profile_report() is None
+    plain_mapping, profiled_mapping = {}, {}
+    assert plain.mask_sensitive_data(TEXT, None, plain_mapping) == \
+        profiled.mask_sensitive_data(TEXT, None, profiled_mapping)
+    assert plain_mapping.keys() == profiled_mapping.keys()
+
+
+def test_report_counts_scans_and_outcomes():
+    gateway = PIIRedactionGateway(CONFIG_PATH, regex_engine="re", profile_patterns=True)
+    mapping = {}
+    gateway.mask_sensitive_data(TEXT, None, mapping)
+    gateway.mask_sensitive_data("nothing to see here", None, {})
+    rows = gateway.profile_report()
+
+    assert len(rows) == sum(len(regexes) for regexes in gateway.patterns.values())
+    assert [row["seconds"] for row in rows] == sorted((row["seconds"] for row in rows), reverse=True)
+    for row in rows:
+        # Every detector ran or was skipped by its triggers, once per scanned text
+        assert row["scans"] + row["skipped"] == 2
+        assert row["overlap_rejected"] >= 0
+        assert row["accepted"] <= row["candidates"]
+    by_type = {}
+    for row in rows:
+        by_type[row["data_type"]] = by_type.get(row["data_type"], 0) + row["accepted"]
+    assert by_type["password"] >= 5 and by_type["ip_address"] == 5
+    # The trigger prefilter skips detectors whose keywords are absent
+    assert any(row["skipped"] for row in rows)
+
+    assert len(gateway.profile_report(top=3)) == 3
+    gateway.profiler.reset()
+    assert all(row["scans"] == row["candidates"] == 0 for row in gateway.profile_report())
+
+
+def test_profiler_attributes_overlap_rejections():
+    profiler = PatternProfiler([("a", 0, "x", ()), ("b", 0, "y", ("y",))])
+    profiler.record_scan(100, (0,), {0: 0.5})
+    profiler.record_outcome({0: 4}, {0: 1}, {0: 1}, {0: 1})
+    first, second = profiler.report()
+    assert (first["data_type"], first["scans"], first["overlap_rejected"], first["time_share"]) == ("a", 1, 1, 1.0)
+    assert first["invalid"] == 1
+    assert (second["scans"], second["skipped"], second["mb_per_s"]) == (0, 1, None)
@@ -0,0 +1,83 @@
+import asyncio
+import sys
+import os
+import pytest
+import yaml
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.security.pii_gateway import AsyncPIISecurityGateway
+
+
+def _write_config(path, config):
+    with open(path, "w") as f:
+        yaml.dump(config, f)
+    # Make sure mtime polling sees the change even on coarse filesystems
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = str(tmp_path / "pii_patterns.yaml")
+    _write_config(path, {"custom_token": [{"pattern": r"CUSTOM_[A-Z0-9]{6}"}]})
+    return path
+
+
+@pytest.mark.asyncio
+async def test_reload_swaps_engine_and_keeps_sessions(config_path):
+    gateway = AsyncPIISecurityGateway(config_path=config_path)
+    old_engine = gateway.redaction_gateway
+    result = await gateway.mask_sensitive_data("CUSTOM_ABC123 and OTHER_1234", "s1")
+    assert "CUSTOM_ABC123" not in result.content
+    assert "OTHER_1234" in result.content
+
+    _write_config(config_path, {
+        "custom_token": [{"pattern": r"CUSTOM_[A-Z0-9]{6}"}],
+        "other_token": [{"pattern": r"OTHER_[0-9]{4}"}],
+    })
+    assert await gateway.reload_patterns()
+    assert gateway.redaction_gateway is not old_engine
+    status = gateway.reload_status()
+    assert status["reloads"] == 1
+    assert status["patterns_version"] == gateway.redaction_gateway.patterns_version
+    assert status["last_error"] is None
+
+    # Masks created before the reload can still be restored
+    unmasked = await gateway.unmask_sensitive_data(result.content, "s1")
+    assert "CUSTOM_ABC123" in unmasked
+    masked = await gateway.mask_sensitive_data("OTHER_1234", "s2")
+    assert "OTHER_1234" not in masked.content
+
+
+@pytest.mark.asyncio
+async def test_failed_reload_keeps_previous_patterns(config_path):
+    gateway = AsyncPIISecurityGateway(config_path=config_path)
+    old_engine = gateway.redaction_gateway
+    with open(config_path, "w") as f:
+        f.write("custom_token:\n  - pattern: '(unclosed'\n")
+    assert not await gateway.reload_patterns()
+    assert gateway.redaction_gateway is old_engine
+    status = gateway.reload_status()
+    assert status["failures"] == 1
+    assert "invalid regex" in status["last_error"]
+    result = await gateway.mask_sensitive_data("CUSTOM_ABC123", "s1")
+    assert "CUSTOM_ABC123" not in result.content
+
+
+@pytest.mark.asyncio
+async def test_watcher_reloads_on_change(config_path):
+    gateway = AsyncPIISecurityGateway(config_path=config_path)
+    version = gateway.reload_status()["patterns_version"]
+    gateway.start_pattern_watcher(interval_seconds=0.01)
+    try:
+        assert gateway.reload_status()["watching"]
+        _write_config(config_path, {"other_token": [{"pattern": r"OTHER_[0-9]{4}"}]})
+        for _ in range(200):
+            if gateway.reload_status()["patterns_version"] != version:
+                break
+            await asyncio.sleep(0.01)
+        assert gateway.reload_status()["patterns_version"] != version
+        assert list(gateway.redaction_gateway.patterns) == ["other_token"]
+    finally:
+        await gateway.stop_pattern_watcher()
+    assert not gateway.reload_status()["watching"]
@@ -0,0 +1,64 @@
+import re
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.security.pii_redaction import PIIRedactionGateway, PatternScanner
+from llm_pii_proxy.observability.metrics import metrics
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../../config/pii_patterns.yaml')
+
+
+def _scanner():
+    patterns = {
+        'ip_address': [re.compile(r'\b(?:\d{1,3}\.){3}\d{1,3}\b')],
+        'password': [re.compile(r'(?i)password[\s:=]+\S+')],
+        'aws_key': [re.compile(r'AKIA[0-9A-Z]{16}')],
+    }
+    triggers = {
+        'password': [('password',)],
+        'aws_key': [('AKIA',)],
+    }
+    return PatternScanner(patterns, triggers)
+
+
+def test_only_triggered_and_anchorless_detectors_run():
+    scanner = _scanner()
+    assert scanner.active_detectors("just some code") == (0,)
+    assert scanner.active_detectors("PASSWORD = hunter2") == (0, 1)
+    assert scanner.active_detectors("akia and password") == (0, 1, 2)
+
+
+def test_prefilter_counters():
+    scanner = _scanner()
+    hits, skips = metrics.get("pii_prefilter_hits"), metrics.get("pii_prefilter_skips")
+    scanner.scan("password: hunter2 on 10.0.0.1")
+    assert metrics.get("pii_prefilter_hits") - hits == 1
+    assert metrics.get("pii_prefilter_skips") - skips == 1
+
+
+def test_prefilter_does_not_change_results():
+    gateway = PIIRedactionGateway(CONFIG_PATH)
+    unfiltered = PatternScanner(gateway.patterns, engine=gateway.scanner.engine)
+    text = "Мой пароль: Secret123 и AKIA1234567890EXAMPLE, IP 10.1.2.3, plain code below\nx = 1"
+    assert sorted(gateway.scanner.scan(text)) == sorted(unfiltered.scan(text))
+
+
+def test_every_configured_pattern_declares_triggers_except_ip():
+    gateway = PIIRedactionGateway(CONFIG_PATH)
+    for data_type, declared in gateway.triggers.items():
+        if data_type == 'ip_address':
+            assert declared == [()]
+        else:
+            assert all(declared), data_type
+
+
+def test_dotted_and_dotless_i_do_not_skip_detectors():
+    gateway = PIIRedactionGateway(CONFIG_PATH, regex_engine="re")
+    unfiltered = PatternScanner(gateway.patterns, engine=gateway.scanner.engine)
+    # re.IGNORECASE matches "i" to U+0130 and U+0131, so the triggers have to as well
+    for text in ["prİvate_key: abcdef", "sk_lİve_abc123", "Api_key: xyz123", "prıvate_key: abcdef", "PRİVATE_KEY: abcdef"]:
+        assert sorted(gateway.scanner.scan(text)) == sorted(unfiltered.scan(text)) != [], text
+        assert gateway.line_spans(text), text
+    masked = gateway.mask_sensitive_data("prİvate_key: abcdef and sk_lİve_abc123", None, {})
+    assert "abcdef" not in masked and "abc123" not in masked
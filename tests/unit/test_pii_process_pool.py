@@ -0,0 +1,83 @@
+import sys
+import os
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.security.pii_gateway import AsyncPIISecurityGateway
+from llm_pii_proxy.observability.metrics import metrics
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../../config/pii_patterns.yaml')
+
+
+@pytest.fixture
+def pooled_gateway(monkeypatch):
+    monkeypatch.setenv("PII_PROCESS_POOL_WORKERS", "1")
+    monkeypatch.setenv("PII_PROCESS_POOL_MIN_CHARS", "1000")
+    monkeypatch.setenv("PII_MASK_KEY", "pool-test-key")
+    gateway = AsyncPIISecurityGateway(config_path=CONFIG_PATH)
+    yield gateway
+    gateway.shutdown_process_pool()
+
+
+@pytest.mark.asyncio
+async def test_large_texts_are_masked_in_worker_like_in_thread(pooled_gateway, monkeypatch):
+    large = "password: hunter2\n" + "x = 1\n" * 400 + "IP 10.0.0.1"
+    tasks = metrics.get("pii_pool_tasks")
+    pooled = await pooled_gateway.mask_sensitive_data(large, "s1")
+    assert metrics.get("pii_pool_tasks") - tasks == 1
+    assert metrics.get("pii_pool_queue_depth") == 0
+    assert metrics.get("pii_pool_bytes_sent") > len(large)
+
+    monkeypatch.setenv("PII_PROCESS_POOL_WORKERS", "0")
+    threaded = await AsyncPIISecurityGateway(config_path=CONFIG_PATH).mask_sensitive_data(large, "s1")
+    assert pooled.content == threaded.content
+    assert pooled.pii_count == 2
+
+    unmasked = await pooled_gateway.unmask_sensitive_data(pooled.content, "s1")
+    assert "hunter2" in unmasked and "10.0.0.1" in unmasked
+
+
+@pytest.mark.asyncio
+async def test_batch_routes_only_large_items_to_pool(pooled_gateway):
+    large = "x = 1\n" * 400 + "password: hunter2"
+    tasks = metrics.get("pii_pool_tasks")
+    batch = await pooled_gateway.mask_many(["password: hunter2", large, ""], "s1")
+    assert metrics.get("pii_pool_tasks") - tasks == 1
+    # Same secret, same token, whether it was masked in a thread or in a worker
+    token = batch.results[0].mappings[0].masked
+    assert batch.results[1].content.endswith(token)
+    assert batch.pii_count == 2
+
+
+@pytest.mark.asyncio
+async def test_large_json_documents_are_scanned_in_worker(pooled_gateway, monkeypatch):
+    import json
+    document = json.dumps({"files": [{"path": f"src/{i}.py", "line": i} for i in range(60)],
+                           "password": "hunter2", "host": "10.0.0.1"})
+    tasks = metrics.get("pii_pool_tasks")
+    pooled = await pooled_gateway.mask_sensitive_data(document, "s1")
+    assert metrics.get("pii_pool_tasks") - tasks == 1
+
+    monkeypatch.setenv("PII_PROCESS_POOL_WORKERS", "0")
+    threaded = await AsyncPIISecurityGateway(config_path=CONFIG_PATH).mask_sensitive_data(document, "s1")
+    assert pooled.content == threaded.content
+    assert json.loads(pooled.content)["password"].startswith("<password_")
+
+
+@pytest.mark.asyncio
+async def test_workers_scan_with_the_configured_window(monkeypatch):
+    monkeypatch.setenv("PII_PROCESS_POOL_WORKERS", "1")
+    monkeypatch.setenv("PII_PROCESS_POOL_MIN_CHARS", "1000")
+    monkeypatch.setenv("PII_STREAM_WINDOW_CHARS", "10000")
+    # A secret longer than the window overlap is cut at the window edge: where depends on the window
+    large = "x = 1\n" * 1500 + "password: " + "a" * 15000 + "\n" + "x = 1\n" * 2000
+    pooled_gateway = AsyncPIISecurityGateway(config_path=CONFIG_PATH)
+    try:
+        pooled = await pooled_gateway.mask_sensitive_data(large, "s1")
+    finally:
+        pooled_gateway.shutdown_process_pool()
+
+    monkeypatch.setenv("PII_PROCESS_POOL_WORKERS", "0")
+    threaded = await AsyncPIISecurityGateway(config_path=CONFIG_PATH).mask_sensitive_data(large, "s1")
+    assert pooled.content == threaded.content
+    assert pooled.mappings[0].original == "a" * (20000 - 9010)
@@ -0,0 +1,63 @@
+import sys
+import os
+import pytest
+import yaml
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.core.exceptions import ConfigurationError
+from llm_pii_proxy.security.pii_redaction import PIIRedactionGateway
+from llm_pii_proxy.security.redos_gate import attack_inputs
+
+SAFE = {"pattern": r"(?i)ticket[\s:=]+[A-Z0-9]+", "triggers": ["ticket"]}
+# Quadratic: every "private_key " start scans to the end of the line for a marker that never comes
+QUADRATIC = {"pattern": r"(?i)private[_-]?key[\s:=]+[^\n]+-----END", "triggers": ["private"]}
+# Exponential: nested quantifiers never finish on a long run of "a" without "b"
+EXPONENTIAL = {"pattern": r"(?:a+)+b"}
+
+
+def _config(tmp_path, config):
+    path = tmp_path / "pii_patterns.yaml"
+    with open(path, "w") as f:
+        yaml.dump(config, f)
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def small_budget(monkeypatch):
+    monkeypatch.setenv("PII_REDOS_BUDGET_MS", "50")
+    monkeypatch.setenv("PII_REDOS_INPUT_CHARS", "16384")
+
+
+def test_attack_inputs_pump_prefixes_of_the_pattern():
+    inputs = [text for _, text in attack_inputs(QUADRATIC["pattern"], 0, 1000)]
+    # Repeated matching label with a value and no end marker: every start fails late
+    assert any(text.startswith("privatekey aprivatekey a") for text in inputs)
+    assert any(text.startswith("privatekey " + "a" * 100) for text in inputs)
+    assert all(950 <= len(text) <= 1001 and text.endswith("\x00") for text in inputs)
+
+
+def test_safe_patterns_pass_the_gate(tmp_path):
+    gateway = PIIRedactionGateway(_config(tmp_path, {"ticket": [SAFE]}), regex_engine="re", redos_gate="reject")
+    assert gateway.redos_findings == []
+
+
+def test_reject_mode_fails_the_load(tmp_path):
+    path = _config(tmp_path, {"ticket": [SAFE], "private_key": [QUADRATIC], "runaway": [EXPONENTIAL]})
+    with pytest.raises(ConfigurationError) as error:
+        PIIRedactionGateway(path, regex_engine="re", redos_gate="reject")
+    assert "private_key[0]" in str(error.value) and "runaway[0]" in str(error.value)
+    assert "ticket" not in str(error.value)
+
+
+def test_warn_mode_reports_and_keeps_the_patterns(tmp_path):
+    path = _config(tmp_path, {"ticket": [SAFE], "private_key": [QUADRATIC], "runaway": [EXPONENTIAL]})
+    gateway = PIIRedactionGateway(path, regex_engine="re", redos_gate="warn")
+    findings = {finding["data_type"]: finding for finding in gateway.redos_findings}
+    assert set(findings) == {"private_key", "runaway"}
+    assert findings["runaway"]["timed_out"] and findings["private_key"]["seconds"] > 0.05
+    assert "ticket" in gateway.patterns and "TICKET-1" not in gateway.mask_sensitive_data("ticket: TICKET1", None, {})
+
+
+def test_unknown_mode_is_a_configuration_error(tmp_path):
+    with pytest.raises(ConfigurationError):
+        PIIRedactionGateway(_config(tmp_path, {"ticket": [SAFE]}), regex_engine="re", redos_gate="maybe")
@@ -0,0 +1,75 @@
+import re
+import sys
+import os
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.security import pii_redaction
+from llm_pii_proxy.security.pii_redaction import PIIRedactionGateway, PatternScanner, RegexEngine, load_regex_engine
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../../config/pii_patterns.yaml')
+
+SAMPLE = "password: hunter2, token: abc.def, IP 10.0.0.1, AKIA1234567890EXAMPLE, mongodb://u:p@db/x"
+
+
+def _types(gateway, text):
+    gateway.clear_mapping()
+    gateway.mask_sensitive_data(text)
+    return sorted((m.type, m.original) for m in gateway._mapping.values())
+
+
+def test_stdlib_engine_is_always_available():
+    engine = load_regex_engine('re')
+    assert engine.name == 're'
+    assert not engine.linear_time
+
+
+def test_unknown_engine_is_rejected():
+    with pytest.raises(ValueError):
+        load_regex_engine('pcre')
+
+
+def test_missing_engine_falls_back_to_stdlib(monkeypatch):
+    monkeypatch.setattr(pii_redaction, 're2', None)
+    assert load_regex_engine('re2').name == 're'
+
+
+def test_auto_prefers_linear_time_engine():
+    engine = load_regex_engine('auto')
+    if pii_redaction.re2 is not None:
+        assert engine.name == 're2' and engine.linear_time
+    else:
+        assert engine.name in ('regex', 're')
+
+
+@pytest.mark.parametrize("name", ['regex', 're2'])
+def test_optional_engines_find_the_same_pii(name):
+    engine = load_regex_engine(name)
+    if engine.name != name:
+        pytest.skip(f"{name} is not installed")
+    reference = PIIRedactionGateway(CONFIG_PATH, regex_engine='re')
+    gateway = PIIRedactionGateway(CONFIG_PATH, regex_engine=name)
+    assert gateway.scanner.engine.name == name
+    assert gateway.scanner.incompatible == []
+    assert _types(gateway, SAMPLE) == _types(reference, SAMPLE)
+
+
+def test_incompatible_patterns_are_reported_and_kept_on_stdlib():
+    class NoBackreferences(RegexEngine):
+        name = 'strict'
+
+        def compile(self, source):
+            if '\\1' in source:
+                raise ValueError("backreferences are not supported")
+            return re.compile(source)
+
+    patterns = {
+        'repeated': [re.compile(r'(\w)\1{3}')],
+        'ip_address': [re.compile(r'\b(?:\d{1,3}\.){3}\d{1,3}\b')],
+    }
+    scanner = PatternScanner(patterns, engine=NoBackreferences())
+    assert [(data_type, reason) for data_type, _, reason in scanner.incompatible] == [
+        ('repeated', "backreferences are not supported")
+    ]
+    found = sorted(data_type for _, _, data_type, _ in scanner.scan("aaaa at 10.0.0.1"))
+    assert found == ['ip_address', 'repeated']
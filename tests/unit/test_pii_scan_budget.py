@@ -0,0 +1,107 @@
+import sys
+import os
+import time
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from unittest.mock import AsyncMock, MagicMock
+from llm_pii_proxy.core.exceptions import ConfigurationError, PIIProcessingError, PIIScanBudgetExceededError
+from llm_pii_proxy.core.models import ChatRequest, ChatMessage
+from llm_pii_proxy.security.pii_gateway import AsyncPIISecurityGateway
+from llm_pii_proxy.security.pii_redaction import (
+    PIIRedactionGateway, ScanBudgetExceeded, SCAN_BUDGET_WINDOW_CHARS, REDACTED_LINE_TYPE
+)
+from llm_pii_proxy.observability.metrics import metrics
+from llm_pii_proxy.services.llm_service import LLMService
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../../config/pii_patterns.yaml')
+LINES = ["def handler(event):", "    password: hunter2", "    return 42", "    host = 10.0.0.7", ""]
+TEXT = "\n".join(LINES * 2500)
+
+
+def test_deadline_stops_between_windows_with_final_spans():
+    engine = PIIRedactionGateway(CONFIG_PATH, regex_engine="re")
+    assert len(TEXT) > 2 * SCAN_BUDGET_WINDOW_CHARS
+    with pytest.raises(ScanBudgetExceeded) as exceeded:
+        engine.find_spans(TEXT, None, deadline=time.monotonic() - 1)
+    position, spans = exceeded.value.position, exceeded.value.spans
+    assert 0 < position < len(TEXT)
+    full = engine.find_spans(TEXT)
+    assert spans == [span for span in full if span[0] < position]
+    # A deadline that is not reached changes nothing
+    assert engine.find_spans(TEXT, None, deadline=time.monotonic() + 60) == full
+
+
+def test_deadline_applies_to_texts_of_one_window():
+    engine = PIIRedactionGateway(CONFIG_PATH, regex_engine="re")
+    text = TEXT[:SCAN_BUDGET_WINDOW_CHARS // 2]
+    with pytest.raises(ScanBudgetExceeded) as exceeded:
+        engine.find_spans(text, None, deadline=time.monotonic() - 1)
+    # The scan finished, so its spans are complete
+    assert exceeded.value.position == len(text) and exceeded.value.spans == engine.find_spans(text)
+
+
+@pytest.mark.asyncio
+async def test_budget_counts_and_fails_short_texts(monkeypatch):
+    monkeypatch.setenv("PII_SCAN_BUDGET_MS", "0.0001")
+    monkeypatch.setenv("PII_SCAN_BUDGET_MODE", "fail")
+    exceeded = metrics.get("pii_scan_budget_exceeded")
+    with pytest.raises(PIIScanBudgetExceededError):
+        await AsyncPIISecurityGateway().mask_many(["password: hunter2secret"], "s1")
+    assert metrics.get("pii_scan_budget_exceeded") - exceeded == 1
+
+
+def test_line_spans_mask_suspicious_lines_whole():
+    engine = PIIRedactionGateway(CONFIG_PATH, regex_engine="re")
+    text = "\n".join(LINES)
+    masked = engine.apply_spans(text, engine.line_spans(text), None, {})
+    lines = masked.split("\n")
+    assert lines[0] == "def handler(event):" and lines[2] == "    return 42"
+    assert lines[1].startswith(f"    <{REDACTED_LINE_TYPE}_") and lines[3].startswith(f"    <{REDACTED_LINE_TYPE}_")
+
+
+@pytest.mark.asyncio
+async def test_conservative_mode_masks_the_rest_by_line(monkeypatch):
+    monkeypatch.setenv("PII_SCAN_BUDGET_MS", "0.001")
+    gateway = AsyncPIISecurityGateway()
+    exceeded = metrics.get("pii_scan_budget_exceeded")
+    result = await gateway.mask_sensitive_data(TEXT, "s1")
+    assert metrics.get("pii_scan_budget_exceeded") - exceeded == 1
+    assert "hunter2" not in result.content and "10.0.0.7" not in result.content
+    assert f"<{REDACTED_LINE_TYPE}_" in result.content
+    unmasked = await gateway.unmask_sensitive_data(result.content, "s1")
+    assert unmasked.count("hunter2") == TEXT.count("hunter2") and unmasked.count("10.0.0.7") == TEXT.count("10.0.0.7")
+
+
+@pytest.mark.asyncio
+async def test_fail_mode_rejects_fast(monkeypatch):
+    monkeypatch.setenv("PII_SCAN_BUDGET_MS", "0.001")
+    monkeypatch.setenv("PII_SCAN_BUDGET_MODE", "fail")
+    gateway = AsyncPIISecurityGateway()
+    with pytest.raises(PIIScanBudgetExceededError):
+        await gateway.mask_many(["short password: x", TEXT], "s1")
+    monkeypatch.setenv("PII_SCAN_BUDGET_MODE", "sometimes")
+    with pytest.raises(ConfigurationError):
+        AsyncPIISecurityGateway()
+
+
+@pytest.mark.asyncio
+async def test_llm_service_never_sends_unmasked_text_when_masking_fails(monkeypatch):
+    monkeypatch.setenv("PII_SCAN_BUDGET_MS", "0.001")
+    monkeypatch.setenv("PII_SCAN_BUDGET_MODE", "fail")
+    monkeypatch.setattr(LLMService, "pii_enabled", property(lambda self: True))
+    provider = MagicMock()
+    provider.create_chat_completion = AsyncMock()
+    service = LLMService(provider, AsyncPIISecurityGateway())
+    request = ChatRequest(model="m", messages=[ChatMessage(role="user", content=TEXT)])
+    with pytest.raises(PIIScanBudgetExceededError):
+        await service.process_chat_request(request)
+    provider.create_chat_completion.assert_not_called()
+
+    # Any other masking error is a PIIProcessingError too, never a fallback to the original text
+    gateway = AsyncPIISecurityGateway()
+    monkeypatch.setattr(gateway, "mask_many", AsyncMock(side_effect=RuntimeError("boom")))
+    service = LLMService(provider, gateway)
+    with pytest.raises(PIIProcessingError):
+        await service.process_chat_request(request)
+    provider.create_chat_completion.assert_not_called()
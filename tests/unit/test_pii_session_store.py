@@ -0,0 +1,53 @@
+import sys
+import os
+import time
+import pytest
+from datetime import datetime
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.core.models import PIIResult
+from llm_pii_proxy.security.pii_gateway import AsyncPIISecurityGateway
+from llm_pii_proxy.security.pii_redaction import RedactionMapping
+
+
+def test_redaction_mapping_is_compact():
+    redaction = RedactionMapping(original="hunter2", masked="<password_0123abcd>", type="pass" + "word")
+    assert not hasattr(redaction, "__dict__")
+    assert redaction.type is sys.intern("password")
+    assert abs((redaction.created_at - datetime.now()).total_seconds()) < 5
+    stamped = RedactionMapping("x", "<t_00000000>", "t", created_at=datetime(2026, 1, 2, 3, 4, 5))
+    assert abs((stamped.created_at - datetime(2026, 1, 2, 3, 4, 5)).total_seconds()) < 0.001
+
+
+def test_pii_result_builds_mappings_on_first_read():
+    class Exploding(RedactionMapping):
+        __slots__ = ()
+
+        @property
+        def created_at(self):
+            raise AssertionError("converted eagerly")
+
+    result = PIIResult(content="x", session_id="s", pii_count=1,
+                       redactions=[Exploding("hunter2", "<password_0123abcd>", "password")])
+    assert result.pii_count == 1
+    with pytest.raises(AssertionError):
+        result.mappings
+
+    result = PIIResult(content="x", session_id="s", pii_count=1,
+                       redactions=[RedactionMapping("hunter2", "<password_0123abcd>", "password")])
+    assert [(m.original, m.masked, m.type) for m in result.mappings] == [("hunter2", "<password_0123abcd>", "password")]
+    assert result.model_dump()["mappings"][0]["masked"] == "<password_0123abcd>"
+
+
+@pytest.mark.asyncio
+async def test_expiry_walks_only_expired_sessions():
+    gateway = AsyncPIISecurityGateway(session_timeout_minutes=1)
+    for session_id in ("old", "idle", "fresh"):
+        await gateway.mask_sensitive_data("password: hunter2", session_id)
+    # Reading a session moves it to the end, behind the expired ones
+    await gateway.unmask_sensitive_data("nothing", "old")
+    assert list(gateway.sessions) == ["idle", "fresh", "old"]
+
+    gateway.sessions["idle"]["last_accessed"] = time.monotonic() - 120
+    await gateway.mask_sensitive_data("plain", "fresh")
+    assert list(gateway.sessions) == ["old", "fresh"]
@@ -0,0 +1,67 @@
+import sys
+import os
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.security.pii_gateway import AsyncPIISecurityGateway
+from llm_pii_proxy.security.pii_redaction import PIIRedactionGateway
+from llm_pii_proxy.security.span_cache import SpanCache, ENTRY_OVERHEAD_BYTES, SPAN_OVERHEAD_BYTES
+from llm_pii_proxy.observability.metrics import metrics
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../../config/pii_patterns.yaml')
+
+
+def test_spans_hold_offsets_and_reapply_identically():
+    gateway = PIIRedactionGateway(CONFIG_PATH, mask_key=b"cache-key")
+    text = "password: hunter2 on 10.0.0.1\napi_key:\nSECRETVAL\n"
+    spans = gateway.find_spans(text)
+    assert all(isinstance(field, int) for span in spans for field in span[:4])
+    assert [text[value_start:value_end] for _, _, value_start, value_end, _ in spans] == \
+        ["hunter2", "10.0.0.1", "SECRETVAL"]
+    assert gateway.apply_spans(text, spans, mapping={}) == gateway.mask_sensitive_data(text, mapping={})
+
+
+def test_lru_eviction_is_bounded_by_memory():
+    gateway = PIIRedactionGateway(CONFIG_PATH)
+    entry = ENTRY_OVERHEAD_BYTES + SPAN_OVERHEAD_BYTES
+    cache = SpanCache(max_bytes=2 * entry, min_chars=0)
+    keys = []
+    for i in range(3):
+        text = f"password: secret{i}"
+        key, size = cache.key_for(gateway, text)
+        cache.put(key, gateway.find_spans(text), size)
+        keys.append(key)
+        if i == 1:
+            assert cache.get(keys[0]) is not None  # keys[0] becomes most recently used
+    assert cache.stats()["bytes"] <= 2 * entry
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+
+
+def test_key_depends_on_pattern_version(tmp_path):
+    one = PIIRedactionGateway(CONFIG_PATH)
+    config = tmp_path / "other.yaml"
+    config.write_text("password:\n  - pattern: 'password: \\\\S+'\n")
+    other = PIIRedactionGateway(str(config))
+    cache = SpanCache(min_chars=0)
+    assert cache.key_for(one, "same text")[0] != cache.key_for(other, "same text")[0]
+
+
+@pytest.mark.asyncio
+async def test_resent_conversation_hits_the_cache(monkeypatch):
+    monkeypatch.setenv("PII_SPAN_CACHE_MIN_CHARS", "10")
+    gateway = AsyncPIISecurityGateway(config_path=CONFIG_PATH)
+    history = ["You are a helpful assistant. " * 5, "my password: hunter2 please", "IP 10.0.0.1 is down"]
+    hits, saved = metrics.get("pii_span_cache_hits"), metrics.get("pii_span_cache_bytes_saved")
+    first = await gateway.mask_many(history, "s1")
+    assert metrics.get("pii_span_cache_hits") == hits
+
+    second = await gateway.mask_many(history + ["new message with password: other1"], "s2")
+    assert metrics.get("pii_span_cache_hits") - hits == 3
+    assert metrics.get("pii_span_cache_bytes_saved") - saved == sum(len(text.encode()) for text in history)
+    assert [r.content for r in second.results[:3]] == [r.content for r in first.results]
+    assert gateway.span_cache.stats()["hit_ratio"] == pytest.approx(3 / 7, abs=1e-4)
+
+    report = gateway.metrics_report()
+    assert report["counters"]["pii_span_cache_hits"] == metrics.get("pii_span_cache_hits")
+    assert report["span_cache"] == gateway.span_cache.stats()
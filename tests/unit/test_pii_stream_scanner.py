@@ -0,0 +1,72 @@
+import random
+import sys
+import os
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.security.pii_redaction import PIIRedactionGateway
+from llm_pii_proxy.security.pii_gateway import AsyncPIISecurityGateway
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../../config/pii_patterns.yaml')
+
+FRAGMENTS = [
+    "password: hunter2 ", "IP 10.0.0.{} ", "AKIA1234567890EXAMPLE ", "token=abc.def ",
+    "x = 1\n", "mongodb://u:p@h/db ", "пароль: секрет1 ", "sk_live_abc123 ", "word ",
+    "api_key:\nSECRETVAL\n",
+]
+
+
+def _random_text(rng):
+    return ''.join(rng.choice(FRAGMENTS).format(rng.randint(0, 255)) for _ in range(rng.randint(0, 300)))
+
+
+def _split(text, rng):
+    chunks, position = [], 0
+    while position < len(text):
+        size = rng.randint(1, 70)
+        chunks.append(text[position:position + size])
+        position += size
+    return chunks
+
+
+def test_windowed_masking_matches_whole_text():
+    gateway = PIIRedactionGateway(CONFIG_PATH, regex_engine='re', mask_key=b"stream-key")
+    for seed in range(100):
+        rng = random.Random(seed)
+        text = _random_text(rng)
+        whole_mapping, windowed_mapping = {}, {}
+        whole = gateway.mask_sensitive_data(text, None, whole_mapping)
+        window_chars, max_match_chars = rng.randint(1, 200), rng.randint(30, 80)
+        windowed = ''.join(gateway.mask_stream(_split(text, rng), None, windowed_mapping,
+                                               window_chars=window_chars, max_match_chars=max_match_chars))
+        assert windowed == whole, seed
+        assert windowed_mapping.keys() == whole_mapping.keys()
+
+
+def test_segments_are_yielded_incrementally():
+    gateway = PIIRedactionGateway(CONFIG_PATH, mask_key=b"stream-key")
+    consumed = []
+
+    def chunks():
+        for i in range(50):
+            consumed.append(i)
+            yield f"line {i} password: secret{i}\n"
+
+    stream = gateway.mask_stream(chunks(), window_chars=100, max_match_chars=40)
+    first = next(stream)
+    assert first.startswith("line 0 ") and "secret0" not in first
+    # Only the first window plus its overlap has been read
+    assert len(consumed) < 10
+    rest = ''.join(stream)
+    assert "secret49" not in first + rest
+
+
+@pytest.mark.asyncio
+async def test_gateway_uses_windows_for_large_texts(monkeypatch):
+    monkeypatch.setenv("PII_STREAM_WINDOW_CHARS", "512")
+    gateway = AsyncPIISecurityGateway(config_path=CONFIG_PATH)
+    text = "x = 1\n" * 1000 + "password: hunter2\n" + "y = 2\n" * 1000
+    result = await gateway.mask_sensitive_data(text, "s1")
+    assert "hunter2" not in result.content
+    assert result.pii_count == 1
+    assert "hunter2" in await gateway.unmask_sensitive_data(result.content, "s1")
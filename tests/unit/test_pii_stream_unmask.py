@@ -0,0 +1,135 @@
+import sys
+import os
+import json
+import random
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.core.models import ChatRequest, ChatMessage, ChatResponse
+from llm_pii_proxy.security.pii_gateway import AsyncPIISecurityGateway
+from llm_pii_proxy.security.pii_redaction import PIIRedactionGateway, StreamUnmasker
+from llm_pii_proxy.services.llm_service import LLMService
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../../config/pii_patterns.yaml')
+
+
+def _masked_text(gateway, mapping):
+    masked = gateway.mask_sensitive_data("password: hunter2\nhosts 10.0.0.1, 10.0.0.2", None, mapping)
+    return masked + " if a < b and c<d then <not_a_mask> <ip_address_00000000> <"
+
+
+def test_chunked_output_equals_whole_unmask():
+    gateway = PIIRedactionGateway(CONFIG_PATH, regex_engine="re")
+    mapping = {}
+    text = _masked_text(gateway, mapping)
+    rng = random.Random(7)
+    for _ in range(50):
+        unmasker = StreamUnmasker(gateway, mapping)
+        out, position = [], 0
+        while position < len(text):
+            step = rng.randint(1, 12)
+            out.append(unmasker.feed(text[position:position + step]))
+            position += step
+        out.append(unmasker.flush())
+        assert "".join(out) == gateway.unmask_sensitive_data(text, mapping)
+
+
+def test_only_a_possible_token_prefix_is_held_back():
+    gateway = PIIRedactionGateway(CONFIG_PATH, regex_engine="re")
+    mapping = {}
+    gateway.mask_sensitive_data("password: hunter2", None, mapping)
+    token = next(iter(mapping))
+    unmasker = StreamUnmasker(gateway, mapping)
+    assert unmasker.feed("plain text ") == "plain text "
+    assert unmasker.feed("a < b, ") == "a < b, "
+    assert unmasker.feed("is " + token[:5]) == "is "
+    assert unmasker.feed(token[5:] + " ok") == "hunter2 ok"
+    # Longer than any mask of the session: cannot be one
+    long_tail = "<" + "x" * len(token)
+    assert unmasker.feed(long_tail) == long_tail
+    assert unmasker.flush() == ""
+    # No masks in the session: nothing is held back
+    assert StreamUnmasker(gateway, {}).feed("<passw") == "<passw"
+
+
+class StreamingProvider:
+    def __init__(self, pieces):
+        self.pieces = pieces
+
+    async def create_chat_completion_stream(self, request):
+        masked = request.messages[0].content
+        text = self.pieces(masked)
+        for position in range(0, len(text), 3):
+            yield ChatResponse(id="s", model=request.model,
+                               choices=[{"index": 0, "delta": {"content": text[position:position + 3]},
+                                         "finish_reason": None}])
+        yield ChatResponse(id="s", model=request.model,
+                           choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+
+
+@pytest.mark.asyncio
+async def test_llm_service_streams_unmasked_deltas(monkeypatch):
+    monkeypatch.setattr(LLMService, "pii_enabled", property(lambda self: True))
+    service = LLMService(StreamingProvider(lambda masked: f"You wrote: {masked}"), AsyncPIISecurityGateway())
+    request = ChatRequest(model="m", messages=[ChatMessage(role="user", content="password: hunter2 on 10.0.0.1")],
+                          stream=True)
+    chunks = [chunk async for chunk in service.process_chat_request_stream(request)]
+    content = "".join(chunk.choices[0]["delta"].get("content") or "" for chunk in chunks)
+    assert content == "You wrote: password: hunter2 on 10.0.0.1"
+    assert chunks[-1].choices[0]["finish_reason"] == "stop"
+
+
+class ToolStreamingProvider:
+    """Streams two tool calls whose arguments carry the masks of the user message"""
+
+    async def create_chat_completion_stream(self, request):
+        token = request.messages[0].content.split("password: ")[1].split()[0]
+        for tool_index, arguments in enumerate([f'{{"password": "{token}"}}', f'{{"cmd": "login {token}"}}']):
+            for position in range(0, len(arguments), 4):
+                function = {"arguments": arguments[position:position + 4]}
+                if position == 0:
+                    function["name"] = "run"
+                tool_call = {"index": tool_index, "id": f"call_{tool_index}" if position == 0 else None,
+                             "type": "function", "function": function}
+                yield ChatResponse(id="s", model=request.model,
+                                   choices=[{"index": 0, "delta": {"tool_calls": [tool_call]},
+                                             "finish_reason": None}])
+        yield ChatResponse(id="s", model=request.model,
+                           choices=[{"index": 0, "delta": {}, "finish_reason": "tool_calls"}])
+
+
+@pytest.mark.asyncio
+async def test_llm_service_streams_unmasked_tool_call_arguments(monkeypatch):
+    monkeypatch.setattr(LLMService, "pii_enabled", property(lambda self: True))
+    service = LLMService(ToolStreamingProvider(), AsyncPIISecurityGateway())
+    request = ChatRequest(model="m", messages=[ChatMessage(role="user", content='password: hun\\ter2 please')],
+                          stream=True)
+    chunks = [chunk async for chunk in service.process_chat_request_stream(request)]
+
+    arguments, ids = {}, {}
+    for chunk in chunks:
+        for tool_call in chunk.choices[0]["delta"].get("tool_calls") or []:
+            arguments[tool_call["index"]] = arguments.get(tool_call["index"], "") + \
+                tool_call["function"].get("arguments", "")
+            if tool_call.get("id"):
+                ids[tool_call["index"]] = tool_call["id"]
+    assert ids == {0: "call_0", 1: "call_1"}
+    assert json.loads(arguments[0]) == {"password": 'hun\\ter2'}
+    assert json.loads(arguments[1]) == {"cmd": 'login hun\\ter2'}
+    # Fragments are emitted as soon as no mask can span them, not at the end
+    assert sum(1 for chunk in chunks if chunk.choices[0]["delta"].get("tool_calls")) > 4
+
+
+def test_held_back_arguments_are_flushed_in_a_bare_continuation_frame():
+    gateway = PIIRedactionGateway(CONFIG_PATH, regex_engine="re")
+    mapping = {}
+    gateway.mask_sensitive_data("password: hunter2 at 10.0.0.1", None, mapping)
+    unmaskers = {(0, None): StreamUnmasker(gateway, mapping),
+                 (0, 1): StreamUnmasker(gateway, mapping, json_escape=True)}
+    assert unmaskers[(0, None)].feed("done <pass") == "done "
+    assert unmaskers[(0, 1)].feed('{"a": "<ip_addr') == '{"a": "'
+    delta = {}
+    LLMService._flush_delta(delta, 0, unmaskers)
+    # A continuation fragment: no id or type, which clients would take for a new tool call
+    assert delta == {"content": "<pass", "tool_calls": [{"index": 1, "function": {"arguments": "<ip_addr"}}]}
+    assert unmaskers == {}
@@ -0,0 +1,49 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from llm_pii_proxy.security.pii_redaction import PIIRedactionGateway, RedactionMapping, MASK_TOKEN
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../../config/pii_patterns.yaml')
+
+
+def test_generated_masks_match_token_grammar():
+    gateway = PIIRedactionGateway(CONFIG_PATH)
+    gateway.mask_sensitive_data("password: hunter2, IP 10.0.0.1, AKIA1234567890EXAMPLE")
+    assert gateway._mapping
+    for masked in gateway._mapping:
+        assert MASK_TOKEN.fullmatch(masked)
+
+
+def test_unmask_restores_every_token_in_one_pass():
+    gateway = PIIRedactionGateway(CONFIG_PATH)
+    masked = gateway.mask_sensitive_data("password: hunter2 and IP 10.0.0.1")
+    response = f"Sure: {masked} / again {masked}"
+    unmasked = gateway.unmask_sensitive_data(response)
+    assert unmasked.count("hunter2") == 2
+    assert unmasked.count("10.0.0.1") == 2
+    assert "<" not in unmasked
+
+
+def test_unknown_tokens_and_plain_markup_are_left_alone():
+    gateway = PIIRedactionGateway(CONFIG_PATH)
+    gateway._mapping["<password_0123abcd>"] = RedactionMapping(
+        original="hunter2", masked="<password_0123abcd>", type="password")
+    text = "<div> List<String> <password_deadbeef> <password_0123abcd>"
+    assert gateway.unmask_sensitive_data(text) == "<div> List<String> <password_deadbeef> hunter2"
+
+
+def test_restored_values_are_not_unmasked_again():
+    gateway = PIIRedactionGateway(CONFIG_PATH)
+    gateway._mapping["<api_key_00000001>"] = RedactionMapping(
+        original="<api_key_00000002>", masked="<api_key_00000001>", type="api_key")
+    gateway._mapping["<api_key_00000002>"] = RedactionMapping(
+        original="secret", masked="<api_key_00000002>", type="api_key")
+    assert gateway.unmask_sensitive_data("<api_key_00000001>") == "<api_key_00000002>"
+
+
+def test_text_without_angle_brackets_is_returned_as_is():
+    gateway = PIIRedactionGateway(CONFIG_PATH)
+    gateway.mask_sensitive_data("password: hunter2")
+    text = "nothing to restore here"
+    assert gateway.unmask_sensitive_data(text) is text